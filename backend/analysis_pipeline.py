@@ -0,0 +1,50 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import SessionLocal
+from stock_service import get_latest_ten_prices
+from news_service import get_relevant_news
+from gemini_config import _extract_date_range_from_question
+
+ANALYZE_WORKERS = int(os.getenv('ANALYZE_WORKERS', '8'))
+
+_executor = ThreadPoolExecutor(max_workers=ANALYZE_WORKERS, thread_name_prefix='analyze')
+
+
+def _timed(timings, stage, fn, *args, **kwargs):
+    started = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        timings[stage] = round((time.perf_counter() - started) * 1000, 2)
+
+
+def _load_prices(symbol):
+    # Runs on the pool, so it needs its own session.
+    db = SessionLocal()
+    try:
+        return get_latest_ten_prices(db, symbol=symbol)
+    finally:
+        db.close()
+
+
+def load_analysis_inputs(db, question, symbol):
+    # The price read does not depend on the question, so it overlaps the date
+    # extraction; the news read waits for the date range and runs on the
+    # request thread, which keeps pool workers from blocking on each other.
+    timings = {}
+    started = time.perf_counter()
+    date_future = _executor.submit(_timed, timings, 'date_range', _extract_date_range_from_question, question)
+    prices_future = _executor.submit(_timed, timings, 'prices', _load_prices, symbol)
+
+    start_date, end_date = date_future.result()
+    news_data = _timed(timings, 'news', get_relevant_news, db, question, symbol=symbol,
+                       from_date=start_date, to_date=end_date)
+    stock_data = prices_future.result()
+    timings['inputs'] = round((time.perf_counter() - started) * 1000, 2)
+    return stock_data, news_data, (start_date, end_date), timings
+
+
+def server_timing_header(timings):
+    return ", ".join(f"{stage};dur={duration}" for stage, duration in timings.items())
@@ -1,53 +1,370 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, g
 from flask_cors import CORS
 from sqlalchemy.orm import Session
-from config import engine, get_db
-import models
-from stock_service import update_stock_prices, get_latest_prices, populate_historical_stock_data, get_latest_ten_prices
-from news_service import update_news, get_news_in_range, get_latest_news
-from gemini_config import get_stock_analysis, _extract_date_range_from_question
-from apscheduler.schedulers.background import BackgroundScheduler
-from datetime import datetime
+from config import engine, replica_engine, unpooled_engine, SessionLocal, ReadSessionLocal
+from migrations import init_db
+from stock_service import update_stock_prices, get_latest_prices, get_daily_close_matrix, price_cache
+from indicators import compute_indicators, indicators_to_json
+from bar_service import get_bars, get_latest_bar, drop_expired_bar_partitions, create_upcoming_bar_partitions
+from bar_service import BAR_GRANULARITIES, DAILY, TICK
+from bar_service import get_latest_bars_batch, get_resampled_bars, get_chart_series, refresh_rollups, CHART_MAX_POINTS
+from backfill_jobs import submit_backfill, get_backfill_status, resume_backfill
+from event_study import update_event_study, get_event_study_summary, get_event_returns
+from news_service import update_news, list_news, search_news, get_daily_sentiment, NEWS_LIST_LIMIT
+from gemini_config import get_stock_analysis, stream_stock_analysis
+from analysis_pipeline import load_analysis_inputs, server_timing_header
+from llm_cache import llm_cache
+from pubsub import broker, format_sse, price_topic, news_topic, PostgresRelay
+from date_parser import parser_stats
+from job_scheduler import IngestionScheduler, MarketHoursTrigger, SCHEDULER_ENABLED
+from market_calendar import market_status
+from instrumentation import REGISTRY, HTTP_REQUEST_SECONDS, METRICS_ENABLED, instrument_engine, get_logger
+from datetime import date, datetime, timedelta
+import json
 import os
+import time
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+# Optional: `pip install msgpack` enables binary responses on /api/prices.
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MAX_BATCH_SYMBOLS = 200
+MAX_BARS_LIMIT = 10000
+# Quotes only while the market is open; news keeps arriving overnight.
+PRICE_UPDATE_SECONDS = int(os.getenv('PRICE_UPDATE_SECONDS', '300'))
+NEWS_UPDATE_OPEN_SECONDS = int(os.getenv('NEWS_UPDATE_OPEN_SECONDS', '1800'))
+NEWS_UPDATE_CLOSED_SECONDS = int(os.getenv('NEWS_UPDATE_CLOSED_SECONDS', '7200'))
+# Rollups follow the ticks closely while they arrive; the hourly run after
+# the close picks up the session's last ticks.
+ROLLUP_REFRESH_SECONDS = int(os.getenv('ROLLUP_REFRESH_SECONDS', '60'))
+# Ranges up to this long chart intraday ticks unless a granularity is given.
+CHART_TICK_RANGE = timedelta(days=7)
+
+# Create database tables. gunicorn.conf.py does this once in the master and
+# sets SKIP_DB_INIT so its workers do not all race through the same DDL.
+if os.getenv('SKIP_DB_INIT') != '1':
+    init_db(engine)
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['X-Next-Cursor', 'Server-Timing'])
+log = get_logger('api')
+
+instrument_engine(engine)
+if replica_engine is not engine:
+    instrument_engine(replica_engine)
+REGISTRY.register_collector(lambda: _runtime_metrics())
+
+STREAM_TOPICS = {'prices': price_topic, 'news': news_topic}
+
+# Only the scheduler leader publishes; the relay carries its events to the
+# SSE clients of every other worker.
+PostgresRelay(broker, unpooled_engine, engine).start()
+
+scheduler = IngestionScheduler(unpooled_engine)
+scheduler.add_job(update_stock_prices, MarketHoursTrigger(PRICE_UPDATE_SECONDS))
+scheduler.add_job(update_news, MarketHoursTrigger(NEWS_UPDATE_OPEN_SECONDS, NEWS_UPDATE_CLOSED_SECONDS))
+scheduler.add_job(refresh_rollups, MarketHoursTrigger(ROLLUP_REFRESH_SECONDS, 3600), args=[engine])
+scheduler.add_job(drop_expired_bar_partitions, 'interval', days=1, args=[engine])
+scheduler.add_job(create_upcoming_bar_partitions, 'interval', days=1, args=[engine])
+scheduler.add_job(update_event_study, 'interval', minutes=60)
+if SCHEDULER_ENABLED:
+    scheduler.start()
+
+def _db():
+    # One session per request, opened on first use and closed in teardown.
+    # GETs only read, so they go to the replica when one is configured.
+    if 'db' not in g:
+        g.db = (ReadSessionLocal if request.method == 'GET' else SessionLocal)()
+    return g.db
+
+@app.teardown_appcontext
+def _close_db(exception):
+    db = g.pop('db', None)
+    if db is not None:
+        db.close()
 
-scheduler = BackgroundScheduler()
-scheduler.add_job(update_stock_prices, 'interval', minutes=300)
-scheduler.add_job(update_news, 'interval', minutes=600)
-scheduler.start()
+if METRICS_ENABLED:
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _record_latency(response):
+        started = g.get('request_started')
+        if started is not None:
+            # The route template, not the path, so label values stay bounded.
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint,
+                                         method=request.method, status=response.status_code)
+        return response
+
+def _runtime_metrics():
+    prices = price_cache.stats()
+    llm = llm_cache.stats()
+    stream = broker.stats()
+    jobs = scheduler.stats()['jobs']
+    return {
+        'price_cache_hits_total': ('counter', 'Price series reads served from memory.', prices['hits']),
+        'price_cache_misses_total': ('counter', 'Price series reads that went to the database.', prices['misses']),
+        'price_cache_bytes': ('gauge', 'Bytes held by the price series cache.', prices['bytes']),
+        'llm_cache_hits_total': ('counter', 'LLM answers served from the cache.', llm['hits'] + llm['coalesced']),
+        'llm_cache_misses_total': ('counter', 'LLM answers that needed a model call.', llm['misses']),
+        'llm_cache_hit_ratio': ('gauge', 'Share of LLM lookups answered without a model call.', llm['hit_rate']),
+        'stream_subscribers': ('gauge', 'Open /api/stream connections.', stream['subscribers']),
+        'stream_events_dropped_total': ('counter', 'Events dropped for slow stream clients.', stream['dropped']),
+        'scheduler_leader': ('gauge', '1 if this process runs the ingestion jobs.', int(scheduler.is_leader)),
+        'scheduler_job_runs_total': ('counter', 'Ingestion job runs.',
+                                     [({'job': name}, job['runs']) for name, job in jobs.items()]),
+        'scheduler_job_failures_total': ('counter', 'Ingestion job runs that raised.',
+                                         [({'job': name}, job['failures']) for name, job in jobs.items()]),
+        'scheduler_job_last_duration_seconds': ('gauge', 'Duration of the last run of each job.',
+                                                [({'job': name}, job['last_seconds']) for name, job in jobs.items()
+                                                 if job['last_seconds'] is not None]),
+    }
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+def _conditional(response):
+    # ETag from the body, so a poller whose If-None-Match still matches gets
+    # an empty 304 instead of the same payload again.
+    response.add_etag()
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 @app.route('/api/stocks', methods=['GET'])
 def get_stocks():
-    db: Session = next(get_db())
+    db: Session = _db()
+    symbol = request.args.get('symbol')
+    
+    latest_prices = get_latest_prices(db, symbol=symbol) 
+    return _conditional(jsonify(latest_prices))
+
+@app.route('/api/bars', methods=['GET'])
+def get_price_bars():
+    db: Session = _db()
+    symbol = request.args.get('symbol')
+    granularity = request.args.get('granularity', 'tick' if request.args.get('latest') else '1d')
+    if not symbol:
+        return jsonify({"error": "symbol is required"}), 400
+    if granularity not in BAR_GRANULARITIES:
+        return jsonify({"error": f"granularity must be one of {', '.join(BAR_GRANULARITIES)}"}), 400
+
+    if request.args.get('latest'):
+        return jsonify({symbol.upper(): get_latest_bar(db, symbol, granularity)})
+
     try:
-        symbol = request.args.get('symbol')
-        
-        latest_prices = get_latest_prices(db, symbol=symbol) 
-        return jsonify(latest_prices)
-    finally:
-        db.close()
+        start = datetime.fromisoformat(request.args['from']) if request.args.get('from') else None
+        end = datetime.fromisoformat(request.args['to']) if request.args.get('to') else None
+        limit = int(request.args.get('limit', 500))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not 1 <= limit <= MAX_BARS_LIMIT:
+        return jsonify({"error": f"limit must be between 1 and {MAX_BARS_LIMIT}"}), 400
+    return jsonify({symbol.upper(): get_bars(db, symbol, granularity, start, end, limit)})
+
+@app.route('/api/prices', methods=['GET'])
+def get_prices_batch():
+    # Many symbols per call. Without from/to/interval it returns the latest
+    # bar per symbol; otherwise OHLCV per symbol, re-bucketed to `interval`.
+    # Columnar JSON, or MessagePack with format=msgpack.
+    db: Session = _db()
+    symbols = [symbol.strip() for symbol in request.args.get('symbols', '').split(',') if symbol.strip()]
+    if not symbols:
+        return jsonify({"error": "symbols is required"}), 400
+    if len(symbols) > MAX_BATCH_SYMBOLS:
+        return jsonify({"error": f"at most {MAX_BATCH_SYMBOLS} symbols per request"}), 400
+    interval = request.args.get('interval')
+    granularity = request.args.get('granularity') or (DAILY if interval in ('1d', '1w') else TICK)
+    if granularity not in BAR_GRANULARITIES:
+        return jsonify({"error": f"granularity must be one of {', '.join(BAR_GRANULARITIES)}"}), 400
+    output = request.args.get('format', 'json')
+    if output not in ('json', 'msgpack'):
+        return jsonify({"error": "format must be json or msgpack"}), 400
+    if output == 'msgpack' and msgpack is None:
+        return jsonify({"error": "msgpack is not installed on the server"}), 406
+
+    try:
+        start = datetime.fromisoformat(request.args['from']) if request.args.get('from') else None
+        end = datetime.fromisoformat(request.args['to']) if request.args.get('to') else None
+        if start or end or interval:
+            payload = {'granularity': granularity, 'interval': interval,
+                       'bars': get_resampled_bars(db, symbols, granularity, start, end, interval)}
+        else:
+            payload = {'granularity': granularity, 'latest': get_latest_bars_batch(db, symbols, granularity)}
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if output == 'msgpack':
+        return _conditional(Response(msgpack.packb(payload), mimetype='application/x-msgpack'))
+    return _conditional(jsonify(payload))
+
+@app.route('/api/chart', methods=['GET'])
+def get_chart():
+    # A line chart's closes for any range, downsampled to at most `points`.
+    db: Session = _db()
+    symbol = request.args.get('symbol')
+    if not symbol:
+        return jsonify({"error": "symbol is required"}), 400
+    try:
+        start = datetime.fromisoformat(request.args['from']) if request.args.get('from') else None
+        end = datetime.fromisoformat(request.args['to']) if request.args.get('to') else None
+        points = int(request.args.get('points', 500))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not 3 <= points <= CHART_MAX_POINTS:
+        return jsonify({"error": f"points must be between 3 and {CHART_MAX_POINTS}"}), 400
+    granularity = request.args.get('granularity') or \
+        (TICK if start and (end or datetime.now(start.tzinfo)) - start <= CHART_TICK_RANGE else DAILY)
+    if granularity not in BAR_GRANULARITIES:
+        return jsonify({"error": f"granularity must be one of {', '.join(BAR_GRANULARITIES)}"}), 400
+
+    return _conditional(jsonify(get_chart_series(db, symbol, granularity, start, end, points)))
+
+@app.route('/api/indicators', methods=['GET'])
+def get_indicators():
+    db: Session = _db()
+    symbols = request.args.get('symbols') or request.args.get('symbol')
+    symbols = [symbol.strip() for symbol in symbols.split(',') if symbol.strip()] if symbols else None
+    try:
+        start_date = date.fromisoformat(request.args['from']) if request.args.get('from') else None
+        end_date = date.fromisoformat(request.args['to']) if request.args.get('to') else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    series = request.args.get('series', '').lower() in ('1', 'true')
+
+    symbol_index, dates, closes = get_daily_close_matrix(db, symbols, start_date, end_date)
+    if not symbol_index:
+        return jsonify({})
+    return jsonify(indicators_to_json(symbol_index, dates, compute_indicators(closes), series=series))
 
 @app.route('/api/news', methods=['GET'])
 def get_news():
-    db: Session = next(get_db())
+    db: Session = _db()
     try:
         symbol = request.args.get('symbol') 
-        print(f"DEBUG: app.py - Received symbol in /api/news: '{symbol}' (Type: {type(symbol)})")
-        news = get_latest_news(db, symbol=symbol)
-       
+        include_content = request.args.get('include_content', 'false').lower() in ('1', 'true', 'yes')
+        news, next_cursor = list_news(
+            db,
+            symbol=symbol,
+            from_date=request.args.get('from'),
+            to_date=request.args.get('to'),
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', NEWS_LIST_LIMIT, type=int),
+            include_content=include_content,
+        )
+
+        # The body stays a plain list; the next page is requested with ?cursor=<X-Next-Cursor>.
+        response = jsonify(news)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return _conditional(response)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/news/search', methods=['GET'])
+def search_news_route():
+    db: Session = _db()
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({"error": "Query parameter q is required"}), 400
+        news = search_news(
+            db,
+            query,
+            symbol=request.args.get('symbol'),
+            from_date=request.args.get('from'),
+            to_date=request.args.get('to'),
+            limit=request.args.get('limit', 20, type=int),
+            include_content=request.args.get('include_content', 'false').lower() in ('1', 'true', 'yes'),
+        )
         return jsonify(news)
-    finally:
-        db.close()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/sentiment', methods=['GET'])
+def get_sentiment():
+    db: Session = _db()
+    try:
+        symbol = request.args.get('symbol')
+        if not symbol:
+            return jsonify({"error": "symbol is required"}), 400
+        return jsonify(get_daily_sentiment(db, symbol, request.args.get('from'), request.args.get('to')))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/event-study', methods=['GET'])
+def get_event_study():
+    db: Session = _db()
+    try:
+        summary = get_event_study_summary(
+            db,
+            group_by=request.args.get('group_by', 'symbol'),
+            window=request.args.get('window', '0:1'),
+            symbol=request.args.get('symbol'),
+            source=request.args.get('source'),
+            min_events=request.args.get('min_events', 1, type=int),
+        )
+        return jsonify(summary)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/event-study/events', methods=['GET'])
+def get_event_study_events():
+    db: Session = _db()
+    symbol = request.args.get('symbol')
+    if not symbol:
+        return jsonify({"error": "symbol is required"}), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', 50)), 500))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    events = get_event_returns(db, symbol, window=request.args.get('window', '0:1'), limit=limit)
+    return jsonify(events)
+
+@app.route('/api/stream', methods=['GET'])
+def stream_updates():
+    # Server-Sent Events for live prices and news, fed by the scheduler jobs
+    # through pubsub.broker, so open dashboards need no polling.
+    symbols = request.args.get('symbols') or request.args.get('symbol') or ''
+    symbols = [symbol.strip() for symbol in symbols.split(',') if symbol.strip()]
+    kinds = [kind.strip() for kind in request.args.get('topics', 'prices,news').split(',') if kind.strip()]
+    if not symbols:
+        return jsonify({"error": "symbols is required"}), 400
+    if any(kind not in STREAM_TOPICS for kind in kinds):
+        return jsonify({"error": f"topics must be among {', '.join(STREAM_TOPICS)}"}), 400
+    subscriber = broker.subscribe([STREAM_TOPICS[kind](symbol) for kind in kinds for symbol in symbols])
+    if subscriber is None:
+        # Every stream holds a worker thread; past the cap, more would starve the API.
+        return jsonify({"error": "Too many open streams, retry later"}), 503, {'Retry-After': '30'}
+
+    def events():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                event = subscriber.next_event()
+                yield format_sse(event) if event else ": keepalive\n\n"
+        finally:
+            broker.unsubscribe(subscriber)
+
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/stream/stats', methods=['GET'])
+def stream_stats():
+    return jsonify(broker.stats())
+
+@app.route('/api/scheduler', methods=['GET'])
+def scheduler_stats():
+    return jsonify({'market': market_status(), **scheduler.stats()})
 
 @app.route('/api/analyze', methods=['POST'])
 def analyze_stock():
-    db: Session = next(get_db())
+    db: Session = _db()
     try:
+        started = time.perf_counter()
         question = request.json.get('question')
         selected_symbol_for_analysis = request.json.get('selectedSymbol') 
         user_timezone = request.json.get('userTimezone')
@@ -55,47 +372,100 @@ def analyze_stock():
         if not question:
             return jsonify({"error": "Question is required"}), 400
         
-        start_date, end_date = _extract_date_range_from_question(question)
+        stock_data, news_data, _, timings = load_analysis_inputs(db, question, selected_symbol_for_analysis)
 
+        analysis_started = time.perf_counter()
+        analysis = get_stock_analysis(question, stock_data, news_data, user_timezone) # <--- PASS USER'S TIMEZONE
+        timings['analysis'] = round((time.perf_counter() - analysis_started) * 1000, 2)
+        timings['total'] = round((time.perf_counter() - started) * 1000, 2)
+        log.info("Analyze timings", symbol=selected_symbol_for_analysis, **timings)
 
-        stock_data = get_latest_ten_prices(db, symbol=selected_symbol_for_analysis)
-        news_data = get_news_in_range(db, symbol=selected_symbol_for_analysis, 
-                                       from_date=start_date, to_date=end_date) 
-        
-        print(f"DEBUG: app.py - Before get_stock_analysis: selected_symbol={selected_symbol_for_analysis}")
-        print(f"DEBUG: app.py - Before get_stock_analysis: stock_data={stock_data}")
-        print(f"DEBUG: app.py - Before get_stock_analysis: news_data count={len(news_data)}")
+        response = jsonify({"analysis": analysis, "timings": timings})
+        response.headers['Server-Timing'] = server_timing_header(timings)
+        return response
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        analysis = get_stock_analysis(question, stock_data, news_data, user_timezone) # <--- PASS USER'S TIMEZONE
-        return jsonify({"analysis": analysis})
+@app.route('/api/analyze/stream', methods=['POST'])
+def analyze_stock_stream():
+    # Same inputs as /api/analyze, answered as Server-Sent Events: one
+    # "inputs" event with stage timings, "token" events as the model writes,
+    # then "done" with the full timing breakdown.
+    db: Session = _db()
+    try:
+        started = time.perf_counter()
+        question = request.json.get('question')
+        selected_symbol_for_analysis = request.json.get('selectedSymbol')
+
+        if not question:
+            return jsonify({"error": "Question is required"}), 400
+
+        stock_data, news_data, _, timings = load_analysis_inputs(db, question, selected_symbol_for_analysis)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        db.close()
 
-@app.route('/api/populate-historical', methods=['POST'])
+    def events():
+        yield f"event: inputs\ndata: {json.dumps(timings)}\n\n"
+        analysis_started = time.perf_counter()
+        first_token = None
+        for text in stream_stock_analysis(question, stock_data, news_data):
+            if first_token is None:
+                first_token = round((time.perf_counter() - analysis_started) * 1000, 2)
+            yield f"event: token\ndata: {json.dumps({'text': text})}\n\n"
+        timings['analysis_first_token'] = first_token
+        timings['analysis'] = round((time.perf_counter() - analysis_started) * 1000, 2)
+        timings['total'] = round((time.perf_counter() - started) * 1000, 2)
+        yield f"event: done\ndata: {json.dumps(timings)}\n\n"
+
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/analyze/cache', methods=['GET'])
+def analyze_cache_stats():
+    return jsonify(llm_cache.stats())
 
+@app.route('/api/analyze/date-parser', methods=['GET'])
+def analyze_date_parser_stats():
+    return jsonify(parser_stats())
+
+@app.route('/api/populate-historical', methods=['POST'])
 def populate_historical():
   
     data = request.get_json()
     start_date = data.get('start_date')
     end_date = data.get('end_date')
+    symbols = data.get('symbols')
 
     if not all([start_date, end_date]):
         return jsonify({"error": "start_date and end_date are required"}), 400
     
 
     try:
-        populate_historical_stock_data(start_date, end_date)
-        return jsonify({"message": f"Historical data population started for {start_date} to {end_date}."}), 200
+        job = submit_backfill(start_date, end_date, symbols=symbols)
+        return jsonify({"message": f"Historical data population started for {start_date} to {end_date}.", **job}), 202
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print(f"Error in /api/populate-historical: {str(e)}")
+        log.error("Submitting historical backfill failed", exc_info=True, error=e)
         return jsonify({"error": f"Failed to populate historical data: {str(e)}"}), 500
 
+@app.route('/api/populate-historical/<job_id>', methods=['GET'])
+def populate_historical_status(job_id):
+    job = get_backfill_status(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job {job_id}"}), 404
+    return jsonify(job)
+
+@app.route('/api/populate-historical/<job_id>/resume', methods=['POST'])
+def populate_historical_resume(job_id):
+    job = resume_backfill(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job {job_id}"}), 404
+    return jsonify(job), 202
+
 
 if __name__ == '__main__':
     if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
-        print("Running initial data updates (only once)...")
+        log.info("Running initial data updates (only once)")
         update_stock_prices() 
         update_news()
     app.run(debug=True, port=5000)
\ No newline at end of file
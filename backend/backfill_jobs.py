@@ -0,0 +1,294 @@
+import os
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import text, func, or_, and_
+
+import models
+from config import SessionLocal
+from market_calendar import trading_days
+from eodhd_price_config import fetch_historical_data
+from stock_service import STOCK_SYMBOLS, bulk_insert_daily_bars, price_cache
+from bar_service import ensure_bar_partitions, DAILY
+from instrumentation import get_logger
+
+BACKFILL_WORKERS = int(os.getenv('BACKFILL_WORKERS', '4'))
+BACKFILL_CHUNK_DAYS = int(os.getenv('BACKFILL_CHUNK_DAYS', '90'))
+# A task still running, or a job still planning, after this long is taken to
+# belong to a worker that died; resume_backfill queues it again.
+BACKFILL_TASK_TIMEOUT_SECONDS = int(os.getenv('BACKFILL_TASK_TIMEOUT_SECONDS', '900'))
+# Serialises planning across workers, so overlapping submissions do not
+# queue the same days twice.
+BACKFILL_PLAN_LOCK_ID = int(os.getenv('BACKFILL_PLAN_LOCK_ID', '7305221'))
+
+# Jobs and tasks live in backfill_jobs/backfill_tasks, so any worker can
+# report or resume a job. Tasks run on the pool of the worker that planned
+# or resumed the job, each claimed with SKIP LOCKED.
+_executor = ThreadPoolExecutor(max_workers=BACKFILL_WORKERS, thread_name_prefix='backfill')
+log = get_logger('backfill')
+
+Job = models.BackfillJob
+Task = models.BackfillTask
+
+
+def _job_dict(db, job):
+    counts = {status: (count, inserted, skipped) for status, count, inserted, skipped in
+              db.query(Task.status, func.count(Task.id), func.coalesce(func.sum(Task.inserted), 0),
+                       func.coalesce(func.sum(Task.skipped), 0))
+              .filter(Task.job_id == job.id).group_by(Task.status)}
+    total = sum(row[0] for row in counts.values())
+    done = counts.get('done', (0,))[0]
+    failed = counts.get('failed', (0,))[0]
+    inserted = sum(row[1] for row in counts.values())
+    skipped = sum(row[2] for row in counts.values())
+    if job.status != 'planned':
+        status = job.status
+    elif 'running' in counts:
+        status = 'running'
+    elif 'pending' in counts:
+        status = 'queued'
+    else:
+        status = 'failed' if failed else 'completed'
+
+    finished_at = job.finished_at if status in ('completed', 'failed') else None
+    elapsed = ((finished_at or datetime.utcnow()) - job.started_at).total_seconds() if job.started_at else 0.0
+
+    errors = [f"planning: {job.error}"] if job.error else []
+    errors += [f"{symbol} {start}..{end}: {error}" for symbol, start, end, error in reversed(
+        db.query(Task.symbol, Task.start_date, Task.end_date, Task.error)
+        .filter(Task.job_id == job.id, Task.status == 'failed')
+        .order_by(Task.finished_at.desc()).limit(10).all())]
+    return {
+        'job_id': job.id,
+        'status': status,
+        'start_date': job.start_date.isoformat(),
+        'end_date': job.end_date.isoformat(),
+        'symbols': job.symbols,
+        'tasks_total': total,
+        'tasks_done': done,
+        'tasks_failed': failed,
+        'progress': round(done / total, 4) if total else (1.0 if status == 'completed' else 0.0),
+        'inserted': inserted,
+        'skipped': skipped,
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_second': round((inserted + skipped) / elapsed, 2) if elapsed else 0.0,
+        'tasks_per_second': round(done / elapsed, 3) if elapsed else 0.0,
+        'errors': errors[-10:],
+    }
+
+
+def _subtract_ranges(days, ranges):
+    return [day for day in days if not any(r_start <= day <= r_end for r_start, r_end in ranges)]
+
+
+def _group_into_chunks(days):
+    # Contiguous runs of missing days, each capped at BACKFILL_CHUNK_DAYS.
+    chunks = []
+    for day in days:
+        if chunks:
+            chunk_start, chunk_end = chunks[-1]
+            contiguous = (day - chunk_end).days <= 4
+            if contiguous and (day - chunk_start).days < BACKFILL_CHUNK_DAYS:
+                chunks[-1] = (chunk_start, day)
+                continue
+        chunks.append((day, day))
+    return chunks
+
+
+def _active_tasks():
+    # Queued or running in any job, on any worker; a timed-out run no longer counts.
+    stale_before = datetime.utcnow() - timedelta(seconds=BACKFILL_TASK_TIMEOUT_SECONDS)
+    return or_(Task.status == 'pending', and_(Task.status == 'running', Task.claimed_at >= stale_before))
+
+
+def find_missing_ranges(db, symbol, start, end):
+    bars = models.PriceBar
+    existing = {row[0].date() for row in db.query(bars.timestamp).filter(
+        bars.symbol == symbol, bars.granularity == DAILY,
+        bars.timestamp >= start, bars.timestamp < end + timedelta(days=1)
+    )}
+    missing = [day for day in trading_days(start, end) if day not in existing]
+    inflight = db.query(Task.start_date, Task.end_date).filter(
+        Task.symbol == symbol, _active_tasks(), Task.start_date <= end, Task.end_date >= start
+    ).all()
+    return _group_into_chunks(_subtract_ranges(missing, inflight))
+
+
+def _claim(db, job_id):
+    now = datetime.utcnow()
+    task = db.execute(text("""
+        UPDATE backfill_tasks SET status = 'running', claimed_at = :now
+        WHERE id = (
+            SELECT id FROM backfill_tasks WHERE job_id = :job_id AND status = 'pending'
+            ORDER BY id LIMIT 1 FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, symbol, start_date, end_date
+    """), {'job_id': job_id, 'now': now}).first()
+    if task is not None:
+        db.execute(text("UPDATE backfill_jobs SET started_at = :now WHERE id = :job_id AND started_at IS NULL"),
+                   {'job_id': job_id, 'now': now})
+    db.commit()
+    return task
+
+
+def _run_task(db, task):
+    try:
+        # Raises on provider errors, so an outage fails the task (and
+        # resume_backfill retries it) instead of completing it empty.
+        entries = fetch_historical_data(task.symbol, task.start_date.isoformat(), task.end_date.isoformat())
+        inserted, skipped = bulk_insert_daily_bars(db, task.symbol, entries)
+        db.query(Task).filter(Task.id == task.id).update(
+            {'status': 'done', 'inserted': inserted, 'skipped': skipped, 'finished_at': datetime.utcnow()})
+        db.commit()
+        if inserted:
+            price_cache.invalidate(task.symbol)
+    except Exception as e:
+        db.rollback()
+        # requests errors quote the URL, api_token included; job errors are served by the API.
+        error = re.sub(r'api_token=[^&\s]+', 'api_token=***', str(e))
+        log.warning("Backfill task failed", symbol=task.symbol, start=task.start_date, end=task.end_date,
+                    error=error)
+        db.query(Task).filter(Task.id == task.id).update(
+            {'status': 'failed', 'error': error, 'finished_at': datetime.utcnow()})
+        db.commit()
+
+
+def _drain(job_id):
+    # Runs the job's pending tasks until none are left to claim.
+    db = SessionLocal()
+    try:
+        while True:
+            task = _claim(db, job_id)
+            if task is None:
+                break
+            _run_task(db, task)
+        # Only the worker that finishes the job's last task reports it.
+        finished = db.execute(text("""
+            UPDATE backfill_jobs SET finished_at = :now
+            WHERE id = :job_id AND finished_at IS NULL AND NOT EXISTS (
+                SELECT 1 FROM backfill_tasks WHERE job_id = :job_id AND status IN ('pending', 'running')
+            )
+            RETURNING id
+        """), {'job_id': job_id, 'now': datetime.utcnow()}).first()
+        db.commit()
+        if finished:
+            summary = _job_dict(db, db.get(Job, job_id))
+            log.info("Backfill job finished", job_id=job_id, status=summary['status'],
+                     inserted=summary['inserted'], skipped=summary['skipped'])
+    except Exception as e:
+        log.error("Backfill job run failed", exc_info=True, job_id=job_id, error=e)
+        db.rollback()
+    finally:
+        db.close()
+
+
+def _start(job_id, tasks):
+    for _ in range(min(tasks, BACKFILL_WORKERS)):
+        _executor.submit(_drain, job_id)
+
+
+def _plan(job_id):
+    db = SessionLocal()
+    try:
+        job = db.get(Job, job_id)
+        db.execute(text("SELECT pg_advisory_xact_lock(:id)"), {'id': BACKFILL_PLAN_LOCK_ID})
+        tasks = []
+        for symbol in job.symbols:
+            for chunk_start, chunk_end in find_missing_ranges(db, symbol, job.start_date, job.end_date):
+                tasks.append(Task(job_id=job_id, symbol=symbol, start_date=chunk_start, end_date=chunk_end,
+                                  status='pending'))
+        # Partitions up front, so concurrent tasks never create one mid-insert.
+        with db.get_bind().begin() as conn:
+            ensure_bar_partitions(conn, DAILY, {datetime(day.year, day.month, 1) for task in tasks
+                                                for day in trading_days(task.start_date, task.end_date)})
+        symbols = len(job.symbols)
+        db.add_all(tasks)
+        job.status = 'planned'
+        job.error = None
+        if not tasks:
+            job.started_at = job.finished_at = datetime.utcnow()
+        db.commit()
+    except Exception as e:
+        log.error("Backfill job planning failed", exc_info=True, job_id=job_id, error=e)
+        db.rollback()
+        db.query(Job).filter(Job.id == job_id).update({'status': 'failed', 'error': str(e),
+                                                        'finished_at': datetime.utcnow()})
+        db.commit()
+        return
+    finally:
+        db.close()
+
+    if tasks:
+        log.info("Backfill job planned", job_id=job_id, tasks=len(tasks), symbols=symbols)
+        _start(job_id, len(tasks))
+
+
+def submit_backfill(start_date: str, end_date: str, symbols=None):
+    start = datetime.strptime(start_date, '%Y-%m-%d').date()
+    end = datetime.strptime(end_date, '%Y-%m-%d').date()
+    if start > end:
+        raise ValueError("start_date must not be after end_date")
+
+    if isinstance(symbols, str):
+        symbols = symbols.split(',')
+    if symbols is not None and (not isinstance(symbols, list) or
+                                not all(isinstance(symbol, str) for symbol in symbols)):
+        raise ValueError("symbols must be a list of ticker strings")
+    job_id = uuid.uuid4().hex
+    db = SessionLocal()
+    try:
+        job = Job(id=job_id, start_date=start, end_date=end, status='planning',
+                  symbols=[symbol.strip().upper() for symbol in (symbols or STOCK_SYMBOLS)])
+        db.add(job)
+        db.commit()
+        summary = _job_dict(db, job)
+    finally:
+        db.close()
+    _executor.submit(_plan, job_id)
+    return summary
+
+
+def resume_backfill(job_id: str):
+    # Failed tasks, and runs whose worker died, go back to pending and this
+    # worker drains them; a job whose planning failed, or whose planning
+    # worker died, is planned again.
+    db = SessionLocal()
+    try:
+        job = db.get(Job, job_id)
+        if job is None:
+            return None
+        stale_before = datetime.utcnow() - timedelta(seconds=BACKFILL_TASK_TIMEOUT_SECONDS)
+        if job.status in ('failed', 'planning'):
+            # Conditional, so of two concurrent resumes only one replans.
+            replan = db.query(Job).filter(
+                Job.id == job_id,
+                or_(Job.status == 'failed', and_(Job.status == 'planning', Job.updated_at < stale_before))
+            ).update({'status': 'planning', 'error': None, 'finished_at': None}, synchronize_session=False)
+            db.commit()
+            if replan:
+                _executor.submit(_plan, job_id)
+            db.refresh(job)
+            return _job_dict(db, job)
+        db.query(Task).filter(
+            Task.job_id == job_id,
+            or_(Task.status == 'failed', and_(Task.status == 'running', Task.claimed_at < stale_before))
+        ).update({'status': 'pending', 'error': None, 'claimed_at': None, 'finished_at': None},
+                 synchronize_session=False)
+        job.finished_at = None
+        db.commit()
+        pending = db.query(func.count(Task.id)).filter(Task.job_id == job_id, Task.status == 'pending').scalar()
+        _start(job_id, pending)
+        return _job_dict(db, job)
+    finally:
+        db.close()
+
+
+def get_backfill_status(job_id: str):
+    db = SessionLocal()
+    try:
+        job = db.get(Job, job_id)
+        return _job_dict(db, job) if job else None
+    finally:
+        db.close()
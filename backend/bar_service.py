@@ -0,0 +1,609 @@
+import os
+import sys
+import time
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+import models
+from config import engine
+from downsample import lttb_indices
+from instrumentation import get_logger
+
+DAILY = '1d'
+TICK = 'tick'
+BAR_GRANULARITIES = [DAILY, TICK]
+# Months of partitions kept per granularity; anything older is dropped whole.
+BAR_RETENTION_MONTHS = {TICK: int(os.getenv('TICK_RETENTION_MONTHS', '3'))}
+BAR_INSERT_CHUNK_SIZE = 1000
+
+log = get_logger('bars')
+
+_known_partitions = set()
+_partitions_lock = threading.Lock()
+
+
+def _month_start(dt):
+    return datetime(dt.year, dt.month, 1)
+
+
+def _next_month(dt):
+    return datetime(dt.year + (dt.month == 12), dt.month % 12 + 1, 1)
+
+
+def _granularity_table(granularity):
+    return f"price_bars_{granularity}"
+
+
+def _partition_name(granularity, month):
+    return f"price_bars_{granularity}_{month.year:04d}_{month.month:02d}"
+
+
+def ensure_granularity_partitions(conn):
+    for granularity in BAR_GRANULARITIES:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {_granularity_table(granularity)} "
+            f"PARTITION OF price_bars FOR VALUES IN ('{granularity}') PARTITION BY RANGE (timestamp)"
+        ))
+
+
+def ensure_bar_partitions(conn, granularity, timestamps):
+    # CREATE TABLE ... PARTITION OF locks the parent against every insert, so
+    # months are looked up in the catalog first and only truly missing ones
+    # are created. Current and upcoming months are created ahead of time by
+    # create_upcoming_bar_partitions, and backfills create theirs when planned.
+    months = {_month_start(ts) for ts in timestamps}
+    with _partitions_lock:
+        unknown = [month for month in months if (granularity, month) not in _known_partitions]
+    for month in sorted(unknown):
+        name = _partition_name(granularity, month)
+        if conn.execute(text("SELECT to_regclass(:name)"), {'name': name}).scalar() is None:
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} "
+                f"PARTITION OF {_granularity_table(granularity)} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"
+            ))
+        with _partitions_lock:
+            _known_partitions.add((granularity, month))
+
+
+def create_upcoming_bar_partitions(engine, now: datetime = None, months_ahead: int = 1):
+    # This month's and the next months_ahead months' partitions for every
+    # granularity, so the ingestion jobs never create one mid-insert.
+    month = _month_start(now or datetime.utcnow())
+    months = [month]
+    for _ in range(months_ahead):
+        months.append(_next_month(months[-1]))
+    with engine.begin() as conn:
+        ensure_granularity_partitions(conn)
+        for granularity in BAR_GRANULARITIES:
+            ensure_bar_partitions(conn, granularity, months)
+
+
+def _naive_utc(dt):
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def insert_bars(db: Session, granularity: str, bars):
+    # bars: dicts with 'symbol', 'timestamp' and 'open'/'high'/'low'/'close'/'volume'.
+    if not bars:
+        return 0
+    rows = [{
+        'symbol': bar['symbol'],
+        'granularity': granularity,
+        'timestamp': _naive_utc(bar['timestamp']),
+        'open': bar.get('open', bar['close']),
+        'high': bar.get('high', bar['close']),
+        'low': bar.get('low', bar['close']),
+        'close': bar['close'],
+        'volume': bar.get('volume'),
+    } for bar in bars]
+    # Normally a catalog lookup only (see ensure_bar_partitions). Any creation
+    # runs in its own transaction so a rollback of the insert cannot leave
+    # _known_partitions pointing at a missing table.
+    with db.get_bind().begin() as conn:
+        ensure_bar_partitions(conn, granularity, [row['timestamp'] for row in rows])
+
+    inserted = []
+    for i in range(0, len(rows), BAR_INSERT_CHUNK_SIZE):
+        statement = pg_insert(models.PriceBar.__table__).values(rows[i:i + BAR_INSERT_CHUNK_SIZE])\
+            .on_conflict_do_nothing(index_elements=['symbol', 'granularity', 'timestamp'])\
+            .returning(models.PriceBar.__table__.c.timestamp)
+        inserted += db.execute(statement).scalars().all()
+    # Only rows actually written move the watermark back; duplicates change no bucket.
+    if granularity == TICK and inserted:
+        invalidate_rollups(db, min(inserted))
+    return len(inserted)
+
+
+def _bar_dict(bar):
+    return {
+        'timestamp': bar.timestamp.isoformat(),
+        'open': bar.open,
+        'high': bar.high,
+        'low': bar.low,
+        'close': bar.close,
+        'volume': bar.volume,
+    }
+
+
+def get_latest_bar(db: Session, symbol: str, granularity: str = TICK):
+    bar = db.query(models.PriceBar.timestamp, models.PriceBar.open, models.PriceBar.high,
+                   models.PriceBar.low, models.PriceBar.close, models.PriceBar.volume)\
+        .filter(models.PriceBar.symbol == symbol.upper(), models.PriceBar.granularity == granularity)\
+        .order_by(models.PriceBar.timestamp.desc())\
+        .first()
+    return _bar_dict(bar) if bar else None
+
+
+def get_bars(db: Session, symbol: str, granularity: str = DAILY, start: datetime = None,
+             end: datetime = None, limit: int = None):
+    query = db.query(models.PriceBar.timestamp, models.PriceBar.open, models.PriceBar.high,
+                     models.PriceBar.low, models.PriceBar.close, models.PriceBar.volume)\
+        .filter(models.PriceBar.symbol == symbol.upper(), models.PriceBar.granularity == granularity)
+    if start:
+        query = query.filter(models.PriceBar.timestamp >= start)
+    if end:
+        query = query.filter(models.PriceBar.timestamp <= end)
+    query = query.order_by(models.PriceBar.timestamp.desc())
+    if limit:
+        query = query.limit(limit)
+    bars = query.all()
+    bars.reverse()
+    return [_bar_dict(bar) for bar in bars]
+
+
+# Buckets accepted by get_resampled_bars, as Postgres intervals for date_bin.
+RESAMPLE_INTERVALS = {
+    '1m': '1 minute', '5m': '5 minutes', '15m': '15 minutes', '30m': '30 minutes',
+    '1h': '1 hour', '4h': '4 hours', '1d': '1 day', '1w': '7 days',
+}
+RESAMPLE_SECONDS = {
+    '1m': 60, '5m': 5 * 60, '15m': 15 * 60, '30m': 30 * 60,
+    '1h': 3600, '4h': 4 * 3600, '1d': 86400, '1w': 7 * 86400,
+}
+# date_bin origin; a Monday, so weekly buckets start on Mondays.
+RESAMPLE_ORIGIN = datetime(2000, 1, 3)
+# Most rows get_resampled_bars may return per symbol, estimated as range / bucket.
+MAX_RESAMPLED_BUCKETS = int(os.getenv('MAX_RESAMPLED_BUCKETS', '10000'))
+# Closest spacing of stored rows; ticks are assumed at most one a minute.
+RAW_BAR_SECONDS = {DAILY: 86400, TICK: 60}
+
+
+def _epoch_ms(dt):
+    return int((dt - datetime(1970, 1, 1)).total_seconds() * 1000)
+
+
+def get_latest_bars_batch(db: Session, symbols, granularity: str = TICK):
+    # Latest bar for every symbol in one statement: a LATERAL top-1 per
+    # symbol, each an index-only probe of the covering index.
+    rows = db.execute(text("""
+        SELECT s.symbol, b.timestamp, b.close, b.volume
+        FROM unnest(CAST(:symbols AS varchar[])) AS s(symbol)
+        CROSS JOIN LATERAL (
+            SELECT timestamp, close, volume FROM price_bars
+            WHERE symbol = s.symbol AND granularity = :granularity
+            ORDER BY timestamp DESC
+            LIMIT 1
+        ) b
+    """), {'symbols': [symbol.upper() for symbol in symbols], 'granularity': granularity}).all()
+    return {
+        'symbol': [row.symbol for row in rows],
+        't': [_epoch_ms(row.timestamp) for row in rows],
+        'close': [row.close for row in rows],
+        'volume': [row.volume for row in rows],
+    }
+
+
+def _resampled_rows(db: Session, symbols, granularity: str, interval: str = None, start: datetime = None,
+                   end: datetime = None, before: datetime = None):
+    filters = "symbol = ANY(CAST(:symbols AS varchar[])) AND granularity = :granularity"
+    params = {'symbols': symbols, 'granularity': granularity, 'start': start, 'end': end, 'before': before}
+    if start:
+        filters += " AND timestamp >= :start"
+    if end:
+        filters += " AND timestamp <= :end"
+    if before:
+        filters += " AND timestamp < :before"
+
+    if interval:
+        params.update(interval=RESAMPLE_INTERVALS[interval], origin=RESAMPLE_ORIGIN)
+        statement = f"""
+            SELECT symbol, date_bin(CAST(:interval AS interval), timestamp, :origin) AS bucket,
+                   (array_agg(open ORDER BY timestamp))[1] AS open,
+                   max(high) AS high, min(low) AS low,
+                   (array_agg(close ORDER BY timestamp DESC))[1] AS close,
+                   CAST(sum(volume) AS bigint) AS volume
+            FROM price_bars WHERE {filters}
+            GROUP BY symbol, bucket
+            ORDER BY symbol, bucket
+        """
+    else:
+        statement = f"""
+            SELECT symbol, timestamp AS bucket, open, high, low, close, volume
+            FROM price_bars WHERE {filters}
+            ORDER BY symbol, timestamp
+        """
+    return db.execute(text(statement), params)
+
+
+def _append_columns(result, rows):
+    for row in rows:
+        columns = result.get(row.symbol)
+        if columns is None:
+            columns = result[row.symbol] = {'t': [], 'open': [], 'high': [], 'low': [], 'close': [], 'volume': []}
+        columns['t'].append(_epoch_ms(row.bucket))
+        columns['open'].append(row.open)
+        columns['high'].append(row.high)
+        columns['low'].append(row.low)
+        columns['close'].append(row.close)
+        columns['volume'].append(row.volume)
+
+
+def get_resampled_bars(db: Session, symbols, granularity: str, start: datetime = None, end: datetime = None,
+                       interval: str = None):
+    # OHLCV for many symbols over a range in one statement, optionally
+    # re-bucketed with date_bin. Returns columnar arrays per symbol. Long
+    # tick ranges take their whole buckets from the rollups and only the
+    # partial buckets at either end from the ticks.
+    if interval is not None and interval not in RESAMPLE_INTERVALS:
+        raise ValueError(f"interval must be one of {', '.join(RESAMPLE_INTERVALS)}")
+    if granularity == TICK and start is None:
+        raise ValueError("from is required for tick bars")
+    symbols = [symbol.upper() for symbol in symbols]
+    start = _naive_utc(start) if start else None
+    end = _naive_utc(end) if end else None
+    bucket_seconds = max(RESAMPLE_SECONDS[interval] if interval else 0, RAW_BAR_SECONDS[granularity])
+    if start is None:
+        # Without from, the most recent MAX_RESAMPLED_BUCKETS buckets up to `to`.
+        start = (end or datetime.utcnow()) - timedelta(seconds=MAX_RESAMPLED_BUCKETS * bucket_seconds)
+    else:
+        buckets = ((end or datetime.utcnow()) - start).total_seconds() / bucket_seconds
+        if buckets > MAX_RESAMPLED_BUCKETS:
+            raise ValueError(f"range spans ~{int(buckets)} bars per symbol, more than {MAX_RESAMPLED_BUCKETS}; "
+                             f"narrow from/to or use a coarser interval")
+
+    result = {}
+    covered = _rollup_span(db, granularity, interval, start, end)
+    if covered is None:
+        _append_columns(result, _resampled_rows(db, symbols, granularity, interval, start, end))
+        return result
+    inner_start, inner_end = covered
+    if start and start < inner_start:
+        _append_columns(result, _resampled_rows(db, symbols, granularity, interval, start, before=inner_start))
+    _append_columns(result, _rollup_rows(db, symbols, interval, inner_start, inner_end))
+    _append_columns(result, _resampled_rows(db, symbols, granularity, interval, inner_end, end))
+    return result
+
+
+CHART_MAX_POINTS = int(os.getenv('CHART_MAX_POINTS', '5000'))
+# SQL buckets per output point; LTTB then picks the final points from them.
+CHART_OVERSAMPLE = 4
+
+
+def _chart_buckets(db: Session, params, bucket_seconds: float, start: datetime = None, end: datetime = None,
+                   before: datetime = None):
+    # Last close (and tick count) per date_bin bucket of bucket_seconds.
+    filters = "symbol = :symbol AND granularity = :granularity"
+    if start:
+        filters += " AND timestamp >= :start"
+    if end:
+        filters += " AND timestamp <= :end"
+    if before:
+        filters += " AND timestamp < :before"
+    return db.execute(text(f"""
+        SELECT max(timestamp) AS timestamp, (array_agg(close ORDER BY timestamp DESC))[1] AS close,
+               count(*) AS points
+        FROM price_bars WHERE {filters}
+        GROUP BY date_bin(make_interval(secs => :bucket_seconds), timestamp, :origin)
+        ORDER BY 1
+    """), {**params, 'start': start, 'end': end, 'before': before, 'bucket_seconds': bucket_seconds,
+           'origin': RESAMPLE_ORIGIN}).all()
+
+
+def _chart_rollup(db: Session, symbol: str, granularity: str, start: datetime, end: datetime, max_points: int):
+    # (resolution, inner_start, inner_end) when a long tick range would be
+    # bucketed at least as coarsely as a rollup: the coarsest such rollup
+    # and the whole buckets of it that cover the range.
+    if granularity != TICK:
+        return None
+    watermarks = get_rollup_watermarks(db)
+    if not watermarks:
+        return None
+    first = start or db.execute(text(
+        "SELECT min(bucket) FROM price_rollups WHERE symbol = :symbol AND resolution = :resolution"
+    ), {'symbol': symbol, 'resolution': ROLLUP_RESOLUTIONS[-1]}).scalar()
+    last = end or datetime.utcnow()
+    if first is None or last - first < ROLLUP_MIN_RANGE:
+        return None
+    target_seconds = (last - first).total_seconds() / (max_points * CHART_OVERSAMPLE)
+    for resolution in reversed(ROLLUP_RESOLUTIONS):
+        step = INTERVAL_SECONDS[resolution]
+        if step > target_seconds or resolution not in watermarks:
+            continue
+        inner_start = _bin_ceil(start, step) if start else None
+        inner_end = _bin_floor(min(watermarks[resolution], end) if end else watermarks[resolution], step)
+        if inner_start is None or inner_start < inner_end:
+            return resolution, inner_start, inner_end
+    return None
+
+
+def get_chart_series(db: Session, symbol: str, granularity: str = DAILY, start: datetime = None,
+                     end: datetime = None, max_points: int = 500):
+    # At most max_points closes for any range. Postgres first collapses the
+    # range into ~4x max_points date_bin buckets (last close per bucket), so a
+    # decade of ticks never leaves the database; LTTB then keeps the points
+    # that preserve the line's shape. Tick ranges coarse enough for an hourly
+    # or daily rollup read its closes instead, plus ticks at the edges.
+    max_points = max(3, min(max_points, CHART_MAX_POINTS))
+    params = {'symbol': symbol.upper(), 'granularity': granularity}
+    start = _naive_utc(start) if start else None
+    end = _naive_utc(end) if end else None
+    resolution = None
+
+    rollup = _chart_rollup(db, params['symbol'], granularity, start, end, max_points)
+    if rollup:
+        resolution, inner_start, inner_end = rollup
+        bucket_seconds = INTERVAL_SECONDS[resolution]
+        rows = []
+        if start and start < inner_start:
+            rows += _chart_buckets(db, params, bucket_seconds, start, before=inner_start)
+        rows += db.execute(text(
+            "SELECT last_timestamp AS timestamp, close, tick_count AS points FROM price_rollups "
+            "WHERE symbol = :symbol AND resolution = :resolution AND bucket < :inner_end"
+            + (" AND bucket >= :inner_start" if inner_start else "") + " ORDER BY bucket"
+        ), {**params, 'resolution': resolution, 'inner_start': inner_start, 'inner_end': inner_end}).all()
+        rows += _chart_buckets(db, params, bucket_seconds, inner_end, end)
+        source_points = sum(row.points for row in rows)
+    else:
+        bounds = db.execute(text(
+            "SELECT min(timestamp) AS first, max(timestamp) AS last, count(*) AS points FROM price_bars "
+            "WHERE symbol = :symbol AND granularity = :granularity"
+            + (" AND timestamp >= :start" if start else "") + (" AND timestamp <= :end" if end else "")
+        ), {**params, 'start': start, 'end': end}).one()
+        source_points = bounds.points
+        bucket_seconds = None
+        if not source_points:
+            rows = []
+        elif source_points > max_points * CHART_OVERSAMPLE:
+            span = (bounds.last - bounds.first).total_seconds()
+            bucket_seconds = max(span / (max_points * CHART_OVERSAMPLE), 1.0)
+            rows = _chart_buckets(db, params, bucket_seconds, bounds.first, bounds.last)
+        else:
+            rows = db.execute(text("""
+                SELECT timestamp, close FROM price_bars
+                WHERE symbol = :symbol AND granularity = :granularity
+                  AND timestamp >= :start AND timestamp <= :end
+                ORDER BY timestamp
+            """), {**params, 'start': bounds.first, 'end': bounds.last}).all()
+
+    times = [_epoch_ms(row.timestamp) for row in rows]
+    closes = [row.close for row in rows]
+    if len(rows) > max_points:
+        keep = lttb_indices(times, closes, max_points).tolist()
+        times = [times[i] for i in keep]
+        closes = [closes[i] for i in keep]
+    return {'symbol': params['symbol'], 'granularity': granularity, 'rollup': resolution,
+            'source_points': source_points,
+            'bucket_seconds': round(bucket_seconds, 3) if bucket_seconds else None, 't': times, 'close': closes}
+
+
+# Hourly and daily OHLC rollups of the ticks (models.PriceRollup), kept
+# current incrementally: each refresh recomputes only the buckets at or after
+# a rollup's watermark, and tick inserts older than the watermark move it
+# back to them. Reads take whole buckets from the rollups and the partial
+# buckets at the range edges and past the watermark from the ticks, so they
+# match a scan of the ticks themselves.
+ROLLUP_RESOLUTIONS = ['1h', '1d']
+# Rollup each RESAMPLE_INTERVALS bucket can be assembled from.
+ROLLUP_SOURCES = {'1h': '1h', '4h': '1h', '1d': '1d', '1w': '1d'}
+INTERVAL_SECONDS = {'1h': 3600, '4h': 4 * 3600, '1d': 86400, '1w': 7 * 86400}
+# Shorter ranges scan the ticks; the few rows saved are not worth extra queries.
+ROLLUP_MIN_RANGE = timedelta(days=1)
+# Serialises refreshes with each other and with tick inserts.
+ROLLUP_LOCK_ID = int(os.getenv('ROLLUP_LOCK_ID', '7305220'))
+
+
+def _bin_floor(dt, seconds):
+    step = timedelta(seconds=seconds)
+    return RESAMPLE_ORIGIN + (dt - RESAMPLE_ORIGIN) // step * step
+
+
+def _bin_ceil(dt, seconds):
+    floor = _bin_floor(dt, seconds)
+    return floor if floor == dt else floor + timedelta(seconds=seconds)
+
+
+def invalidate_rollups(db, since: datetime):
+    # Called in the transaction that writes ticks. The lock waits out a
+    # running refresh, whose snapshot cannot see these ticks, so the
+    # watermark compared here is the one that refresh leaves behind.
+    db.execute(text("SELECT pg_advisory_xact_lock(:id)"), {'id': ROLLUP_LOCK_ID})
+    db.execute(text("UPDATE price_rollup_watermarks SET last_tick = :since, updated_at = now() AT TIME ZONE 'utc' "
+                    "WHERE last_tick > :since"), {'since': _naive_utc(since)})
+
+
+def get_rollup_watermarks(db):
+    return dict(db.execute(text("SELECT resolution, last_tick FROM price_rollup_watermarks")).all())
+
+
+# Per resolution: its buckets recomputed from the source rows at or after :since.
+_ROLLUP_REFRESH_SQL = {
+    '1h': """
+        SELECT symbol, date_trunc('hour', timestamp) AS bucket,
+               (array_agg(open ORDER BY timestamp))[1] AS open, max(high) AS high, min(low) AS low,
+               (array_agg(close ORDER BY timestamp DESC))[1] AS close, CAST(sum(volume) AS bigint) AS volume,
+               count(*) AS tick_count, max(timestamp) AS last_timestamp
+        FROM price_bars WHERE granularity = :tick AND timestamp >= :since
+        GROUP BY symbol, bucket
+    """,
+    # Daily buckets are built from the hourly rows refreshed just before.
+    '1d': """
+        SELECT symbol, date_trunc('day', bucket) AS day,
+               (array_agg(open ORDER BY bucket))[1] AS open, max(high) AS high, min(low) AS low,
+               (array_agg(close ORDER BY bucket DESC))[1] AS close, CAST(sum(volume) AS bigint) AS volume,
+               sum(tick_count) AS tick_count, max(last_timestamp) AS last_timestamp
+        FROM price_rollups WHERE resolution = '1h' AND bucket >= :since
+        GROUP BY symbol, day
+    """,
+}
+
+
+def refresh_rollups(engine):
+    # One transaction for every resolution, so the daily rows never run
+    # ahead of the hourly ones. The first run (no watermark) builds from all
+    # stored ticks.
+    started = time.perf_counter()
+    refreshed = {}
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {'id': ROLLUP_LOCK_ID})
+        watermarks = get_rollup_watermarks(conn)
+        for resolution in ROLLUP_RESOLUTIONS:
+            watermark = watermarks.get(resolution)
+            since = _bin_floor(watermark, INTERVAL_SECONDS[resolution]) if watermark else datetime(1970, 1, 1)
+            buckets, newest = conn.execute(text(f"""
+                WITH upserted AS (
+                    INSERT INTO price_rollups (symbol, resolution, bucket, open, high, low, close, volume,
+                                               tick_count, last_timestamp, updated_at)
+                    SELECT s.symbol, :resolution, s.bucket, s.open, s.high, s.low, s.close, s.volume,
+                           s.tick_count, s.last_timestamp, now() AT TIME ZONE 'utc'
+                    FROM ({_ROLLUP_REFRESH_SQL[resolution]}) AS s(symbol, bucket, open, high, low, close, volume,
+                                                                 tick_count, last_timestamp)
+                    ON CONFLICT (symbol, resolution, bucket) DO UPDATE SET
+                        open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low,
+                        close = EXCLUDED.close, volume = EXCLUDED.volume, tick_count = EXCLUDED.tick_count,
+                        last_timestamp = EXCLUDED.last_timestamp, updated_at = EXCLUDED.updated_at
+                    RETURNING last_timestamp
+                )
+                SELECT count(*), max(last_timestamp) FROM upserted
+            """), {'resolution': resolution, 'tick': TICK, 'since': since}).one()
+            if newest is not None:
+                conn.execute(text("""
+                    INSERT INTO price_rollup_watermarks (resolution, last_tick, updated_at)
+                    VALUES (:resolution, :newest, now() AT TIME ZONE 'utc')
+                    ON CONFLICT (resolution) DO UPDATE SET last_tick = EXCLUDED.last_tick,
+                                                           updated_at = EXCLUDED.updated_at
+                """), {'resolution': resolution, 'newest': newest})
+            refreshed[resolution] = {'since': since.isoformat(), 'buckets': buckets,
+                                     'watermark': (newest or watermark).isoformat() if newest or watermark else None}
+    log.info("Refreshed price rollups", seconds=round(time.perf_counter() - started, 3),
+             **{f"{resolution}_buckets": result['buckets'] for resolution, result in refreshed.items()})
+    return refreshed
+
+
+def _rollup_span(db: Session, granularity: str, interval: str, start: datetime, end: datetime):
+    # (inner_start, inner_end): the whole `interval` buckets of [start, end]
+    # the rollups already hold, or None when the range is read from ticks.
+    source = ROLLUP_SOURCES.get(interval)
+    if granularity != TICK or source is None:
+        return None
+    if start and (end or datetime.utcnow()) - start < ROLLUP_MIN_RANGE:
+        return None
+    watermark = get_rollup_watermarks(db).get(source)
+    if watermark is None:
+        return None
+    step = INTERVAL_SECONDS[interval]
+    inner_start = _bin_ceil(start, step) if start else None
+    inner_end = _bin_floor(min(watermark, end) if end else watermark, step)
+    if inner_start is not None and inner_start >= inner_end:
+        return None
+    return inner_start, inner_end
+
+
+def _rollup_rows(db: Session, symbols, interval: str, start: datetime, before: datetime):
+    # Rollup rows in [start, before), re-bucketed when the interval is
+    # coarser than its source rollup (4h from hourly, 1w from daily).
+    source = ROLLUP_SOURCES[interval]
+    filters = "symbol = ANY(CAST(:symbols AS varchar[])) AND resolution = :source AND bucket < :before"
+    if start:
+        filters += " AND bucket >= :start"
+    params = {'symbols': symbols, 'source': source, 'start': start, 'before': before}
+    if interval == source:
+        statement = f"""
+            SELECT symbol, bucket, open, high, low, close, volume FROM price_rollups
+            WHERE {filters} ORDER BY symbol, bucket
+        """
+    else:
+        params.update(interval=RESAMPLE_INTERVALS[interval], origin=RESAMPLE_ORIGIN)
+        statement = f"""
+            SELECT symbol, date_bin(CAST(:interval AS interval), bucket, :origin) AS bucket,
+                   (array_agg(open ORDER BY bucket))[1] AS open, max(high) AS high, min(low) AS low,
+                   (array_agg(close ORDER BY bucket DESC))[1] AS close, CAST(sum(volume) AS bigint) AS volume
+            FROM price_rollups WHERE {filters}
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+        """
+    return db.execute(text(statement), params)
+
+
+def drop_expired_bar_partitions(engine, now: datetime = None):
+    # Retention by DROP TABLE on whole monthly partitions instead of DELETE.
+    now = now or datetime.utcnow()
+    dropped = []
+    with engine.begin() as conn:
+        for granularity, months in BAR_RETENTION_MONTHS.items():
+            cutoff = _month_start(now)
+            for _ in range(months):
+                cutoff = _month_start(cutoff - timedelta(days=1))
+            partitions = conn.execute(text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = :parent"
+            ), {'parent': _granularity_table(granularity)}).scalars().all()
+            for name in partitions:
+                year, month = name.rsplit('_', 2)[-2:]
+                month_start = datetime(int(year), int(month), 1)
+                if month_start < cutoff:
+                    conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                    with _partitions_lock:
+                        _known_partitions.discard((granularity, month_start))
+                    dropped.append(name)
+    if dropped:
+        log.info("Dropped expired price bar partitions", partitions=','.join(dropped))
+    return dropped
+
+
+def copy_stocks_to_bars(conn):
+    # Copy of the legacy stocks table: rows with a trading_date are daily
+    # closes, the rest are intraday ticks. Runs once as a migration.
+    ensure_granularity_partitions(conn)
+    months = conn.execute(text(
+        "SELECT DISTINCT CASE WHEN trading_date IS NOT NULL THEN :daily ELSE :tick END, "
+        "date_trunc('month', timestamp) FROM stocks WHERE timestamp IS NOT NULL"
+    ), {'daily': DAILY, 'tick': TICK}).all()
+    for granularity, month in months:
+        ensure_bar_partitions(conn, granularity, [month])
+    result = conn.execute(text(
+        "INSERT INTO price_bars (symbol, granularity, timestamp, open, high, low, close, volume) "
+        "SELECT symbol, CASE WHEN trading_date IS NOT NULL THEN :daily ELSE :tick END, "
+        "timestamp, price, price, price, price, NULL "
+        "FROM stocks WHERE symbol IS NOT NULL AND timestamp IS NOT NULL AND price IS NOT NULL "
+        "ON CONFLICT DO NOTHING"
+    ), {'daily': DAILY, 'tick': TICK})
+    first_tick = conn.execute(text(
+        "SELECT min(timestamp) FROM stocks WHERE trading_date IS NULL AND timestamp IS NOT NULL"
+    )).scalar()
+    if first_tick is not None:
+        invalidate_rollups(conn, first_tick)
+    log.info("Migrated stocks into price_bars", rows=result.rowcount)
+    return result.rowcount
+
+
+def migrate_stocks_to_bars(engine):
+    with engine.begin() as conn:
+        return copy_stocks_to_bars(conn)
+
+
+if __name__ == '__main__':
+    # python bar_service.py           copy the legacy stocks table
+    # python bar_service.py rollups   bring the hourly/daily rollups up to date
+    if len(sys.argv) == 2 and sys.argv[1] == 'rollups':
+        print(refresh_rollups(engine))
+    else:
+        migrate_stocks_to_bars(engine)
@@ -0,0 +1,116 @@
+# Checks date_parser.parse_date_range against a corpus of phrasings and times it;
+# tests/test_date_parser.py runs the same corpus under pytest.
+# None means "fall back to the LLM". Run from backend/:
+#   python -m benchmarks.date_parser_corpus
+import sys
+import time
+from datetime import date
+
+from date_parser import parse_date_range
+
+TODAY = date(2025, 6, 13)
+
+CORPUS = [
+    ("How did AAPL do in the last 2 weeks?", ('2025-05-30', '2025-06-13')),
+    ("Price movement over the past 30 days", ('2025-05-14', '2025-06-13')),
+    ("What happened in the last three months?", ('2025-03-13', '2025-06-13')),
+    ("last couple of weeks", ('2025-05-30', '2025-06-13')),
+    ("performance in the past year", ('2024-06-13', '2025-06-13')),
+    ("What about last week?", ('2025-06-06', '2025-06-13')),
+    ("previous month trend", ('2025-05-13', '2025-06-13')),
+    ("since 2 quarters ago", ('2024-12-13', '2025-06-13')),
+    ("How did it trade today?", ('2025-06-13', '2025-06-13')),
+    ("what moved the stock yesterday", ('2025-06-12', '2025-06-12')),
+    ("Q1 2025 performance", ('2025-01-01', '2025-03-31')),
+    ("How was Q4 2024?", ('2024-10-01', '2024-12-31')),
+    ("first quarter of 2024", ('2024-01-01', '2024-03-31')),
+    ("quarter 2 2025", ('2025-04-01', '2025-06-13')),
+    ("how did q3 go", ('2024-07-01', '2024-09-30')),
+    ("Q3 2025 outlook", (None, None)),
+    ("H1 2024 summary", ('2024-01-01', '2024-06-30')),
+    ("second half of 2024", ('2024-07-01', '2024-12-31')),
+    ("What happened in 2024?", ('2024-01-01', '2024-12-31')),
+    ("between 2022 and 2023", ('2022-01-01', '2023-12-31')),
+    ("since 2023", ('2023-01-01', '2025-06-13')),
+    ("from 2025-03-01 to 2025-04-01", ('2025-03-01', '2025-04-01')),
+    ("between 2025-04-01 and 2025-03-01", ('2025-03-01', '2025-04-01')),
+    ("since 2025-05-01", ('2025-05-01', '2025-06-13')),
+    ("What happened on 2025-05-20?", ('2025-05-20', '2025-05-20')),
+    ("from 03/01/2025 to 04/15/2025", ('2025-03-01', '2025-04-15')),
+    ("in March 2025", ('2025-03-01', '2025-03-31')),
+    ("during April", ('2025-04-01', '2025-04-30')),
+    ("news from Dec 2024", ('2024-12-01', '2024-12-31')),
+    ("from January to March 2025", ('2025-01-01', '2025-03-31')),
+    ("What happened on May 5, 2025?", ('2025-05-05', '2025-05-05')),
+    ("since February", ('2025-02-01', '2025-06-13')),
+    ("in September", ('2024-09-01', '2024-09-30')),
+    ("this month so far", ('2025-06-01', '2025-06-13')),
+    ("this week", ('2025-06-09', '2025-06-13')),
+    ("YTD performance", ('2025-01-01', '2025-06-13')),
+    ("year to date return", ('2025-01-01', '2025-06-13')),
+    ("this quarter", ('2025-04-01', '2025-06-13')),
+    ("Why did the stock drop?", (None, None)),
+    ("Should I buy AAPL?", (None, None)),
+    ("What may happen next?", (None, None)),
+    ("Summarize the latest news", (None, None)),
+    ("What is the outlook for 2030?", (None, None)),
+    ("around the last earnings call", None),
+    ("during the holiday season", None),
+    ("early this spring", None),
+    ("over the past several weeks", None),
+    # Prices, verbs and tickers that look like years or months.
+    ("Will AAPL hit 2000 dollars?", (None, None)),
+    ("Is the price above 1950?", (None, None)),
+    ("Sell at $2024?", (None, None)),
+    ("Will the stock march higher?", (None, None)),
+    ("How is MAR doing?", (None, None)),
+    ("dec", (None, None)),
+    ("in march", ('2025-03-01', '2025-03-31')),
+    ("since Mar 3", ('2025-03-03', '2025-06-13')),
+    ("from Jan 2024 to Mar 2024", ('2024-01-01', '2024-03-31')),
+    ("What may happen in April?", ('2025-04-01', '2025-04-30')),
+    ("How did 2024 go?", None),
+    # Several ranges or invalid dates go to the LLM.
+    ("What about the 2024-13-45 figure", None),
+    ("Compare Q1 and Q2 2025", None),
+    ("H1 versus H2 2024", None),
+    ("compare March and April", None),
+    ("returns in 2019, 2020 and 2021", None),
+    ("on 2025-01-02, 2025-02-03 and 2025-03-04", None),
+    ("Q1 2025 vs last year", None),
+    ("last 2 weeks of 2024", None),
+    ("today vs yesterday", None),
+    # Month names after a preposition are months, or the LLM's call.
+    ("What did the stock do in May?", ('2025-05-01', '2025-05-31')),
+    ("news from dec", None),
+    # Counts past the calendar's range.
+    ("performance last 10000 years", None),
+    ("10000000 days ago", None),
+]
+
+
+def main():
+    failures = 0
+    fallbacks = 0
+    for phrase, expected in CORPUS:
+        result = parse_date_range(phrase, today=TODAY)
+        if result is None:
+            fallbacks += 1
+        if result != expected:
+            failures += 1
+            print(f"MISMATCH {phrase!r}: got {result}, expected {expected}")
+
+    rounds = 200
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for phrase, _ in CORPUS:
+            parse_date_range(phrase, today=TODAY)
+    per_parse_us = (time.perf_counter() - started) / (rounds * len(CORPUS)) * 1e6
+
+    print(f"{len(CORPUS)} phrasings, {failures} mismatches, "
+          f"fallback rate {fallbacks / len(CORPUS):.1%}, {per_parse_us:.1f} us per parse")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
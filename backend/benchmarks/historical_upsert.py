@@ -0,0 +1,104 @@
+# Compares the per-row historical insert loop with bulk_insert_daily_bars.
+# Needs a reachable Postgres (config.DATABASE_URL). Run from backend/:
+#   python -m benchmarks.historical_upsert --symbols 20 --days 252
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Date
+
+from config import SessionLocal, engine
+import models
+from migrations import ensure_schema
+from bar_service import ensure_bar_partitions, DAILY
+from stock_service import bulk_insert_daily_bars, STOCKS_DUAL_WRITE
+
+BENCH_PREFIX = 'BENCHUPS'
+
+
+def synthetic_daily_bars(days: int, seed: int):
+    rng = random.Random(seed)
+    price = 100.0
+    start = datetime(2015, 1, 1)
+    bars = []
+    day = start
+    while len(bars) < days:
+        if day.weekday() < 5:
+            price *= 1 + rng.gauss(0, 0.01)
+            bars.append({'date': day, 'close': round(price, 2)})
+        day += timedelta(days=1)
+    return bars
+
+
+def rowwise_insert(db, symbol, entries):
+    # The loop populate_historical_stock_data used before the bulk path,
+    # writing the same tables the bulk path does so both do equal work.
+    with db.get_bind().begin() as conn:
+        ensure_bar_partitions(conn, DAILY, [entry['date'] for entry in entries])
+    inserted = 0
+    for entry in entries:
+        existing_record = db.query(models.PriceBar).filter(
+            models.PriceBar.symbol == symbol,
+            models.PriceBar.granularity == DAILY,
+            models.PriceBar.timestamp == entry['date']
+        ).first()
+        if existing_record:
+            continue
+        db.add(models.PriceBar(symbol=symbol, granularity=DAILY, timestamp=entry['date'], open=entry['close'],
+                               high=entry['close'], low=entry['close'], close=entry['close']))
+        if STOCKS_DUAL_WRITE and not db.query(models.Stock).filter(
+                models.Stock.symbol == symbol,
+                models.Stock.timestamp.cast(Date) == entry['date'].date()).first():
+            db.add(models.Stock(symbol=symbol, price=entry['close'], timestamp=entry['date'],
+                                trading_date=entry['date'].date()))
+        inserted += 1
+    return inserted, len(entries) - inserted
+
+
+def cleanup(db):
+    for table in (models.Stock, models.PriceBar):
+        db.query(table).filter(table.symbol.like(f"{BENCH_PREFIX}%")).delete(synchronize_session=False)
+    db.commit()
+
+
+def run(label, insert_fn, datasets):
+    db = SessionLocal()
+    try:
+        cleanup(db)
+        timings = []
+        for attempt in ('cold', 'warm'):
+            started = time.perf_counter()
+            inserted = skipped = 0
+            for symbol, entries in datasets.items():
+                i, s = insert_fn(db, symbol, entries)
+                db.commit()
+                inserted += i
+                skipped += s
+            elapsed = time.perf_counter() - started
+            timings.append(elapsed)
+            print(f"{label:8s} {attempt}: {elapsed:8.3f}s  inserted={inserted} skipped={skipped}")
+        cleanup(db)
+        return timings
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--symbols', type=int, default=20)
+    parser.add_argument('--days', type=int, default=252)
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    ensure_schema(engine)
+
+    datasets = {f"{BENCH_PREFIX}{i}": synthetic_daily_bars(args.days, i) for i in range(args.symbols)}
+    print(f"{args.symbols} symbols x {args.days} daily bars")
+    rowwise = run('row-wise', rowwise_insert, datasets)
+    bulk = run('bulk', bulk_insert_daily_bars, datasets)
+    print(f"speedup cold: {rowwise[0] / bulk[0]:.1f}x, warm (all duplicates): {rowwise[1] / bulk[1]:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
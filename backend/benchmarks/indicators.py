@@ -0,0 +1,41 @@
+# Times compute_indicators over synthetic daily closes. Run from backend/:
+#   python -m benchmarks.indicators --symbols 1000 --years 10
+import argparse
+import time
+
+import numpy as np
+
+from indicators import compute_indicators, TRADING_DAYS_PER_YEAR
+
+
+def synthetic_closes(symbols: int, days: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    log_returns = rng.normal(0.0003, 0.015, size=(symbols, days))
+    closes = 100 * np.exp(np.cumsum(log_returns, axis=1))
+    # Stagger listing dates so some symbols start with NaN history.
+    starts = rng.integers(0, days // 10, size=symbols)
+    closes[np.arange(days)[None, :] < starts[:, None]] = np.nan
+    return closes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--symbols', type=int, default=1000)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    closes = synthetic_closes(args.symbols, args.years * TRADING_DAYS_PER_YEAR)
+    compute_indicators(closes[:2, :50])
+
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        compute_indicators(closes)
+        timings.append(time.perf_counter() - started)
+    print(f"{args.symbols} symbols x {closes.shape[1]} days: "
+          f"best {min(timings) * 1000:.1f} ms, median {sorted(timings)[len(timings) // 2] * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# Closed-loop HTTP load test: requests/sec and latency percentiles per path.
+# Start the server against a local Postgres first, e.g.
+#   WEB_CONCURRENCY=4 gunicorn -c gunicorn.conf.py wsgi:app
+# then, from backend/:
+#   python -m benchmarks.load_test --url http://localhost:5000 --concurrency 32 --duration 30
+import argparse
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+import requests
+
+DEFAULT_PATHS = [
+    '/api/stocks?symbol=AAPL',
+    '/api/news?symbol=AAPL&limit=20',
+    '/api/bars?symbol=AAPL&granularity=1d&limit=250',
+    '/api/chart?symbol=AAPL&points=500',
+    '/api/prices?symbols=AAPL,AMZN,GOOGL,MSFT,TSLA',
+]
+
+
+def worker(base_url, paths, deadline, offset, results, lock):
+    # Each thread keeps its own keep-alive connection and walks the path list
+    # from a different offset so the mix stays even.
+    session = requests.Session()
+    latencies = {path: [] for path in paths}
+    statuses = Counter()
+    i = offset
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            response = session.get(base_url + path, timeout=30)
+            response.content
+            statuses[response.status_code] += 1
+        except requests.RequestException:
+            statuses['error'] += 1
+            continue
+        latencies[path].append(time.perf_counter() - started)
+    session.close()
+    with lock:
+        for path, values in latencies.items():
+            results['latencies'].setdefault(path, []).extend(values)
+        results['statuses'].update(statuses)
+
+
+def report(label, values, elapsed):
+    values = np.array(values) * 1000
+    if not len(values):
+        print(f"{label:50s} no successful requests")
+        return
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    print(f"{label:50s} {len(values) / elapsed:9.1f} req/s  p50 {p50:7.1f} ms  p95 {p95:7.1f} ms  "
+          f"p99 {p99:7.1f} ms  max {values.max():7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--path', action='append', dest='paths', help='repeatable; defaults to a read mix')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--warmup', type=float, default=2)
+    args = parser.parse_args()
+    paths = args.paths or DEFAULT_PATHS
+
+    for label, duration in (('warmup', args.warmup), ('run', args.duration)):
+        if duration <= 0:
+            continue
+        results = {'latencies': {}, 'statuses': Counter()}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+        threads = [threading.Thread(target=worker, args=(args.url, paths, deadline, i, results, lock))
+                   for i in range(args.concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        if label == 'warmup':
+            continue
+
+        print(f"{args.concurrency} clients for {elapsed:.1f}s against {args.url}")
+        for path in paths:
+            report(path, results['latencies'].get(path, []), elapsed)
+        report('total', [value for values in results['latencies'].values() for value in values], elapsed)
+        print(f"status codes: {dict(results['statuses'])}")
+
+
+if __name__ == '__main__':
+    main()
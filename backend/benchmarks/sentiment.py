@@ -0,0 +1,45 @@
+# Measures sentiment.score_article throughput (articles per second) on
+# synthetic news of realistic length. Run from backend/:
+#   python -m benchmarks.sentiment --articles 20000 --words 400
+import argparse
+import random
+import time
+
+from sentiment import POSITIVE_WORDS, NEGATIVE_WORDS, score_article
+
+FILLER = ('the company said on tuesday that its quarterly results reflected conditions in the market '
+          'analysts expect management to update investors about guidance for the coming year').split()
+
+
+def synthetic_articles(count: int, words: int, seed: int = 0):
+    rng = random.Random(seed)
+    lexicon = sorted(POSITIVE_WORDS) + sorted(NEGATIVE_WORDS)
+    articles = []
+    for i in range(count):
+        body = [rng.choice(lexicon) if rng.random() < 0.05 else rng.choice(FILLER) for _ in range(words)]
+        title = f"Company {i} " + " ".join(rng.choice(lexicon) for _ in range(2))
+        articles.append((title, " ".join(body)))
+    return articles
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--articles', type=int, default=20000)
+    parser.add_argument('--words', type=int, default=400)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    articles = synthetic_articles(args.articles, args.words)
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        for title, content in articles:
+            score_article(title, content)
+        timings.append(time.perf_counter() - started)
+    best = min(timings)
+    print(f"{args.articles} articles x {args.words} words: best {best * 1000:.1f} ms, "
+          f"{args.articles / best:,.0f} articles/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+# Local stand-ins for the EODHD real-time, eod and news endpoints and the
+# Gemini generateContent API, with configurable latency, so ingestion and
+# /api/analyze can be measured without keys or network. Run standalone:
+#   python -m benchmarks.stub_servers --port 8089 --latency-ms 50
+# then point the app at it:
+#   EODHD_API_KEY=stub EODHD_REALTIME_URL=http://127.0.0.1:8089/api/real-time/ \
+#   EODHD_HISTORICAL_URL=http://127.0.0.1:8089/api/eod/ EODHD_NEWS_URL=http://127.0.0.1:8089/api/news \
+#   GEMINI_API_KEY=stub GEMINI_API_ENDPOINT=http://127.0.0.1:8089 python app.py
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from benchmarks.synthetic import generate_news
+
+ANALYSIS_TEXT = ("Shares moved with the broader market over the period. The largest swings followed the "
+                 "earnings report and analyst rating changes in the news, while volume stayed near average. ")
+
+
+class StubState:
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, news_per_symbol: int = 500,
+                 stream_chunks: int = 20, chunk_delay_ms: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.news_per_symbol = news_per_symbol
+        self.stream_chunks = stream_chunks
+        self.chunk_delay_ms = chunk_delay_ms
+        self.seed = seed
+        self.requests = {}
+        self._news = {}
+        self._lock = threading.Lock()
+
+    def count(self, route):
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def delay(self):
+        latency = self.latency_ms + (random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0)
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+    def news_for(self, symbol):
+        # Generated once per symbol, newest first, ending now.
+        with self._lock:
+            items = self._news.get(symbol)
+            if items is None:
+                base = symbol.split('.')[0]
+                items = generate_news([base], self.news_per_symbol, datetime.utcnow(), span_days=7,
+                                      seed=self.seed + zlib.crc32(base.encode()))
+                for item in items:
+                    item['symbols'] = sorted(set(item['symbols']) | {symbol})
+                self._news[symbol] = items
+            return items
+
+
+def _price(symbol, day_offset: int = 0):
+    # Deterministic per symbol and day, so repeated runs store the same rows.
+    rng = random.Random(f"{symbol}:{day_offset}")
+    return round(50 + (sum(map(ord, symbol)) % 400) + rng.uniform(-2, 2), 2)
+
+
+def _quote(full_symbol):
+    now = int(time.time())
+    price = _price(full_symbol)
+    return {'code': full_symbol, 'timestamp': now, 'gmtoffset': 0, 'open': price, 'high': price + 1,
+            'low': price - 1, 'close': price, 'volume': 1000000, 'previousClose': price, 'change': 0,
+            'change_p': 0}
+
+
+def _eod(full_symbol, from_date, to_date):
+    day = datetime.strptime(from_date, '%Y-%m-%d')
+    end = datetime.strptime(to_date, '%Y-%m-%d')
+    rows = []
+    while day <= end:
+        if day.weekday() < 5:
+            close = _price(full_symbol, day.toordinal())
+            rows.append({'date': day.strftime('%Y-%m-%d'), 'open': close, 'high': close + 1, 'low': close - 1,
+                         'close': close, 'adjusted_close': close, 'volume': 1000000})
+        day += timedelta(days=1)
+    return rows
+
+
+def _gemini_response(text):
+    return {'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'}, 'finishReason': 'STOP',
+                            'index': 0}],
+            'usageMetadata': {'promptTokenCount': 0, 'candidatesTokenCount': 0, 'totalTokenCount': 0}}
+
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body go out as separate writes; without this, Nagle plus
+        # delayed ACKs add ~40 ms to every response.
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _json(self, payload, status=200):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            state.delay()
+            if url.path.startswith('/api/real-time/'):
+                state.count('real-time')
+                symbols = [url.path.rsplit('/', 1)[1]] + [s for s in params.get('s', '').split(',') if s]
+                quotes = [_quote(symbol.upper()) for symbol in symbols]
+                return self._json(quotes if len(quotes) > 1 else quotes[0])
+            if url.path.startswith('/api/eod/'):
+                state.count('eod')
+                today = datetime.utcnow().strftime('%Y-%m-%d')
+                return self._json(_eod(url.path.rsplit('/', 1)[1].upper(), params.get('from', today),
+                                       params.get('to', today)))
+            if url.path.rstrip('/') == '/api/news':
+                state.count('news')
+                symbol = params.get('s', '').upper()
+                items = state.news_for(symbol if '.' in symbol else f"{symbol}.US")
+                if params.get('from'):
+                    items = [item for item in items if item['date'][:10] >= params['from']]
+                if params.get('to'):
+                    items = [item for item in items if item['date'][:10] <= params['to']]
+                offset = int(params.get('offset', 0))
+                return self._json(items[offset:offset + int(params.get('limit', 50))])
+            self._json({'message': f"no stub for {url.path}"}, status=404)
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            length = int(self.headers.get('Content-Length') or 0)
+            request = json.loads(self.rfile.read(length) or b'{}')
+            state.delay()
+            config = request.get('generationConfig') or request.get('generation_config') or {}
+            if ':generateContent' in url.path:
+                state.count('gemini')
+                if config.get('responseMimeType', config.get('response_mime_type')) == 'application/json':
+                    return self._json(_gemini_response(json.dumps({'start_date': None, 'end_date': None})))
+                return self._json(_gemini_response(ANALYSIS_TEXT))
+            if ':streamGenerateContent' in url.path:
+                state.count('gemini-stream')
+                # The REST client reads the stream as one JSON array, written
+                # an element at a time.
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                words = ANALYSIS_TEXT.split(' ')
+                size = max(1, len(words) // state.stream_chunks)
+                for i in range(0, len(words), size):
+                    chunk = ' '.join(words[i:i + size]) + ' '
+                    self.wfile.write(('[' if i == 0 else ',\n').encode() + json.dumps(_gemini_response(chunk)).encode())
+                    self.wfile.flush()
+                    if state.chunk_delay_ms:
+                        time.sleep(state.chunk_delay_ms / 1000)
+                self.wfile.write(b']')
+                self.close_connection = True
+                return
+            self._json({'error': {'message': f"no stub for {url.path}"}}, status=404)
+
+    return Handler
+
+
+def start_stub_server(state: StubState, host: str = '127.0.0.1', port: int = 0):
+    # Serves on a daemon thread; returns (server, base_url).
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='stub-server', daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def stub_environment(base_url: str):
+    # Settings that point the app's providers at a stub server.
+    return {
+        'EODHD_API_KEY': 'stub',
+        'EODHD_REALTIME_URL': f"{base_url}/api/real-time/",
+        'EODHD_HISTORICAL_URL': f"{base_url}/api/eod/",
+        'EODHD_NEWS_URL': f"{base_url}/api/news",
+        'GEMINI_API_KEY': 'stub',
+        'GEMINI_API_ENDPOINT': base_url,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--news-per-symbol', type=int, default=500)
+    parser.add_argument('--chunk-delay-ms', type=float, default=0.0)
+    args = parser.parse_args()
+
+    state = StubState(args.latency_ms, args.jitter_ms, args.news_per_symbol, chunk_delay_ms=args.chunk_delay_ms)
+    server, base_url = start_stub_server(state, args.host, args.port)
+    print(f"Stub providers on {base_url}")
+    for key, value in stub_environment(base_url).items():
+        print(f"  {key}={value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+# Offline benchmark suite: ingestion, /api/stocks, /api/news and /api/analyze
+# against the stub providers in benchmarks.stub_servers, so no EODHD or Gemini
+# key is needed. Writes the stored rows to config.DATABASE_URL, so point it at
+# a scratch database. From backend/:
+#   DATABASE_URL=postgresql://.../scratch python -m benchmarks.suite --latency-ms 40
+#   python -m benchmarks.suite --compare benchmarks/results/suite-<earlier>.json
+# Results are written as JSON to benchmarks/results/ (or --output).
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.stub_servers import StubState, start_stub_server, stub_environment
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def summarize(latencies, elapsed=None, **extra):
+    values = np.array(latencies) * 1000
+    result = {'count': len(values), **extra}
+    if len(values):
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        result.update(p50_ms=round(p50, 3), p95_ms=round(p95, 3), p99_ms=round(p99, 3),
+                      mean_ms=round(values.mean(), 3), max_ms=round(values.max(), 3))
+    if elapsed:
+        result['per_second'] = round(len(values) / elapsed, 2)
+    return result
+
+
+def timed_calls(fn, count):
+    latencies = []
+    started = time.perf_counter()
+    for i in range(count):
+        call_started = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - call_started)
+    return latencies, time.perf_counter() - started
+
+
+def bench_ingestion(args, results):
+    from eodhd_price_config import get_stock_prices
+    from stock_service import STOCK_SYMBOLS, update_stock_prices
+    from news_service import update_news, store_news, NEWS_SYMBOLS
+    from benchmarks.synthetic import generate_news, synthetic_symbols
+    from config import SessionLocal
+
+    latencies, elapsed = timed_calls(lambda i: get_stock_prices(STOCK_SYMBOLS), args.requests)
+    results['quotes_fetch'] = summarize(latencies, elapsed, symbols=len(STOCK_SYMBOLS))
+
+    latencies, elapsed = timed_calls(lambda i: update_stock_prices(force=True), args.requests)
+    results['ingest_prices'] = summarize(latencies, elapsed, symbols=len(STOCK_SYMBOLS))
+
+    # First run pages back to the watermark (or the initial lookback); the
+    # second finds nothing new and stops at the first page.
+    for label in ('ingest_news_first', 'ingest_news_repeat'):
+        started = time.perf_counter()
+        summary = update_news(NEWS_SYMBOLS) or {}
+        elapsed = time.perf_counter() - started
+        results[label] = {'seconds': round(elapsed, 3), 'pages': summary.get('pages'),
+                          'fetched': summary.get('fetched'), 'inserted': summary.get('inserted'),
+                          'duplicates': summary.get('duplicates')}
+
+    items = generate_news(synthetic_symbols(20), args.news_articles, datetime.utcnow(), seed=args.seed)
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        inserted = duplicates = 0
+        for i in range(0, len(items), 5000):
+            summary, _ = store_news(db, {'SYN': items[i:i + 5000]})
+            db.commit()
+            inserted += summary['inserted']
+            duplicates += summary['duplicates']
+        elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+    results['store_news_bulk'] = {'articles': len(items), 'inserted': inserted, 'duplicates': duplicates,
+                                  'seconds': round(elapsed, 3), 'articles_per_second': round(len(items) / elapsed, 1)}
+
+
+def bench_endpoints(args, results, client):
+    def get(path):
+        def call(i):
+            response = client.get(path)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{path} returned {response.status_code}")
+        return call
+
+    for name, path in (('api_stocks', '/api/stocks?symbol=AAPL'),
+                       ('api_news', '/api/news?symbol=AAPL&limit=20'),
+                       ('api_news_content', '/api/news?symbol=AAPL&limit=20&include_content=true')):
+        latencies, elapsed = timed_calls(get(path), args.requests)
+        results[name] = summarize(latencies, elapsed)
+
+    def analyze(question_for):
+        def call(i):
+            response = client.post('/api/analyze', json={'question': question_for(i), 'selectedSymbol': 'AAPL'})
+            if response.status_code >= 400:
+                raise RuntimeError(f"/api/analyze returned {response.status_code}")
+        return call
+
+    # Distinct questions miss the LLM cache; a repeated one measures the hit path.
+    latencies, elapsed = timed_calls(analyze(lambda i: f"How did AAPL move last week? ({i})"), args.analyze_requests)
+    results['api_analyze_uncached'] = summarize(latencies, elapsed)
+    latencies, elapsed = timed_calls(analyze(lambda i: "How did AAPL move last week?"), args.analyze_requests)
+    results['api_analyze_cached'] = summarize(latencies, elapsed)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current):
+    # Lower is better for latencies and seconds, higher for rates.
+    print(f"\nchange vs {previous.get('git_commit')} ({previous.get('started_at')}):")
+    for name, result in current['results'].items():
+        before = previous.get('results', {}).get(name)
+        if not before:
+            continue
+        for key in ('p50_ms', 'p99_ms', 'seconds', 'per_second', 'articles_per_second'):
+            if key in result and before.get(key):
+                change = (result[key] - before[key]) / before[key] * 100
+                print(f"  {name:24s} {key:20s} {before[key]:>10} -> {result[key]:>10}  ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='stub provider latency per request')
+    parser.add_argument('--jitter-ms', type=float, default=5.0)
+    parser.add_argument('--chunk-delay-ms', type=float, default=10.0, help='delay between streamed LLM chunks')
+    parser.add_argument('--news-per-symbol', type=int, default=500)
+    parser.add_argument('--news-articles', type=int, default=20000, help='synthetic articles for store_news')
+    parser.add_argument('--requests', type=int, default=200, help='calls per endpoint/ingestion benchmark')
+    parser.add_argument('--analyze-requests', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skip-ingestion', action='store_true')
+    parser.add_argument('--output')
+    parser.add_argument('--compare', help='an earlier results file to diff against')
+    args = parser.parse_args()
+
+    state = StubState(args.latency_ms, args.jitter_ms, args.news_per_symbol, chunk_delay_ms=args.chunk_delay_ms,
+                      seed=args.seed)
+    server, base_url = start_stub_server(state)
+    # Provider URLs are read at import, so the app is imported only after
+    # the environment points at the stub; the scheduler stays off.
+    os.environ.update(stub_environment(base_url))
+    os.environ['SCHEDULER_ENABLED'] = '0'
+    import app
+
+    run = {
+        'started_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'config': vars(args),
+        'results': {},
+    }
+    started = time.perf_counter()
+    if not args.skip_ingestion:
+        bench_ingestion(args, run['results'])
+    bench_endpoints(args, run['results'], app.app.test_client())
+    run['seconds'] = round(time.perf_counter() - started, 2)
+    run['stub_requests'] = dict(state.requests)
+    server.shutdown()
+
+    for name, result in run['results'].items():
+        print(f"{name:24s} {json.dumps(result)}")
+    output = args.output or os.path.join(RESULTS_DIR, f"suite-{run['started_at'].replace(':', '')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(run, f, indent=2)
+    print(f"Wrote {output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), run)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+# Synthetic market data for the offline benchmarks: intraday ticks as a
+# geometric random walk and news articles in EODHD's response format, both
+# reproducible from a seed. Also seeds a scratch database, e.g. from backend/:
+#   DATABASE_URL=postgresql://.../scratch python -m benchmarks.synthetic --ticks 2000000 --news 200000
+import argparse
+import io
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from market_calendar import trading_days, session
+
+TICK_SECONDS = 5
+HEADLINE_TEMPLATES = [
+    "{company} shares {move} after {event}",
+    "{company} {verb} quarterly estimates as {driver}",
+    "Analysts {stance} {company} on {driver}",
+    "{company} faces {risk} amid {driver}",
+    "{company} announces {event}",
+    "Why {company} stock is {move} today",
+]
+WORDS = {
+    'move': ['surge', 'jump', 'rally', 'slump', 'tumble', 'drift lower', 'climb', 'hold steady'],
+    'event': ['earnings beat', 'a product launch', 'a guidance cut', 'a buyback', 'a lawsuit', 'a CEO change',
+              'a partnership', 'an antitrust probe', 'a dividend increase', 'a recall'],
+    'verb': ['beats', 'misses', 'tops', 'meets'],
+    'driver': ['strong demand', 'tariff concerns', 'AI spending', 'weak guidance', 'record margins',
+               'inflation worries', 'cloud growth', 'supply shortages'],
+    'stance': ['upgrade', 'downgrade', 'reiterate buy on', 'turn cautious on'],
+    'risk': ['regulatory pressure', 'slowing growth', 'a supply delay', 'litigation'],
+}
+FILLER = ("The company said results reflected {driver} and management expects the trend to continue. "
+          "Investors weighed the update against broader market conditions, and trading volume was above average. ")
+SOURCES = ['reuters.com', 'bloomberg.com', 'finance.yahoo.com', 'marketwatch.com', 'seekingalpha.com', 'cnbc.com']
+
+
+def synthetic_symbols(count: int):
+    return [f"SYN{i:03d}" for i in range(count)]
+
+
+def tick_times(start_date, days: int, tick_seconds: int = TICK_SECONDS):
+    # Naive UTC datetime64[s] timestamps for every tick of `days` sessions.
+    sessions = []
+    for day in trading_days(start_date, start_date + timedelta(days=days * 2 + 7)):
+        opens, closes = session(day)
+        start = np.datetime64(opens.astimezone(timezone.utc).replace(tzinfo=None), 's')
+        length = int((closes - opens).total_seconds()) // tick_seconds
+        sessions.append(start + np.arange(length) * np.timedelta64(tick_seconds, 's'))
+        if len(sessions) == days:
+            break
+    return np.concatenate(sessions)
+
+
+def generate_ticks(symbols, times, seed: int = 0, start_price: float = 100.0, volatility: float = 0.0004):
+    # (symbols x ticks) prices, a geometric random walk per symbol.
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0, volatility, size=(len(symbols), len(times)))
+    starts = start_price * rng.uniform(0.2, 5.0, size=(len(symbols), 1))
+    return np.round(starts * np.exp(np.cumsum(steps, axis=1)), 4)
+
+
+def generate_news(symbols, count: int, end: datetime, span_days: int = 30, seed: int = 0):
+    # EODHD news items, newest first. Some are syndicated copies of another
+    # article under a different link, like the real feed.
+    rng = random.Random(seed)
+    items = []
+    span_seconds = span_days * 86400
+    for i in range(count):
+        if items and rng.random() < 0.05:
+            original = items[rng.randrange(len(items))]
+            items.append({**original, 'link': f"https://{rng.choice(SOURCES)}/syndicated/{i}"})
+            continue
+        company = rng.choice(symbols)
+        fields = {key: rng.choice(values) for key, values in WORDS.items()}
+        title = rng.choice(HEADLINE_TEMPLATES).format(company=company, **fields)
+        tagged = [company] + rng.sample(symbols, k=min(len(symbols), rng.choice([0, 0, 0, 1, 2])))
+        published = end - timedelta(seconds=rng.randrange(span_seconds))
+        items.append({
+            'date': published.strftime('%Y-%m-%dT%H:%M:%S+00:00'),
+            'title': title,
+            'content': FILLER.format(**fields) * rng.randint(1, 6),
+            'link': f"https://{rng.choice(SOURCES)}/news/{i}",
+            'symbols': sorted({f"{symbol}.US" for symbol in tagged}),
+            'tags': [],
+        })
+    items.sort(key=lambda item: item['date'], reverse=True)
+    return items
+
+
+def _copy(conn, table, columns, lines):
+    buffer = io.StringIO(''.join(lines))
+    cursor = conn.connection.dbapi_connection.cursor()
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+def seed_ticks(engine, symbols, times, prices, chunk_rows: int = 500000):
+    # COPY into price_bars (tick granularity), which /api/stocks reads
+    # through the price cache, and into the legacy stocks table while
+    # STOCKS_DUAL_WRITE is on. The next refresh_rollups folds the ticks into
+    # the rollups.
+    from bar_service import ensure_bar_partitions, invalidate_rollups, TICK
+    from stock_service import STOCKS_DUAL_WRITE
+    stamps = times.astype('datetime64[us]').astype(datetime)
+    with engine.begin() as conn:
+        ensure_bar_partitions(conn, TICK, list(stamps[::5000]) + [stamps[-1]])
+    rows = 0
+    for row, symbol in enumerate(symbols):
+        for start in range(0, len(stamps), chunk_rows):
+            chunk = range(start, min(start + chunk_rows, len(stamps)))
+            iso = [stamps[i].isoformat(sep=' ') for i in chunk]
+            with engine.begin() as conn:
+                _copy(conn, 'price_bars', ['symbol', 'granularity', 'timestamp', 'open', 'high', 'low', 'close'],
+                      [f"{symbol}\t{TICK}\t{stamp}\t{price}\t{price}\t{price}\t{price}\n"
+                       for stamp, price in zip(iso, prices[row, chunk.start:chunk.stop])])
+                if STOCKS_DUAL_WRITE:
+                    _copy(conn, 'stocks', ['symbol', 'price', 'timestamp'],
+                          [f"{symbol}\t{price}\t{stamp}\n" for stamp, price in zip(iso, prices[row, chunk.start:chunk.stop])])
+                invalidate_rollups(conn, stamps[chunk.start])
+            rows += len(chunk)
+    return rows
+
+
+def delete_synthetic(engine, prefix: str = 'SYN'):
+    from sqlalchemy import text
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM price_bars WHERE symbol LIKE :p"), {'p': f"{prefix}%"})
+        conn.execute(text("DELETE FROM stocks WHERE symbol LIKE :p"), {'p': f"{prefix}%"})
+        conn.execute(text("DELETE FROM price_rollups WHERE symbol LIKE :p"), {'p': f"{prefix}%"})
+        conn.execute(text("DELETE FROM news WHERE symbols[1] LIKE :p"), {'p': f"{prefix}%"})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--symbols', type=int, default=20)
+    parser.add_argument('--ticks', type=int, default=1000000, help='total ticks across all symbols')
+    parser.add_argument('--news', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--delete', action='store_true', help='remove previously seeded SYN* rows (do this before reseeding)')
+    args = parser.parse_args()
+
+    from config import engine
+    from migrations import init_db
+    init_db(engine)
+    if args.delete:
+        delete_synthetic(engine)
+        return
+
+    symbols = synthetic_symbols(args.symbols)
+    ticks_per_session = int(6.5 * 3600) // TICK_SECONDS
+    days = max(1, args.ticks // (args.symbols * ticks_per_session))
+    times = tick_times(datetime.utcnow().date() - timedelta(days=days * 2 + 7), days)
+    times = times[:max(1, args.ticks // args.symbols)]
+    prices = generate_ticks(symbols, times, seed=args.seed)
+    started = time.perf_counter()
+    rows = seed_ticks(engine, symbols, times, prices)
+    print(f"Seeded {rows} ticks for {len(symbols)} symbols in {time.perf_counter() - started:.1f}s")
+
+    from config import SessionLocal
+    from news_service import store_news
+    items = generate_news(symbols, args.news, datetime.utcnow(), seed=args.seed)
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        inserted = 0
+        for i in range(0, len(items), 10000):
+            summary, _ = store_news(db, {'SYN': items[i:i + 10000]})
+            db.commit()
+            inserted += summary['inserted']
+    finally:
+        db.close()
+    print(f"Seeded {inserted} news articles in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,2 @@
+# Lets pytest import the backend modules by their top-level names, as the
+# app does. From backend/: pip install pytest && python -m pytest -q
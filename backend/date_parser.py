@@ -0,0 +1,304 @@
+import re
+import calendar
+import threading
+from datetime import date, timedelta
+
+# Deterministic parser for the date phrasings users type most often. Returns
+# (start, end) as YYYY-MM-DD strings, (None, None) when the question clearly
+# has no date range, or None when it cannot tell and the LLM should decide.
+
+MONTHS = {name.lower(): index for index, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): index for index, name in enumerate(calendar.month_abbr) if name})
+MONTHS['sept'] = 9
+_MONTH_PATTERN = '|'.join(sorted(MONTHS, key=len, reverse=True))
+_NUMBER_WORDS = {
+    'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6,
+    'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12, 'couple of': 2, 'few': 3,
+}
+_NUMBER = r'(\d+|a|an|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|couple of|few)'
+_UNIT = r'(day|week|month|quarter|year)s?'
+
+ISO_DATE = re.compile(r'\b(\d{4})-(\d{1,2})-(\d{1,2})\b')
+US_DATE = re.compile(r'\b(\d{1,2})/(\d{1,2})/(\d{4})\b')
+RELATIVE = re.compile(rf'\b(?:last|past|previous|over the last|over the past|in the last|in the past)\s+{_NUMBER}\s+{_UNIT}\b')
+SINGLE_RELATIVE = re.compile(r'\b(?:last|past|previous)\s+(day|week|month|quarter|year)\b')
+AGO = re.compile(rf'\b{_NUMBER}\s+{_UNIT}\s+ago\b')
+THIS_PERIOD = re.compile(r'\b(?:this|current)\s+(week|month|quarter|year)\b|\b(ytd|year[- ]to[- ]date|mtd|month[- ]to[- ]date|qtd|quarter[- ]to[- ]date)\b')
+QUARTER = re.compile(r'\b(?:q([1-4])|(first|second|third|fourth|1st|2nd|3rd|4th)\s+quarter|quarter\s+([1-4]))(?:\s+(?:of\s+)?(?:fy\s*)?(\d{4}))?\b')
+HALF = re.compile(r'\b(?:h([12])|(first|second)\s+half)(?:\s+(?:of\s+)?(\d{4}))?\b')
+MONTH_YEAR = re.compile(rf'\b({_MONTH_PATTERN})\.?(?:\s+(\d{{1,2}})(?:st|nd|rd|th)?)?(?:,?\s+(\d{{4}}))?\b')
+# Month tokens that are also ordinary words ("may", "march", "mar", "dec")
+# count only with a day or year attached; "march" and "may" also after a
+# preposition. Other abbreviations after one ("since dec") go to the LLM.
+_STRICT_MONTHS = {name.lower() for name in calendar.month_abbr if name} | {'sept'}
+_PREPOSITION_MONTHS = {'march', 'may'}
+_MONTH_PREPOSITION = re.compile(r'\b(?:in|during|since|from|until|till|through|to|of|by|early|mid|late)\s+$')
+# A year needs a preposition or "year"/"fy" in front; "hit 2000" or
+# "above 1950" is a price, not a year.
+YEAR = re.compile(r'\b(?:in|during|for|of|since|from|between|and|to|through|until|till|year|fy)\s+((?:19|20)\d{2})\b')
+BARE_YEAR = re.compile(r'\b((?:19|20)\d{2})\b')
+_AMOUNT_BEFORE = re.compile(r'(?:\$|\b(?:price|prices|priced|target|above|below|hit|hits|reach|reaches|at)\s+(?:of\s+)?)$')
+_AMOUNT_AFTER = re.compile(r'^(?:\.\d+)?\s*(?:dollars|usd|bucks|\$|a share|per share)')
+# Text allowed between the two ends of a range ("January to March").
+_RANGE_CONNECTOR = re.compile(r'^\s*(?:to|and|through|until|till|-)\s*$')
+TODAY = re.compile(r'\b(today|yesterday)\b')
+UNHANDLED_TIME_WORDS = re.compile(r'\b(since|between|until|till|through|during|ago|earnings|season|weeks?|months?|years?|quarters?|days?|last|past|early|late|mid|holiday|christmas)\b')
+
+_ORDINALS = {'first': 1, '1st': 1, 'second': 2, '2nd': 2, 'third': 3, '3rd': 3, 'fourth': 4, '4th': 4}
+
+_stats_lock = threading.Lock()
+_stats = {'parsed': 0, 'no_range': 0, 'fallback': 0}
+
+
+def _fmt(value: date):
+    return value.strftime('%Y-%m-%d')
+
+
+def _number(token):
+    return int(token) if token.isdigit() else _NUMBER_WORDS[token]
+
+
+def _shift_months(value: date, months: int):
+    month_index = value.year * 12 + value.month - 1 + months
+    year, month = divmod(month_index, 12)
+    return date(year, month + 1, min(value.day, calendar.monthrange(year, month + 1)[1]))
+
+
+def _subtract(today: date, count: int, unit: str):
+    if unit == 'day':
+        return today - timedelta(days=count)
+    if unit == 'week':
+        return today - timedelta(weeks=count)
+    months = {'month': 1, 'quarter': 3, 'year': 12}[unit] * count
+    return _shift_months(today, -months)
+
+
+def _month_range(year: int, month: int):
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _quarter_range(year: int, quarter: int):
+    start_month = 3 * (quarter - 1) + 1
+    return date(year, start_month, 1), _month_range(year, start_month + 2)[1]
+
+
+def _clamp(start: date, end: date, today: date):
+    # Mirrors the LLM path: a future start means no range, a future end is cut to today.
+    if start > today:
+        return None, None
+    return _fmt(start), _fmt(min(end, today))
+
+
+def _safe_date(year, month, day):
+    try:
+        return date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+
+
+def _explicit_dates(text):
+    # None when a date-shaped token is not a real date ("2024-13-45").
+    found = []
+    for match in ISO_DATE.finditer(text):
+        found.append((match.start(), _safe_date(*match.groups())))
+    for match in US_DATE.finditer(text):
+        month, day, year = match.groups()
+        found.append((match.start(), _safe_date(year, month, day)))
+    if any(value is None for _, value in found):
+        return None
+    return [value for _, value in sorted(found)]
+
+
+def _is_amount(text, start, end):
+    return bool(_AMOUNT_BEFORE.search(text[:start]) or _AMOUNT_AFTER.match(text[end:]))
+
+
+def _is_range(text, first, second, group=0):
+    # Two matches are one range when joined like "X to Y" or "between X and
+    # Y"; a plain "X and Y" is two ranges.
+    connector = _RANGE_CONNECTOR.match(text[first.end(group):second.start(group)])
+    if connector is None:
+        return False
+    return connector.group(0).strip() != 'and' or bool(re.search(r'\bbetween\s+$', text[:first.start(group)]))
+
+
+def _month_matches(text):
+    candidates = list(MONTH_YEAR.finditer(text))
+    months = []
+    for match in candidates:
+        name, day, year = match.groups()
+        if day or year:
+            months.append(match)
+        elif name in _PREPOSITION_MONTHS and _MONTH_PREPOSITION.search(text[:match.start()]):
+            months.append(match)
+        elif name not in _STRICT_MONTHS and name not in _PREPOSITION_MONTHS:
+            months.append(match)
+    if months:
+        # Next to a real month, "march" or "mar" is one too ("March and
+        # April"); "may" stays a verb ("what may happen in April").
+        months = [match for match in candidates if match.group(1) != 'may' or match in months]
+    return months
+
+
+def _unhandled_month(text, months):
+    # A month-like word after a preposition that is not taken as a month.
+    taken = {month.start() for month in months}
+    return any(match.start() not in taken and not match.group(2) and not match.group(3)
+               and _MONTH_PREPOSITION.search(text[:match.start()])
+               for match in MONTH_YEAR.finditer(text))
+
+
+def _time_expressions(text, months):
+    # (kind, start, end) of every date expression, minus those inside another
+    # ("2025" in "Q1 2025"); a question mixing kinds ("Q1 2025 vs last
+    # year", "last 2 weeks of 2024") is more than this parser resolves.
+    found = [('date', match.start(), match.end()) for pattern in (ISO_DATE, US_DATE) for match in pattern.finditer(text)]
+    for kind, pattern in (('today', TODAY), ('relative', RELATIVE), ('relative', SINGLE_RELATIVE), ('ago', AGO),
+                          ('this', THIS_PERIOD), ('quarter', QUARTER), ('half', HALF)):
+        found += [(kind, match.start(), match.end()) for match in pattern.finditer(text)]
+    found += [('month', match.start(), match.end()) for match in months]
+    found += [('year', match.start(1), match.end(1)) for match in BARE_YEAR.finditer(text)
+              if not _is_amount(text, match.start(1), match.end(1))]
+    kept = []
+    for kind, start, end in sorted(found, key=lambda item: (item[1], -item[2])):
+        if not any(k_start <= start and end <= k_end for _, k_start, k_end in kept):
+            kept.append((kind, start, end))
+    return kept
+
+
+def _year_for(explicit_year, month_or_quarter_start: date, today: date):
+    # "Q4" or "March" without a year means the most recent one that has started.
+    if explicit_year:
+        return int(explicit_year)
+    return today.year if month_or_quarter_start.replace(year=today.year) <= today else today.year - 1
+
+
+def parse_date_range(question: str, today: date = None):
+    # Counts beyond the calendar ("last 10000 years") go to the LLM too.
+    try:
+        return _parse_date_range(question, today or date.today())
+    except (ValueError, OverflowError):
+        return None
+
+
+def _parse_date_range(question: str, today: date):
+    text = (question or '').lower()
+
+    months = _month_matches(text)
+    if _unhandled_month(text, months):
+        return None
+    expressions = _time_expressions(text, months)
+    kinds = {kind for kind, _, _ in expressions}
+    # Quarters, halves, months, years and dates check their own pairs below.
+    if len(kinds) > 1 or (kinds & {'today', 'relative', 'ago', 'this'} and len(expressions) > 1):
+        return None
+
+    dates = _explicit_dates(text)
+    if dates is None or len(dates) > 2:
+        return None
+    if len(dates) == 2:
+        return _clamp(min(dates), max(dates), today)
+    if len(dates) == 1:
+        if re.search(r'\b(since|from|after)\b', text):
+            return _clamp(dates[0], today, today)
+        return _clamp(dates[0], dates[0], today)
+
+    match = TODAY.search(text)
+    if match:
+        day = today if match.group(1) == 'today' else today - timedelta(days=1)
+        return _fmt(day), _fmt(day)
+
+    match = RELATIVE.search(text) or AGO.search(text)
+    if match:
+        return _fmt(_subtract(today, _number(match.group(1)), match.group(2))), _fmt(today)
+    match = SINGLE_RELATIVE.search(text)
+    if match:
+        return _fmt(_subtract(today, 1, match.group(1))), _fmt(today)
+
+    match = THIS_PERIOD.search(text)
+    if match:
+        period = match.group(1) or match.group(2)
+        if period == 'week':
+            start = today - timedelta(days=today.weekday())
+        elif period in ('month', 'mtd') or period.startswith('month'):
+            start = today.replace(day=1)
+        elif period in ('quarter', 'qtd') or period.startswith('quarter'):
+            start = date(today.year, 3 * ((today.month - 1) // 3) + 1, 1)
+        else:
+            start = date(today.year, 1, 1)
+        return _fmt(start), _fmt(today)
+
+    # Several quarters, halves, months or years ("Q1 and Q2") are more than
+    # one range; the LLM decides what was meant.
+    quarters = list(QUARTER.finditer(text))
+    if len(quarters) > 1:
+        return None
+    match = quarters[0] if quarters else None
+    if match:
+        quarter = int(match.group(1) or match.group(3) or _ORDINALS[match.group(2)])
+        start, _ = _quarter_range(today.year, quarter)
+        year = _year_for(match.group(4), start, today)
+        return _clamp(*_quarter_range(year, quarter), today)
+
+    halves = list(HALF.finditer(text))
+    if len(halves) > 1:
+        return None
+    match = halves[0] if halves else None
+    if match:
+        half = int(match.group(1) or (1 if match.group(2) == 'first' else 2))
+        start_month = 1 if half == 1 else 7
+        year = _year_for(match.group(3), date(today.year, start_month, 1), today)
+        return _clamp(date(year, start_month, 1), _month_range(year, start_month + 5)[1], today)
+
+    if len(months) > 2 or (len(months) == 2 and not _is_range(text, *months)):
+        return None
+    if months:
+        ranges = []
+        for match in months:
+            month = MONTHS[match.group(1)]
+            year = _year_for(match.group(3), date(today.year, month, 1), today)
+            if match.group(2):
+                day = _safe_date(year, month, match.group(2))
+                if day is None:
+                    return None
+                ranges.append((day, day))
+            else:
+                ranges.append(_month_range(year, month))
+        end = today if re.search(r'\bsince\b', text) else max(r[1] for r in ranges)
+        return _clamp(min(r[0] for r in ranges), end, today)
+
+    year_matches = [match for match in YEAR.finditer(text) if not _is_amount(text, match.start(1), match.end(1))]
+    accepted = {match.start(1) for match in year_matches}
+    for match in BARE_YEAR.finditer(text):
+        # A year-like number with no date context: the LLM decides.
+        if match.start(1) not in accepted and not _is_amount(text, match.start(1), match.end(1)):
+            return None
+    if len(year_matches) > 2 or (len(year_matches) == 2 and not _is_range(text, *year_matches, group=1)):
+        return None
+    years = [int(match.group(1)) for match in year_matches]
+    if years:
+        start_year, end_year = min(years), max(years)
+        if re.search(r'\bsince\b', text):
+            end_year = today.year
+        return _clamp(date(start_year, 1, 1), date(end_year, 12, 31), today)
+
+    # Time words we do not handle locally go to the LLM; anything else has no range.
+    if UNHANDLED_TIME_WORDS.search(text):
+        return None
+    return None, None
+
+
+def record_outcome(result):
+    with _stats_lock:
+        if result is None:
+            _stats['fallback'] += 1
+        elif result == (None, None):
+            _stats['no_range'] += 1
+        else:
+            _stats['parsed'] += 1
+
+
+def parser_stats():
+    with _stats_lock:
+        total = sum(_stats.values())
+        return dict(_stats, total=total, fallback_rate=round(_stats['fallback'] / total, 4) if total else 0.0)
@@ -0,0 +1,40 @@
+import numpy as np
+
+# Largest-Triangle-Three-Buckets (Steinarsson, 2013). Picks at most `threshold`
+# points that keep the visual shape of a line chart: the first and last points
+# are kept, and from each bucket in between, the point forming the largest
+# triangle with the previously chosen point and the next bucket's average.
+
+
+def lttb_indices(x, y, threshold: int):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    length = len(x)
+    threshold = max(threshold, 3)
+    if threshold >= length:
+        return np.arange(length)
+
+    # Bucket boundaries over the points between the first and the last.
+    edges = np.floor(np.linspace(1, length - 1, threshold - 1)).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = length - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_stop = edges[bucket + 2] if bucket + 2 < len(edges) else length
+        next_start = stop
+        average_x = x[next_start:next_stop].mean()
+        average_y = y[next_start:next_stop].mean()
+
+        # Twice the triangle area; the constant factor does not change the argmax.
+        areas = np.abs((x[previous] - average_x) * (y[start:stop] - y[previous])
+                       - (x[previous] - x[start:stop]) * (average_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def lttb(x, y, threshold: int):
+    indices = lttb_indices(x, y, threshold)
+    return np.asarray(x)[indices], np.asarray(y)[indices]
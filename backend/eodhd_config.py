@@ -1,38 +1,135 @@
 import os
-import requests
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+
+from eodhd_price_config import get_http_session, REQUEST_TIMEOUT
+from instrumentation import get_logger, provider_span
 
 load_dotenv()
 
+log = get_logger('eodhd.news')
+
 EODHD_API_KEY = os.getenv('EODHD_API_KEY')
-BASE_URL = 'https://eodhd.com/api/news'
+BASE_URL = os.getenv('EODHD_NEWS_URL', 'https://eodhd.com/api/news')
+
+# EODHD caps a news page at 1000 items; smaller pages keep each response quick.
+NEWS_PAGE_SIZE = int(os.getenv('EODHD_NEWS_PAGE_SIZE', '100'))
+NEWS_PAGE_CONCURRENCY = int(os.getenv('EODHD_NEWS_PAGE_CONCURRENCY', '4'))
+NEWS_MAX_PAGES = int(os.getenv('EODHD_NEWS_MAX_PAGES', '50'))
+# Shared budget for every news request made by this process.
+NEWS_REQUESTS_PER_SECOND = float(os.getenv('EODHD_NEWS_REQUESTS_PER_SECOND', '5'))
+
+
+class RateLimiter:
+    # Spaces calls evenly so that at most `rate` start per second across threads.
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
 
-def get_news(symbol: str, from_date: str = None, to_date: str = None):
+
+news_rate_limiter = RateLimiter(NEWS_REQUESTS_PER_SECOND)
+
+
+def _news_params(symbol, from_date, to_date, offset, limit):
     if not to_date:
-        to_date = '2025-06-13'
+        to_date = datetime.utcnow().strftime('%Y-%m-%d')
     if not from_date:
-        from_date = '2025-05-20'
-    
-    try:
-        params = {
-            'api_token': EODHD_API_KEY,
-            's': symbol,
-            'offset': 0,
-            'limit': 5,
-        }
-        
-        response = requests.get(BASE_URL, params=params)
-        print(f"API Response Status Code: {response.status_code}")
-        
+        from_date = (datetime.strptime(to_date, '%Y-%m-%d') - timedelta(days=7)).strftime('%Y-%m-%d')
+    return {
+        'api_token': EODHD_API_KEY,
+        's': symbol,
+        'from': from_date,
+        'to': to_date,
+        'offset': offset,
+        'limit': limit or NEWS_PAGE_SIZE,
+        'fmt': 'json',
+    }
+
+
+def _fetch_news_page(symbol, from_date=None, to_date=None, offset=0, limit=None):
+    news_rate_limiter.acquire()
+    with provider_span('eodhd', 'news'):
+        response = get_http_session().get(BASE_URL, params=_news_params(symbol, from_date, to_date, offset, limit),
+                                          timeout=REQUEST_TIMEOUT)
         data = response.json()
-        
-        if isinstance(data, list):
-            return data
-        else:
-            print(f"Error fetching news: {data.get('message', 'Unknown error')}")
-            return []
-            
+        if not isinstance(data, list):
+            raise ValueError(data.get('message', 'Unknown error') if isinstance(data, dict) else data)
+    return data
+
+
+def get_news(symbol: str, from_date: str = None, to_date: str = None, offset: int = 0, limit: int = None):
+    try:
+        return _fetch_news_page(symbol, from_date, to_date, offset, limit)
     except Exception as e:
-        print(f"Error fetching news: {str(e)}")
+        log.warning("EODHD news request failed", symbol=symbol, error=e)
         return []
+
+
+def parse_news_time(item):
+    try:
+        timestamp = datetime.fromisoformat(item['date'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def get_news_since(symbol: str, since: datetime = None, from_date: str = None, to_date: str = None,
+                   page_size: int = None, concurrency: int = None, max_pages: int = None):
+    # Pages newest-first through the symbol's news until a page comes back
+    # short or reaches `since` (naive UTC). Pages are requested in waves of
+    # `concurrency` offsets; the shared rate limiter bounds the request rate.
+    # Returns (items, pages, complete); complete is False if a page failed or
+    # max_pages cut it off, so callers know not to trust the range as covered.
+    page_size = page_size or NEWS_PAGE_SIZE
+    concurrency = concurrency or NEWS_PAGE_CONCURRENCY
+    max_pages = max_pages or NEWS_MAX_PAGES
+    if since is not None and not from_date:
+        from_date = since.strftime('%Y-%m-%d')
+
+    def fetch(offset):
+        try:
+            return _fetch_news_page(symbol, from_date, to_date, offset, page_size)
+        except Exception as e:
+            log.warning("EODHD news page failed", symbol=symbol, offset=offset, error=e)
+            return None
+
+    items = []
+    pages = 0
+    done = False
+    failed = False
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while pages < max_pages and not done:
+            offsets = [(pages + i) * page_size for i in range(min(concurrency, max_pages - pages))]
+            results = list(executor.map(fetch, offsets))
+            pages += len(offsets)
+
+            for page in results:
+                if page is None:
+                    failed = done = True
+                    continue
+                for item in page:
+                    item_time = parse_news_time(item)
+                    if since is not None and item_time is not None and item_time < since:
+                        done = True
+                        continue
+                    items.append(item)
+                if len(page) < page_size:
+                    done = True
+    if not done:
+        log.warning("Stopped paging news before reaching the start", symbol=symbol, pages=pages,
+                    start=since or from_date)
+    return items, pages, done and not failed
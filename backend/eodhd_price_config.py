@@ -1,19 +1,64 @@
 import os
+import time
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from datetime import datetime
 import pytz
+from instrumentation import get_logger, provider_span
 
 load_dotenv()
 
 EODHD_API_KEY = os.getenv('EODHD_API_KEY')
-BASE_URL = 'https://eodhd.com/api/real-time/'
-EODHD_HISTORICAL_BASE_URL = 'https://eodhd.com/api/eod/' 
+BASE_URL = os.getenv('EODHD_REALTIME_URL', 'https://eodhd.com/api/real-time/')
+EODHD_HISTORICAL_BASE_URL = os.getenv('EODHD_HISTORICAL_URL', 'https://eodhd.com/api/eod/')
+
+# EODHD accepts extra tickers on a real-time request through the `s` parameter;
+# the provider recommends keeping each request to a small number of tickers.
+QUOTE_BATCH_SIZE = int(os.getenv('EODHD_QUOTE_BATCH_SIZE', '15'))
+QUOTE_MAX_WORKERS = int(os.getenv('EODHD_QUOTE_MAX_WORKERS', '8'))
+REQUEST_TIMEOUT = float(os.getenv('EODHD_REQUEST_TIMEOUT', '10'))
+
+log = get_logger('eodhd.prices')
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session():
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=QUOTE_MAX_WORKERS, pool_maxsize=QUOTE_MAX_WORKERS)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _http_session = session
+    return _http_session
+
+
+def _full_symbol(symbol: str):
+    symbol = symbol.upper()
+    return symbol if '.' in symbol else f"{symbol}.US"
+
+
+def _parse_quote(data):
+    if not isinstance(data, dict) or 'close' not in data or 'timestamp' not in data:
+        return None
+    try:
+        price = float(data['close'])
+        timestamp_dt = datetime.fromtimestamp(int(data['timestamp']), tz=pytz.utc)
+    except (ValueError, TypeError):
+        return None
+    return {'price': price, 'timestamp': timestamp_dt}
 
 
 def get_stock_price(symbol):
     if not EODHD_API_KEY:
-        print("Error: EODHD_API_KEY not found in environment variables.")
+        log.error("EODHD_API_KEY not found in environment variables.")
         return None
 
     full_symbol = f"{symbol.upper()}.US" 
@@ -24,87 +69,159 @@ def get_stock_price(symbol):
             'fmt': 'json', 
         }
         
-        response = requests.get(f"{BASE_URL}{full_symbol}", params=params)
+        # Non-200 raises inside the span, so it counts as a provider error.
+        with provider_span('eodhd', 'quote'):
+            response = get_http_session().get(f"{BASE_URL}{full_symbol}", params=params, timeout=REQUEST_TIMEOUT)
+            if response.status_code != 200:
+                raise requests.exceptions.HTTPError(f"HTTP Status {response.status_code}")
+        # Raw bodies only at DEBUG, and only for a sample of calls.
+        log.debug("EODHD real-time response", sample_rate=0.01, symbol=full_symbol,
+                  status=response.status_code, body=response.text[:500])
 
-        print(f"DEBUG: EODHD Real-Time Response Status Code for {full_symbol}: {response.status_code}")
-        print(f"DEBUG: EODHD Real-Time Raw Response Text for {full_symbol}: {response.text}")
-
-        if response.status_code != 200:
-            print(f"Error fetching price for {full_symbol}: HTTP Status {response.status_code}. Response: {response.text}")
-            return None
-
-        data = response.json()
-        
-        print(f"DEBUG: EODHD Real-Time Parsed JSON Data for {full_symbol}: {data}")
-        
-        if isinstance(data, dict) and 'close' in data and 'timestamp' in data:
-            price = float(data['close'])
-            unix_timestamp = int(data['timestamp'])
-            timestamp_dt = datetime.fromtimestamp(unix_timestamp, tz=pytz.utc)
-
-            print(f"Successfully fetched price for {full_symbol}: {price} at {timestamp_dt}")
-            return {'price': price, 'timestamp': timestamp_dt}
-        else:
-            print(f"Error fetching price for {full_symbol}: Unexpected data format or missing 'close'/'timestamp'. Data: {data}")
-            return None
+        quote = _parse_quote(response.json())
+        if quote is None:
+            log.warning("EODHD real-time response missing close/timestamp", symbol=full_symbol)
+        return quote
             
     except requests.exceptions.RequestException as req_err:
-        print(f"Network or request error fetching price for {full_symbol}: {req_err}")
-        return None
-    except (ValueError, KeyError) as parse_err: # Removed IndexError as it's no longer a list
-        print(f"Data parsing error for {full_symbol}: {parse_err}. Raw data: {response.text}")
+        log.warning("EODHD real-time request error", symbol=full_symbol, error=req_err)
         return None
-    except Exception as e:
-        print(f"An unexpected error occurred fetching price for {full_symbol}: {str(e)}")
+    except ValueError as parse_err:
+        log.warning("EODHD real-time response is not JSON", symbol=full_symbol, error=parse_err)
         return None
-    
-def get_eodhd_historical_data(symbol: str, start_date: str, end_date: str):
-    
+
+
+def _fetch_quote_batch(batch):
+    # The first ticker goes in the path, the rest ride along in `s`.
+    full_symbols = [_full_symbol(symbol) for symbol in batch]
+    params = {
+        'api_token': EODHD_API_KEY,
+        'fmt': 'json',
+    }
+    if len(full_symbols) > 1:
+        params['s'] = ','.join(full_symbols[1:])
+
+    started = time.perf_counter()
+    with provider_span('eodhd', 'quotes'):
+        response = get_http_session().get(f"{BASE_URL}{full_symbols[0]}", params=params, timeout=REQUEST_TIMEOUT)
+        if response.status_code != 200:
+            raise requests.exceptions.HTTPError(f"HTTP Status {response.status_code}")
+    elapsed = time.perf_counter() - started
+
+    data = response.json()
+    items = data if isinstance(data, list) else [data]
+
+    by_code = {}
+    for item in items:
+        if isinstance(item, dict) and item.get('code'):
+            by_code[item['code'].upper()] = item
+    # A single-ticker response may omit `code`.
+    if len(full_symbols) == 1 and not by_code and isinstance(data, dict):
+        by_code[full_symbols[0]] = data
+
+    quotes = {}
+    for symbol, full_symbol in zip(batch, full_symbols):
+        quotes[symbol] = _parse_quote(by_code.get(full_symbol))
+    return quotes, elapsed
+
+
+# Returns (quotes, stats): quotes maps every requested symbol to
+# {'price', 'timestamp'} or None, stats carries per-symbol latency (seconds
+# of the request that carried the symbol) and failure counts.
+def get_stock_prices(symbols, batch_size: int = None, max_workers: int = None):
+    batch_size = batch_size or QUOTE_BATCH_SIZE
+    max_workers = max_workers or QUOTE_MAX_WORKERS
+
+    quotes = {symbol: None for symbol in symbols}
+    stats = {
+        'symbols': len(symbols),
+        'requests': 0,
+        'failures': 0,
+        'failed_symbols': [],
+        'latency': {},
+        'elapsed': 0.0,
+    }
+    if not symbols:
+        return quotes, stats
     if not EODHD_API_KEY:
-        print("Error: EODHD_API_KEY not found in environment variables.")
-        return []
+        log.error("EODHD_API_KEY not found in environment variables.")
+        stats['failures'] = len(symbols)
+        stats['failed_symbols'] = list(symbols)
+        return quotes, stats
 
-    full_symbol = f"{symbol.upper()}.US" 
+    batches = [symbols[i:i + batch_size] for i in range(0, len(symbols), batch_size)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+        futures = {executor.submit(_fetch_quote_batch, batch): batch for batch in batches}
+        for future in as_completed(futures):
+            batch = futures[future]
+            stats['requests'] += 1
+            try:
+                batch_quotes, elapsed = future.result()
+            except Exception as e:
+                log.warning("EODHD quote batch failed", first=batch[0], last=batch[-1], symbols=len(batch), error=e)
+                batch_quotes, elapsed = {}, None
+            for symbol in batch:
+                quote = batch_quotes.get(symbol)
+                quotes[symbol] = quote
+                if elapsed is not None:
+                    stats['latency'][symbol] = elapsed
+                if quote is None:
+                    stats['failed_symbols'].append(symbol)
+    stats['failures'] = len(stats['failed_symbols'])
+    stats['elapsed'] = time.perf_counter() - started
+    return quotes, stats
 
-    try:
-        params = {
-            'api_token': EODHD_API_KEY,
-            'fmt': 'json',
-            'from': start_date,
-            'to': end_date
-        }
-        
-        response = requests.get(f"{EODHD_HISTORICAL_BASE_URL}{full_symbol}", params=params)
 
-        print(f"DEBUG: EODHD Historical Response Status Code for {full_symbol} ({start_date} to {end_date}): {response.status_code}")
+def fetch_historical_data(symbol: str, start_date: str, end_date: str):
+    # Daily bars for [start_date, end_date]. Raises on a missing key, HTTP
+    # errors and malformed responses, so callers that retry can tell an
+    # outage from a range with no data; unparseable records are skipped.
+    if not EODHD_API_KEY:
+        raise RuntimeError("EODHD_API_KEY not found in environment variables.")
+
+    full_symbol = f"{symbol.upper()}.US"
+    params = {
+        'api_token': EODHD_API_KEY,
+        'fmt': 'json',
+        'from': start_date,
+        'to': end_date
+    }
 
+    with provider_span('eodhd', 'historical'):
+        response = get_http_session().get(f"{EODHD_HISTORICAL_BASE_URL}{full_symbol}", params=params, timeout=REQUEST_TIMEOUT)
         if response.status_code != 200:
-            print(f"Error fetching historical data for {full_symbol}: HTTP Status {response.status_code}. Response: {response.text}")
-            return []
+            raise requests.exceptions.HTTPError(f"HTTP Status {response.status_code}: {response.text[:200]}")
 
-        data = response.json()
-        
-        
-        if isinstance(data, list):
-            historical_records = []
-            for item in data:
-                if 'date' in item and 'close' in item:
-                    try:
-                        record_date = datetime.strptime(item['date'], '%Y-%m-%d')
-                        historical_records.append({
-                            'date': record_date,
-                            'close': float(item['close'])
-                        })
-                    except (ValueError, TypeError) as e:
-                        print(f"Warning: Could not parse date or price for historical record: {item}. Error: {e}")
-            return historical_records
-        else:
-            print(f"Error fetching historical data for {full_symbol}: API returned non-list data or error. Data: {data}")
-            return []
-            
-    except requests.exceptions.RequestException as req_err:
-        print(f"Network or request error fetching historical data for {full_symbol}: {req_err}")
+    data = response.json()
+    if not isinstance(data, list):
+        raise ValueError(f"EODHD historical response is not a list: {str(data)[:200]}")
+
+    historical_records = []
+    for item in data:
+        if 'date' in item and 'close' in item:
+            try:
+                record_date = datetime.strptime(item['date'], '%Y-%m-%d')
+                historical_records.append({
+                    'date': record_date,
+                    'open': float(item.get('open', item['close'])),
+                    'high': float(item.get('high', item['close'])),
+                    'low': float(item.get('low', item['close'])),
+                    'close': float(item['close']),
+                    'volume': int(item['volume']) if item.get('volume') is not None else None
+                })
+            except (ValueError, TypeError) as e:
+                log.warning("Skipping unparseable historical record", symbol=full_symbol, item=item, error=e)
+    return historical_records
+
+
+def get_eodhd_historical_data(symbol: str, start_date: str, end_date: str):
+    # fetch_historical_data that logs failures and returns [] instead.
+    try:
+        return fetch_historical_data(symbol, start_date, end_date)
+    except (requests.exceptions.RequestException, ValueError) as req_err:
+        log.warning("EODHD historical request error", symbol=symbol, start=start_date, end=end_date, error=req_err)
         return []
     except Exception as e:
-        print(f"An unexpected error occurred fetching historical data for {full_symbol}: {str(e)}")
+        log.error("Unexpected error fetching historical data", symbol=symbol, start=start_date, end=end_date, error=e)
         return []
@@ -0,0 +1,263 @@
+import os
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+import numpy as np
+import pytz
+from sqlalchemy import func, case
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+import models
+from config import SessionLocal
+from sentiment import LABEL_THRESHOLD
+from stock_service import get_daily_close_matrix
+from instrumentation import get_logger
+
+# Windows are trading-day offsets from the event day, inclusive: "0:1" is the
+# event day and the day after. Set EVENT_WINDOWS to e.g. "0:0,-1:1,0:5".
+EVENT_WINDOWS = [tuple(int(part) for part in window.split(':'))
+                 for window in os.getenv('EVENT_WINDOWS', '0:0,0:1,-1:1,0:5').split(',')]
+EVENT_STUDY_LOOKBACK_DAYS = int(os.getenv('EVENT_STUDY_LOOKBACK_DAYS', '30'))
+EVENT_STUDY_BATCH_SIZE = 5000
+EVENT_INSERT_CHUNK_SIZE = 1000
+
+EASTERN = pytz.timezone('America/New_York')
+MARKET_CLOSE_HOUR = 16
+
+log = get_logger('event_study')
+
+
+def window_key(window):
+    return f"{window[0]}:{window[1]}"
+
+
+def event_trading_dates(timestamps):
+    # News published after the 16:00 ET close can only move the next session.
+    dates = []
+    for timestamp in timestamps:
+        eastern = pytz.utc.localize(timestamp).astimezone(EASTERN)
+        day = eastern.date()
+        if eastern.hour >= MARKET_CLOSE_HOUR:
+            day += timedelta(days=1)
+        dates.append(day)
+    return np.array(dates, dtype='datetime64[D]')
+
+
+def log_returns(closes):
+    returns = np.full_like(closes, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns[:, 1:] = np.log(closes[:, 1:] / closes[:, :-1])
+    return returns
+
+
+def event_window_returns(returns, rows, event_days, windows):
+    # returns: (symbols x days) log returns. rows/event_days: one entry per
+    # event, the symbol row and the index of its event day. The market is an
+    # equal-weight average of the symbols' returns. Window sums come from
+    # cumulative sums, so each event costs O(1) per window. Returns
+    # {window: (raw, market, abnormal)} as simple returns, NaN where the
+    # window runs outside the data or a day in it is missing.
+    n_symbols, n_days = returns.shape
+    valid = ~np.isnan(returns)
+    filled = np.where(valid, returns, 0.0)
+    symbols_per_day = valid.sum(axis=0)
+    market = np.where(symbols_per_day > 0, filled.sum(axis=0) / np.maximum(symbols_per_day, 1), np.nan)
+    cumulative = np.zeros((n_symbols, n_days + 1))
+    np.cumsum(filled, axis=1, out=cumulative[:, 1:])
+    counts = np.zeros((n_symbols, n_days + 1), dtype=np.int64)
+    np.cumsum(valid, axis=1, out=counts[:, 1:])
+    market_valid = ~np.isnan(market)
+    market_cumulative = np.r_[0.0, np.cumsum(np.where(market_valid, market, 0.0))]
+    market_counts = np.r_[0, np.cumsum(market_valid)]
+
+    results = {}
+    for start_offset, end_offset in windows:
+        start = event_days + start_offset
+        stop = event_days + end_offset + 1
+        length = end_offset - start_offset + 1
+        inside = (start >= 1) & (stop <= n_days)
+        start = np.clip(start, 0, n_days)
+        stop = np.clip(stop, 0, n_days)
+        complete = inside & (counts[rows, stop] - counts[rows, start] == length) \
+            & (market_counts[stop] - market_counts[start] == length)
+
+        raw = np.expm1(cumulative[rows, stop] - cumulative[rows, start])
+        market_return = np.expm1(market_cumulative[stop] - market_cumulative[start])
+        raw[~complete] = np.nan
+        market_return[~complete] = np.nan
+        results[(start_offset, end_offset)] = (raw, market_return, raw - market_return)
+    return results
+
+
+def news_source(url):
+    host = urlparse(url or '').netloc.lower()
+    return host[4:] if host.startswith('www.') else host or None
+
+
+def _price_symbol(news_symbol):
+    return news_symbol[:-3] if news_symbol.endswith('.US') else news_symbol
+
+
+def compute_event_rows(db: Session, articles, windows=EVENT_WINDOWS):
+    # articles: rows with id, timestamp, symbols, url, sentiment. Returns the
+    # result rows for every (article, symbol) whose windows are all complete.
+    if not articles:
+        return []
+    event_dates = event_trading_dates([article.timestamp for article in articles])
+    lookback = max(0, -min(start for start, _ in windows)) * 2 + 7
+    lookahead = max(end for _, end in windows) * 2 + 7
+    start_date = (event_dates.min() - np.timedelta64(lookback, 'D')).astype(object)
+    end_date = (event_dates.max() + np.timedelta64(lookahead, 'D')).astype(object)
+    price_symbols, dates, closes = get_daily_close_matrix(db, None, start_date, end_date)
+    if not price_symbols:
+        return []
+    symbol_rows = {symbol: row for row, symbol in enumerate(price_symbols)}
+
+    article_index, rows = [], []
+    for index, article in enumerate(articles):
+        for news_symbol in article.symbols or []:
+            row = symbol_rows.get(_price_symbol(news_symbol))
+            if row is not None:
+                article_index.append(index)
+                rows.append(row)
+    if not rows:
+        return []
+    article_index = np.array(article_index)
+    rows = np.array(rows)
+    # First trading day on or after the event date.
+    event_days = np.searchsorted(dates, event_dates[article_index], side='left')
+    window_results = event_window_returns(log_returns(closes), rows, event_days, windows)
+
+    complete = np.ones(len(rows), dtype=bool)
+    for raw, _, _ in window_results.values():
+        complete &= ~np.isnan(raw)
+
+    computed_at = datetime.utcnow()
+    results = []
+    for i in np.flatnonzero(complete):
+        article = articles[article_index[i]]
+        for window, (raw, market_return, abnormal) in window_results.items():
+            results.append({
+                'news_id': article.id,
+                'symbol': price_symbols[rows[i]],
+                'event_window': window_key(window),
+                'event_date': dates[event_days[i]].astype(object),
+                'source': news_source(article.url),
+                'sentiment': article.sentiment,
+                'raw_return': round(float(raw[i]), 6),
+                'market_return': round(float(market_return[i]), 6),
+                'abnormal_return': round(float(abnormal[i]), 6),
+                'computed_at': computed_at,
+            })
+    return results
+
+
+def update_event_study(lookback_days: int = EVENT_STUDY_LOOKBACK_DAYS, batch_size: int = EVENT_STUDY_BATCH_SIZE):
+    # Incremental: only articles with no stored results are computed, and an
+    # article whose post-event days have not traded yet is simply retried on
+    # the next run. lookback_days=None walks the whole news table once.
+    stored = 0
+    scanned = 0
+    last_id = 0
+    while True:
+        db = SessionLocal()
+        try:
+            query = db.query(models.News.id, models.News.timestamp, models.News.symbols, models.News.url,
+                             models.News.sentiment)\
+                .filter(models.News.id > last_id, models.News.timestamp.isnot(None))\
+                .filter(~db.query(models.NewsEventReturn.news_id)
+                        .filter(models.NewsEventReturn.news_id == models.News.id).exists())
+            if lookback_days is not None:
+                query = query.filter(models.News.timestamp >= datetime.utcnow() - timedelta(days=lookback_days))
+            articles = query.order_by(models.News.id).limit(batch_size).all()
+            if not articles:
+                break
+            last_id = articles[-1].id
+            scanned += len(articles)
+
+            rows = compute_event_rows(db, articles)
+            for i in range(0, len(rows), EVENT_INSERT_CHUNK_SIZE):
+                statement = pg_insert(models.NewsEventReturn.__table__)\
+                    .values(rows[i:i + EVENT_INSERT_CHUNK_SIZE])\
+                    .on_conflict_do_nothing()
+                stored += db.execute(statement).rowcount
+            db.commit()
+        finally:
+            db.close()
+        if len(articles) < batch_size:
+            break
+    log.info("Event study updated", scanned=scanned, stored=stored)
+    return {'scanned': scanned, 'stored': stored}
+
+
+def get_event_study_summary(db: Session, group_by: str = 'symbol', window: str = '0:1', symbol: str = None,
+                            source: str = None, min_events: int = 1):
+    # Average abnormal return per symbol or per news source, overall and split
+    # by article sentiment, with a t-statistic for the mean.
+    if group_by not in ('symbol', 'source'):
+        raise ValueError("group_by must be 'symbol' or 'source'")
+    table = models.NewsEventReturn
+    group_column = getattr(table, group_by)
+    abnormal = table.abnormal_return
+    query = db.query(
+        group_column.label('key'),
+        func.count().label('events'),
+        func.avg(abnormal).label('mean'),
+        func.stddev_samp(abnormal).label('std'),
+        func.avg(case((abnormal > 0, 1.0), else_=0.0)).label('positive_share'),
+        func.avg(abnormal).filter(table.sentiment > LABEL_THRESHOLD).label('mean_positive_news'),
+        func.avg(abnormal).filter(table.sentiment < -LABEL_THRESHOLD).label('mean_negative_news'),
+    ).filter(table.event_window == window)
+    if symbol:
+        query = query.filter(table.symbol == symbol.upper())
+    if source:
+        query = query.filter(table.source == source.lower())
+    rows = query.group_by(group_column).having(func.count() >= min_events)\
+        .order_by(func.count().desc()).all()
+
+    def _round(value):
+        return round(float(value), 6) if value is not None else None
+
+    summary = []
+    for row in rows:
+        t_stat = None
+        if row.std and row.events > 1:
+            t_stat = round(float(row.mean) / (float(row.std) / np.sqrt(row.events)), 3)
+        summary.append({
+            group_by: row.key,
+            'window': window,
+            'events': row.events,
+            'mean_abnormal_return': _round(row.mean),
+            'std_abnormal_return': _round(row.std),
+            't_stat': t_stat,
+            'positive_share': _round(row.positive_share),
+            'mean_abnormal_return_positive_news': _round(row.mean_positive_news),
+            'mean_abnormal_return_negative_news': _round(row.mean_negative_news),
+        })
+    return summary
+
+
+def get_event_returns(db: Session, symbol: str, window: str = '0:1', limit: int = 50):
+    rows = db.query(models.NewsEventReturn, models.News.title, models.News.timestamp)\
+        .join(models.News, models.News.id == models.NewsEventReturn.news_id)\
+        .filter(models.NewsEventReturn.symbol == symbol.upper(), models.NewsEventReturn.event_window == window)\
+        .order_by(models.NewsEventReturn.event_date.desc(), models.NewsEventReturn.news_id.desc())\
+        .limit(limit)\
+        .all()
+    return [{
+        'news_id': result.news_id,
+        'title': title,
+        'published': published.isoformat(),
+        'event_date': result.event_date.isoformat(),
+        'source': result.source,
+        'sentiment': result.sentiment,
+        'raw_return': result.raw_return,
+        'market_return': result.market_return,
+        'abnormal_return': result.abnormal_return,
+    } for result, title, published in rows]
+
+
+if __name__ == '__main__':
+    # Full pass over every stored article, e.g. after a news or price backfill.
+    update_event_study(lookback_days=None)
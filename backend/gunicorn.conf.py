@@ -0,0 +1,50 @@
+# gunicorn -c gunicorn.conf.py wsgi:app
+# Every setting can be overridden from the environment.
+import os
+import multiprocessing
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', str(multiprocessing.cpu_count() * 2 + 1)))
+# Threaded workers: requests mostly wait on Postgres, EODHD or Gemini. Each
+# open /api/stream or /api/analyze/stream connection holds one thread for
+# its lifetime, so live streams are capped at half the threads per worker
+# and the rest stay free for API requests; past the cap /api/stream answers
+# 503. For thousands of dashboards, run a second gunicorn with
+# GUNICORN_WORKER_CLASS=gevent for /api/stream and raise
+# STREAM_MAX_SUBSCRIBERS there.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+if worker_class == 'gthread':
+    os.environ.setdefault('STREAM_MAX_SUBSCRIBERS', str(max(1, threads // 2)))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = 30
+keepalive = 5
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+
+# One pooled connection per worker thread unless DB_POOL_SIZE says otherwise.
+# config reads this when on_starting first imports it in the master, so it
+# has to be set here, before that. The workers inherit the master's engines
+# through the fork, and only the dispose in post_fork keeps them from
+# sharing its pooled connections.
+os.environ.setdefault('DB_POOL_SIZE', str(threads))
+
+
+def on_starting(server):
+    # Create tables and run migrations once, before any worker exists, then
+    # tell the workers to skip it.
+    from config import engine
+    from migrations import init_db
+    init_db(engine)
+    engine.dispose()
+    os.environ['SKIP_DB_INIT'] = '1'
+
+
+def post_fork(server, worker):
+    # Connections opened in the master must not be shared with the workers:
+    # each worker drops the inherited pools (without closing the master's
+    # sockets) and opens its own. unpooled_engine keeps no connections.
+    import config
+    config.engine.dispose(close=False)
+    config.replica_engine.dispose(close=False)
@@ -0,0 +1,146 @@
+import numpy as np
+
+TRADING_DAYS_PER_YEAR = 252
+
+# Every function takes a (symbols x days) float array of closes and works
+# along axis 1, so all symbols are computed in one pass. NaNs may only lead a
+# row (days before a symbol's first bar); compute_indicators forward-fills
+# interior gaps first. Windows that are not yet full produce NaN.
+
+
+def forward_fill(values):
+    values = np.asarray(values, dtype=np.float64)
+    index = np.where(~np.isnan(values), np.arange(values.shape[1]), 0)
+    np.maximum.accumulate(index, axis=1, out=index)
+    return values[np.arange(values.shape[0])[:, None], index]
+
+
+def _first_valid(values):
+    valid = ~np.isnan(values)
+    return np.where(valid.any(axis=1), valid.argmax(axis=1), values.shape[1])
+
+
+def _mask_warmup(result, first_valid, length):
+    # NaN out positions where fewer than `length` valid values have been seen.
+    result[np.arange(result.shape[1])[None, :] < (first_valid + length - 1)[:, None]] = np.nan
+    return result
+
+
+def returns(closes):
+    result = np.full_like(closes, np.nan)
+    result[:, 1:] = closes[:, 1:] / closes[:, :-1] - 1
+    return result
+
+
+def _rolling_sum(values, window):
+    if window > values.shape[1]:
+        return np.full_like(values, np.nan)
+    cumulative = np.cumsum(np.where(np.isnan(values), 0.0, values), axis=1)
+    result = np.empty_like(cumulative)
+    result[:, :window] = cumulative[:, :window]
+    np.subtract(cumulative[:, window:], cumulative[:, :-window], out=result[:, window:])
+    return _mask_warmup(result, _first_valid(values), window)
+
+
+def sma(closes, window):
+    return _rolling_sum(closes, window) / window
+
+
+def rolling_mean_std(values, window):
+    mean = _rolling_sum(values, window) / window
+    mean_sq = _rolling_sum(values * values, window) / window
+    return mean, np.sqrt(np.maximum(mean_sq - mean * mean, 0.0))
+
+
+def ema(values, span=None, alpha=None):
+    # Recursive along time, vectorised across symbols and seeded with each
+    # symbol's first value. Runs over a time-major copy so every step touches
+    # contiguous memory.
+    alpha = alpha if alpha is not None else 2.0 / (span + 1)
+    first_valid = _first_valid(values)
+    rows = np.arange(values.shape[0])
+    seed = values[rows, np.minimum(first_valid, values.shape[1] - 1)]
+    weighted = np.ascontiguousarray(np.where(np.isnan(values), seed[:, None], values).T) * alpha
+
+    result = np.empty_like(weighted)
+    previous = seed.copy()
+    decay = 1 - alpha
+    for t in range(weighted.shape[0]):
+        previous *= decay
+        previous += weighted[t]
+        result[t] = previous
+    return _mask_warmup(result.T, first_valid, 1)
+
+
+def rsi(closes, period=14):
+    delta = np.full_like(closes, np.nan)
+    delta[:, 1:] = np.diff(closes, axis=1)
+    # Wilder smoothing is an EMA with alpha = 1 / period.
+    avg_gain = ema(np.maximum(delta, 0.0), alpha=1.0 / period)
+    avg_loss = ema(np.maximum(-delta, 0.0), alpha=1.0 / period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = 100 - 100 / (1 + avg_gain / avg_loss)
+    result[avg_loss == 0] = 100.0
+    return _mask_warmup(result, _first_valid(delta), period)
+
+
+def macd(closes, fast=12, slow=26, signal=9):
+    fast_ema = ema(closes, span=fast)
+    slow_ema = ema(closes, span=slow)
+    line = fast_ema - slow_ema
+    signal_line = ema(line, span=signal)
+    return line, signal_line, line - signal_line, fast_ema, slow_ema
+
+
+def bollinger_bands(closes, window=20, num_std=2.0):
+    middle, std = rolling_mean_std(closes, window)
+    width = num_std * std
+    return middle - width, middle, middle + width
+
+
+def rolling_volatility(closes, window=20):
+    return rolling_mean_std(returns(closes), window)[1] * np.sqrt(TRADING_DAYS_PER_YEAR)
+
+
+def drawdown(closes):
+    running_max = np.fmax.accumulate(closes, axis=1)
+    return closes / running_max - 1
+
+
+def compute_indicators(closes):
+    closes = forward_fill(closes)
+    macd_line, macd_signal, macd_histogram, ema_12, ema_26 = macd(closes)
+    bollinger_lower, sma_20, bollinger_upper = bollinger_bands(closes)
+    return {
+        'close': closes,
+        'return': returns(closes),
+        'sma_20': sma_20,
+        'sma_50': sma(closes, 50),
+        'sma_200': sma(closes, 200),
+        'ema_12': ema_12,
+        'ema_26': ema_26,
+        'rsi_14': rsi(closes, 14),
+        'macd': macd_line,
+        'macd_signal': macd_signal,
+        'macd_histogram': macd_histogram,
+        'bollinger_lower': bollinger_lower,
+        'bollinger_upper': bollinger_upper,
+        'volatility_20': rolling_volatility(closes, 20),
+        'drawdown': drawdown(closes),
+    }
+
+
+def _json_values(values):
+    return [None if np.isnan(value) else round(float(value), 6) for value in values]
+
+
+def indicators_to_json(symbols, dates, indicators, series: bool = False):
+    result = {}
+    for row, symbol in enumerate(symbols):
+        if series:
+            result[symbol] = {name: _json_values(values[row]) for name, values in indicators.items()}
+            result[symbol]['dates'] = [str(date) for date in dates]
+        else:
+            result[symbol] = {name: _json_values(values[row, -1:])[0] for name, values in indicators.items()}
+            result[symbol]['date'] = str(dates[-1]) if len(dates) else None
+    return result
@@ -0,0 +1,263 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import threading
+from bisect import bisect_left
+
+from sqlalchemy import event
+
+# Structured logging, timing spans and a Prometheus text-format registry,
+# with no dependency beyond the standard library. METRICS_ENABLED=0 turns
+# every span, counter and histogram into an early return.
+#
+# Metrics are per process: under several gunicorn workers each /metrics
+# scrape sees the worker that answered it, so scrape every worker (or
+# aggregate by the pid label) for totals.
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') != '0'
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# text: "time LEVEL logger message key=value ...", json: one object per line.
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+# Latency buckets in seconds, from cache hits to slow LLM calls.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Formatter(logging.Formatter):
+    def format(self, record):
+        fields = getattr(record, 'fields', None) or {}
+        timestamp = self.formatTime(record, '%Y-%m-%dT%H:%M:%S')
+        if LOG_FORMAT == 'json':
+            entry = {'ts': timestamp, 'level': record.levelname, 'logger': record.name,
+                     'message': record.getMessage(), **fields}
+            if record.exc_info:
+                entry['exception'] = self.formatException(record.exc_info)
+            return json.dumps(entry, default=str)
+        line = f"{timestamp} {record.levelname} {record.name} {record.getMessage()}"
+        if fields:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+_root_logger = logging.getLogger('stockanalyzer')
+if not _root_logger.handlers:
+    _handler = logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(_Formatter())
+    _root_logger.addHandler(_handler)
+    _root_logger.setLevel(LOG_LEVEL)
+    _root_logger.propagate = False
+
+
+class StructuredLogger:
+    # log.info("Fetched quotes", symbols=5, elapsed=0.31). sample_rate < 1
+    # keeps that fraction of the calls, for lines on per-item hot paths.
+    def __init__(self, name: str):
+        self._logger = _root_logger.getChild(name)
+
+    def _log(self, level, message, sample_rate, exc_info, fields):
+        if not self._logger.isEnabledFor(level):
+            return
+        if sample_rate < 1.0 and random.random() >= sample_rate:
+            return
+        self._logger.log(level, message, exc_info=exc_info, extra={'fields': fields})
+
+    def debug(self, message, sample_rate: float = 1.0, **fields):
+        self._log(logging.DEBUG, message, sample_rate, None, fields)
+
+    def info(self, message, sample_rate: float = 1.0, **fields):
+        self._log(logging.INFO, message, sample_rate, None, fields)
+
+    def warning(self, message, sample_rate: float = 1.0, **fields):
+        self._log(logging.WARNING, message, sample_rate, None, fields)
+
+    def error(self, message, sample_rate: float = 1.0, exc_info=None, **fields):
+        self._log(logging.ERROR, message, sample_rate, exc_info, fields)
+
+
+def get_logger(name: str):
+    return StructuredLogger(name)
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, '')) for name in labelnames)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = [(name, value) for name, value in zip(labelnames, key)] + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def render(self):
+        with self._lock:
+            values = list(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in values]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # label key -> [per-bucket counts (+Inf last), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(self.labelnames, labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collect):
+        # collect() returns {name: (type, help, value)}, value a number or a
+        # list of (labels dict, number); read at scrape time, e.g. cache stats.
+        self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        for collect in self._collectors:
+            for name, (metric_type, help_text, value) in collect().items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+                samples = value if isinstance(value, list) else [({}, value)]
+                for labels, sample in samples:
+                    lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {sample}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+REGISTRY.register_collector(lambda: {'process_info': ('gauge', 'Serving process.', [({'pid': os.getpid()}, 1)])})
+
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route.', ['endpoint', 'method', 'status']))
+PROVIDER_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'provider_request_duration_seconds', 'EODHD and Gemini call latency.', ['provider', 'operation']))
+PROVIDER_ERRORS = REGISTRY.register(Counter(
+    'provider_errors_total', 'EODHD and Gemini calls that raised.', ['provider', 'operation']))
+DB_QUERY_SECONDS = REGISTRY.register(Histogram(
+    'db_query_duration_seconds', 'Database statement latency by statement type.', ['statement']))
+INGESTED_ROWS = REGISTRY.register(Counter(
+    'ingested_rows_total', 'Rows written by the ingestion jobs.', ['kind']))
+
+
+class _Span:
+    __slots__ = ('histogram', 'errors', 'labels', 'started')
+
+    def __init__(self, histogram, errors, labels):
+        self.histogram = histogram
+        self.errors = errors
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        # GeneratorExit (a client leaving a stream) is not a provider error.
+        if exc_type is not None and issubclass(exc_type, Exception) and self.errors is not None:
+            self.errors.inc(**self.labels)
+        return False
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(histogram, errors=None, **labels):
+    # with span(PROVIDER_REQUEST_SECONDS, PROVIDER_ERRORS, provider='eodhd', operation='quotes'): ...
+    if not METRICS_ENABLED:
+        return _NOOP_SPAN
+    return _Span(histogram, errors, labels)
+
+
+def provider_span(provider: str, operation: str):
+    return span(PROVIDER_REQUEST_SECONDS, PROVIDER_ERRORS, provider=provider, operation=operation)
+
+
+def _statement_type(statement):
+    head = statement.lstrip()[:12].split(None, 1)
+    return head[0].upper() if head else 'OTHER'
+
+
+def instrument_engine(engine):
+    # Times every statement on the engine. One statement runs per
+    # connection at a time, so the start time lives on the connection.
+    if not METRICS_ENABLED:
+        return
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info['query_started'] = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop('query_started', None)
+        if started is not None:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - started, statement=_statement_type(statement))
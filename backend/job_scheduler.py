@@ -0,0 +1,185 @@
+import os
+import time
+import atexit
+import threading
+from datetime import datetime, timedelta
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.base import BaseTrigger
+from sqlalchemy import text
+
+from market_calendar import is_market_open, next_open, session_close, CLOSING_QUOTE_DELAY
+from instrumentation import get_logger
+
+# Every web worker builds the same scheduler, but only the process holding a
+# Postgres advisory lock runs the jobs, so N workers still make one set of
+# provider calls. The lock lives on a dedicated connection; if the leader
+# dies its connection closes, the lock is released and another worker takes
+# over at its next election check.
+
+SCHEDULER_LOCK_ID = int(os.getenv('SCHEDULER_LOCK_ID', '7305219'))
+LEADER_CHECK_SECONDS = int(os.getenv('LEADER_CHECK_SECONDS', '15'))
+# Set SCHEDULER_ENABLED=0 on processes that should only serve requests.
+SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', '1') != '0'
+
+log = get_logger('scheduler')
+
+
+class MarketHoursTrigger(BaseTrigger):
+    # Fires every open_seconds while the market is open. When it is closed it
+    # fires every closed_seconds, or with closed_seconds=None not until the
+    # next session opens, after one last run just past the close for the
+    # closing quote; either way the first run of a session is at the open.
+    def __init__(self, open_seconds: float, closed_seconds: float = None):
+        self.open_seconds = open_seconds
+        self.closed_seconds = closed_seconds
+
+    def get_next_fire_time(self, previous_fire_time, now):
+        base = previous_fire_time or now
+        if is_market_open(base):
+            fire_time = base + timedelta(seconds=self.open_seconds)
+            if self.closed_seconds is None and not is_market_open(fire_time):
+                # Halfway into the just_closed window, so a run that starts a
+                # little late still counts as part of the session.
+                fire_time = min(fire_time, session_close(base) + CLOSING_QUOTE_DELAY / 2)
+            return fire_time
+        opens = next_open(base)
+        if self.closed_seconds is None:
+            return opens
+        return min(base + timedelta(seconds=self.closed_seconds), opens)
+
+    def __str__(self):
+        closed = f"{self.closed_seconds}s" if self.closed_seconds is not None else 'next open'
+        return f"market_hours[open={self.open_seconds}s, closed={closed}]"
+
+
+class JobMetrics:
+    def __init__(self):
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_seconds = None
+        self.last_started = None
+        self.last_error = None
+
+    def record(self, started, seconds, error=None):
+        self.runs += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.last_seconds = seconds
+        self.last_started = started
+        if error is not None:
+            self.failures += 1
+            self.last_error = error
+
+    def to_dict(self):
+        return {
+            'runs': self.runs,
+            'failures': self.failures,
+            'skipped_not_leader': self.skipped,
+            'last_started': self.last_started.isoformat() if self.last_started else None,
+            'last_seconds': round(self.last_seconds, 3) if self.last_seconds is not None else None,
+            'mean_seconds': round(self.total_seconds / self.runs, 3) if self.runs else None,
+            'max_seconds': round(self.max_seconds, 3),
+            'last_error': self.last_error,
+        }
+
+
+class IngestionScheduler:
+    def __init__(self, lock_engine, lock_id: int = SCHEDULER_LOCK_ID):
+        self.lock_engine = lock_engine
+        self.lock_id = lock_id
+        self.is_leader = False
+        self.leader_since = None
+        self._lock_connection = None
+        self._election_lock = threading.Lock()
+        self._metrics = {}
+        self._scheduler = BackgroundScheduler(job_defaults={'coalesce': True, 'max_instances': 1})
+
+    def add_job(self, func, trigger, name: str = None, args=(), **trigger_args):
+        name = name or func.__name__
+        self._metrics[name] = JobMetrics()
+        self._scheduler.add_job(self._run, trigger, args=[name, func, args], id=name, name=name, **trigger_args)
+
+    def _run(self, name, func, args):
+        metrics = self._metrics[name]
+        if not self.is_leader:
+            metrics.skipped += 1
+            return
+        started = datetime.utcnow()
+        clock = time.perf_counter()
+        error = None
+        try:
+            func(*args)
+        except Exception as e:
+            error = str(e)
+            log.error("Scheduled job failed", exc_info=True, job=name, error=error)
+        metrics.record(started, time.perf_counter() - clock, error)
+
+    def elect(self):
+        # Keeps the lock if this process has it, otherwise tries to take it.
+        with self._election_lock:
+            if self._lock_connection is not None:
+                try:
+                    self._lock_connection.execute(text("SELECT 1"))
+                    return True
+                except Exception as e:
+                    log.warning("Scheduler lost its leader connection", error=e)
+                    self._release()
+            connection = None
+            try:
+                connection = self.lock_engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+                acquired = connection.execute(text("SELECT pg_try_advisory_lock(:id)"), {'id': self.lock_id}).scalar()
+            except Exception as e:
+                log.warning("Scheduler leader election failed", error=e)
+                acquired = False
+            if acquired:
+                self._lock_connection = connection
+                self.is_leader = True
+                self.leader_since = datetime.utcnow()
+                log.info("Scheduler leader elected", pid=os.getpid())
+            elif connection is not None:
+                connection.close()
+            return self.is_leader
+
+    def _release(self):
+        if self._lock_connection is not None:
+            try:
+                self._lock_connection.close()
+            except Exception:
+                pass
+        self._lock_connection = None
+        self.is_leader = False
+        self.leader_since = None
+
+    def start(self):
+        self.elect()
+        self._scheduler.add_job(self.elect, 'interval', seconds=LEADER_CHECK_SECONDS, id='leader_election')
+        self._scheduler.start()
+        atexit.register(self.shutdown)
+
+    def shutdown(self):
+        if self._scheduler.running:
+            self._scheduler.shutdown(wait=False)
+        with self._election_lock:
+            self._release()
+
+    def stats(self):
+        jobs = {}
+        for name, metrics in self._metrics.items():
+            job = self._scheduler.get_job(name)
+            # Jobs of a scheduler that was never started have no next_run_time yet.
+            next_run = getattr(job, 'next_run_time', None)
+            jobs[name] = {
+                'trigger': str(job.trigger) if job else None,
+                'next_run': next_run.isoformat() if next_run else None,
+                **metrics.to_dict(),
+            }
+        return {
+            'pid': os.getpid(),
+            'leader': self.is_leader,
+            'leader_since': self.leader_since.isoformat() if self.leader_since else None,
+            'jobs': jobs,
+        }
@@ -0,0 +1,221 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from instrumentation import get_logger
+
+LLM_CACHE_TTL_SECONDS = float(os.getenv('LLM_CACHE_TTL_SECONDS', '900'))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '512'))
+# Set to a directory to keep entries across restarts and share them between workers.
+LLM_CACHE_DIR = os.getenv('LLM_CACHE_DIR')
+# At most this often, a write also deletes the directory's expired entries.
+LLM_CACHE_SWEEP_SECONDS = float(os.getenv('LLM_CACHE_SWEEP_SECONDS', '300'))
+
+log = get_logger('llm_cache')
+
+_WHITESPACE = re.compile(r'\s+')
+_TRAILING_PUNCTUATION = re.compile(r'[\s?.!]+$')
+
+
+def normalize_question(question: str):
+    question = _WHITESPACE.sub(' ', (question or '').strip().lower())
+    return _TRAILING_PUNCTUATION.sub('', question)
+
+
+def data_version(*payloads):
+    # Changes whenever the prices/news that would go into the prompt change.
+    digest = hashlib.sha256()
+    for payload in payloads:
+        digest.update(json.dumps(payload, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def make_key(*parts):
+    return hashlib.sha256(json.dumps(parts, default=str).encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache:
+    def __init__(self, ttl_seconds: float = LLM_CACHE_TTL_SECONDS, max_entries: int = LLM_CACHE_MAX_ENTRIES,
+                 disk_dir: str = LLM_CACHE_DIR):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._last_sweep = 0.0
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    # Disk reads, writes and sweeps run outside self._lock, so a slow
+    # filesystem does not stall lookups of entries already in memory.
+    def _read_disk(self, key):
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get('stored_at', 0) > self.ttl_seconds:
+            self._remove(path)
+            return None
+        return entry['value'], entry['stored_at']
+
+    def _write_disk(self, key, value, stored_at):
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'value': value, 'stored_at': stored_at}, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError) as e:
+            log.warning("Could not write LLM cache entry to disk", error=e)
+        self._sweep_disk()
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _sweep_disk(self):
+        # Entries (and leftover temp files) whose file is older than the TTL;
+        # other workers sharing the directory may sweep it too.
+        now = time.time()
+        if now - self._last_sweep < LLM_CACHE_SWEEP_SECONDS:
+            return
+        self._last_sweep = now
+        try:
+            with os.scandir(self.disk_dir) as entries:
+                for entry in entries:
+                    try:
+                        expired = now - entry.stat().st_mtime > self.ttl_seconds
+                    except OSError:
+                        continue
+                    if expired and entry.name.endswith(('.json', '.tmp')):
+                        self._remove(entry.path)
+        except OSError as e:
+            log.warning("Could not sweep the LLM cache directory", directory=self.disk_dir, error=e)
+
+    def _store(self, key, value, stored_at):
+        self._entries[key] = (value, stored_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _memory_lookup(self, key):
+        # Caller holds self._lock.
+        entry = self._entries.get(key)
+        if entry is not None:
+            if time.time() - entry[1] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[0]
+            del self._entries[key]
+        return False, None
+
+    def _lookup(self, key):
+        with self._lock:
+            found, value = self._memory_lookup(key)
+        if found or not self.disk_dir:
+            return found, value
+        entry = self._read_disk(key)
+        if entry is None:
+            return False, None
+        with self._lock:
+            self._store(key, *entry)
+            self.hits += 1
+            self.disk_hits += 1
+        return True, entry[0]
+
+    def get_or_compute(self, key, compute, should_cache=None):
+        # Concurrent callers with the same key wait on the first caller's
+        # upstream call instead of issuing their own.
+        found, value = self._lookup(key)
+        if found:
+            return value
+        with self._lock:
+            # Another caller may have stored it during our disk read.
+            found, value = self._memory_lookup(key)
+            if found:
+                return value
+            future = self._inflight.get(key)
+            if future is None:
+                self.misses += 1
+                future = Future()
+                self._inflight[key] = future
+                owner = True
+            else:
+                self.coalesced += 1
+                owner = False
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute()
+        except Exception as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        cacheable = should_cache(value) if should_cache else True
+        stored_at = time.time()
+        with self._lock:
+            if cacheable:
+                self._store(key, value, stored_at)
+            self._inflight.pop(key, None)
+        future.set_result(value)
+        if cacheable and self.disk_dir:
+            self._write_disk(key, value, stored_at)
+        return value
+
+    def get(self, key):
+        found, value = self._lookup(key)
+        if not found:
+            with self._lock:
+                self.misses += 1
+        return found, value
+
+    def put(self, key, value):
+        stored_at = time.time()
+        with self._lock:
+            self._store(key, value, stored_at)
+        if self.disk_dir:
+            self._write_disk(key, value, stored_at)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'disk_dir': self.disk_dir,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'hit_rate': round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            }
+
+
+llm_cache = LLMResponseCache()
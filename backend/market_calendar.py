@@ -0,0 +1,155 @@
+import os
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+
+import pytz
+
+# NYSE/Nasdaq regular sessions, holidays and early closes, computed from the
+# exchange rules so no yearly table needs updating. One-off closures (e.g. a
+# national day of mourning) go in MARKET_EXTRA_HOLIDAYS as comma-separated
+# ISO dates.
+
+EASTERN = pytz.timezone('America/New_York')
+MARKET_OPEN = time(9, 30)
+MARKET_CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+EXTRA_HOLIDAYS = frozenset(date.fromisoformat(day.strip())
+                           for day in os.getenv('MARKET_EXTRA_HOLIDAYS', '').split(',') if day.strip())
+# The closing quote can lag the bell; a run this soon after the close still
+# belongs to the session (see just_closed).
+CLOSING_QUOTE_DELAY = timedelta(seconds=int(os.getenv('CLOSING_QUOTE_DELAY_SECONDS', '60')))
+
+
+def _nth_weekday(year, month, weekday, n):
+    # n-th (1-based) weekday of the month; n=-1 is the last one.
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year, month + 1, 1) - timedelta(days=1) if month < 12 else date(year, 12, 31)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year):
+    # Anonymous Gregorian algorithm.
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _observed(day):
+    # Saturday holidays close the Friday before, Sunday holidays the Monday after.
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+@lru_cache(maxsize=64)
+def holidays(year):
+    days = {
+        _nth_weekday(year, 1, 0, 3),             # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),             # Washington's Birthday
+        _easter(year) - timedelta(days=2),       # Good Friday
+        _nth_weekday(year, 5, 0, -1),            # Memorial Day
+        _observed(date(year, 7, 4)),             # Independence Day
+        _nth_weekday(year, 9, 0, 1),             # Labor Day
+        _nth_weekday(year, 11, 3, 4),            # Thanksgiving
+        _observed(date(year, 12, 25)),           # Christmas
+    }
+    # New Year's Day on a Saturday is not moved back into the old year.
+    if date(year, 1, 1).weekday() != 5:
+        days.add(_observed(date(year, 1, 1)))
+    if year >= 2022:
+        days.add(_observed(date(year, 6, 19)))   # Juneteenth
+    return frozenset(days | {day for day in EXTRA_HOLIDAYS if day.year == year})
+
+
+@lru_cache(maxsize=64)
+def early_closes(year):
+    days = {
+        _nth_weekday(year, 11, 3, 4) + timedelta(days=1),  # day after Thanksgiving
+        date(year, 12, 24),
+        date(year, 7, 3),
+    }
+    return frozenset(day for day in days if day.weekday() < 5 and day not in holidays(year))
+
+
+def is_trading_day(day: date):
+    return day.weekday() < 5 and day not in holidays(day.year)
+
+
+def trading_days(start: date, end: date):
+    day = start
+    while day <= end:
+        if is_trading_day(day):
+            yield day
+        day += timedelta(days=1)
+
+
+def session(day: date):
+    # (open, close) as aware Eastern datetimes, or None when closed all day.
+    if not is_trading_day(day):
+        return None
+    close = EARLY_CLOSE if day in early_closes(day.year) else MARKET_CLOSE
+    return (EASTERN.localize(datetime.combine(day, MARKET_OPEN)),
+            EASTERN.localize(datetime.combine(day, close)))
+
+
+def _eastern_now(now: datetime = None):
+    if now is None:
+        return datetime.now(EASTERN)
+    if now.tzinfo is None:
+        now = pytz.utc.localize(now)
+    return now.astimezone(EASTERN)
+
+
+def is_market_open(now: datetime = None):
+    now = _eastern_now(now)
+    hours = session(now.date())
+    return hours is not None and hours[0] <= now <= hours[1]
+
+
+def session_close(now: datetime = None):
+    # Close of the day's session, or None when the market is shut all day.
+    hours = session(_eastern_now(now).date())
+    return hours[1] if hours is not None else None
+
+
+def just_closed(now: datetime = None):
+    now = _eastern_now(now)
+    close = session_close(now)
+    return close is not None and close < now <= close + CLOSING_QUOTE_DELAY
+
+
+def next_open(now: datetime = None):
+    # Start of the current session if it has not opened yet, else the next one.
+    now = _eastern_now(now)
+    day = now.date()
+    while True:
+        hours = session(day)
+        if hours is not None and now < hours[0]:
+            return hours[0]
+        day += timedelta(days=1)
+
+
+def market_status(now: datetime = None):
+    now = _eastern_now(now)
+    hours = session(now.date())
+    return {
+        'now': now.isoformat(),
+        'open': is_market_open(now),
+        'trading_day': hours is not None,
+        'session_open': hours[0].isoformat() if hours else None,
+        'session_close': hours[1].isoformat() if hours else None,
+        'early_close': now.date() in early_closes(now.year),
+        'next_open': next_open(now).isoformat(),
+    }
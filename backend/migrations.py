@@ -0,0 +1,108 @@
+import os
+
+from sqlalchemy import text
+
+from bar_service import ensure_granularity_partitions, create_upcoming_bar_partitions, copy_stocks_to_bars
+import models
+from models import NEWS_SEARCH_VECTOR_SQL
+
+# Idempotent DDL for tables that predate a column or index added to models.py.
+# create_all only creates missing tables, so existing databases are brought up
+# to date here. Each list runs once per database (see MIGRATIONS).
+STOCK_TRADING_DATE_DDL = [
+    "ALTER TABLE stocks ADD COLUMN IF NOT EXISTS trading_date DATE",
+    # Historical closes were stored at midnight; keep the first row per day.
+    """
+    UPDATE stocks SET trading_date = s.timestamp::date
+    FROM (
+        SELECT MIN(id) AS id, timestamp
+        FROM stocks
+        WHERE trading_date IS NULL AND timestamp::time = '00:00:00'
+        GROUP BY symbol, timestamp
+    ) s
+    WHERE stocks.id = s.id
+      AND NOT EXISTS (
+          SELECT 1 FROM stocks d
+          WHERE d.symbol = stocks.symbol AND d.trading_date = s.timestamp::date
+      )
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_stocks_symbol_trading_date ON stocks (symbol, trading_date)",
+]
+
+NEWS_CONTENT_HASH_DDL = [
+    "ALTER TABLE news ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    # Same normalisation as news_service.news_content_hash.
+    """
+    UPDATE news SET content_hash = encode(sha256(convert_to(
+        lower(regexp_replace(btrim(coalesce(title, '')), '\\s+', ' ', 'g')) || '|' ||
+        lower(regexp_replace(btrim(coalesce(url, '')), '\\s+', ' ', 'g')), 'UTF8')), 'hex')
+    WHERE content_hash IS NULL
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_news_content_hash ON news (content_hash)",
+]
+
+NEWS_INDEX_DDL = [
+    # The old B-tree on symbols cannot serve array membership filters.
+    "DROP INDEX IF EXISTS ix_news_symbols",
+    "CREATE INDEX IF NOT EXISTS ix_news_symbols_gin ON news USING gin (symbols)",
+    "CREATE INDEX IF NOT EXISTS ix_news_timestamp_id_desc ON news (timestamp DESC, id DESC)",
+]
+
+NEWS_SEARCH_DDL = [
+    # Adding a stored generated column rewrites the table once to fill it in.
+    f"ALTER TABLE news ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ({NEWS_SEARCH_VECTOR_SQL}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_news_search_vector ON news USING gin (search_vector)",
+]
+
+# Existing rows stay NULL until `python news_service.py sentiment` scores them.
+NEWS_SENTIMENT_DDL = [
+    "ALTER TABLE news ADD COLUMN IF NOT EXISTS sentiment DOUBLE PRECISION",
+]
+
+# Jobs submitted before updated_at existed count as last touched on submission.
+BACKFILL_JOB_UPDATED_AT_DDL = [
+    "ALTER TABLE backfill_jobs ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITHOUT TIME ZONE",
+    "UPDATE backfill_jobs SET updated_at = submitted_at WHERE updated_at IS NULL",
+]
+
+# Applied in order and recorded in schema_migrations, so the backfill
+# UPDATEs scan their tables on one deploy rather than every startup. A step
+# is SQL or a callable taking the connection. Add new steps at the end;
+# never rename a version that has shipped.
+MIGRATIONS = [
+    ('0001_stocks_trading_date', STOCK_TRADING_DATE_DDL),
+    ('0002_news_content_hash', NEWS_CONTENT_HASH_DDL),
+    ('0003_news_indexes', NEWS_INDEX_DDL),
+    ('0004_news_search_vector', NEWS_SEARCH_DDL),
+    ('0005_news_sentiment', NEWS_SENTIMENT_DDL),
+    # Prices are read from price_bars only; rows written before it existed move over.
+    ('0006_copy_stocks_to_price_bars', [copy_stocks_to_bars]),
+    ('0007_backfill_jobs_updated_at', BACKFILL_JOB_UPDATED_AT_DDL),
+]
+# Concurrent deploys wait for each other instead of applying a step twice.
+MIGRATION_LOCK_ID = int(os.getenv('MIGRATION_LOCK_ID', '7305222'))
+
+
+def ensure_schema(engine):
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {'id': MIGRATION_LOCK_ID})
+        applied = set(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+        for version, statements in MIGRATIONS:
+            if version in applied:
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(text(statement))
+            conn.execute(text("INSERT INTO schema_migrations (version, applied_at) "
+                              "VALUES (:version, now() AT TIME ZONE 'utc')"), {'version': version})
+        ensure_granularity_partitions(conn)
+
+
+def init_db(engine):
+    # Tables plus migrations. Run once per deployment (the gunicorn master
+    # does it before forking), not once per worker.
+    models.Base.metadata.create_all(bind=engine)
+    ensure_schema(engine)
+    create_upcoming_bar_partitions(engine)
@@ -1,7 +1,15 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, UniqueConstraint
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Date, Text, UniqueConstraint, Index, Computed
 from config import Base
 from datetime import datetime
-from sqlalchemy.dialects.postgresql import ARRAY 
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
+
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+
+    # One row per migrations.MIGRATIONS step already applied to this database.
+    version = Column(String, primary_key=True)
+    applied_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
 
 class Stock(Base):
@@ -11,6 +19,73 @@ class Stock(Base):
     symbol = Column(String, index=True)
     price = Column(Float)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    # Set only for daily bars; intraday ticks leave it NULL so they never collide.
+    trading_date = Column(Date)
+
+    __table_args__ = (
+        Index('uq_stocks_symbol_trading_date', 'symbol', 'trading_date', unique=True),
+    )
+
+class PriceBar(Base):
+    __tablename__ = "price_bars"
+
+    symbol = Column(String, primary_key=True)
+    granularity = Column(String, primary_key=True)
+    timestamp = Column(DateTime, primary_key=True)
+    open = Column(Float)
+    high = Column(Float)
+    low = Column(Float)
+    close = Column(Float)
+    volume = Column(BigInteger)
+
+    # Partitioned by granularity, then by calendar month on timestamp
+    # (see bar_service.ensure_bar_partitions).
+    __table_args__ = (
+        {'postgresql_partition_by': 'LIST (granularity)'},
+    )
+
+# Covers "latest N" and range reads for a symbol so they are index-only scans.
+Index(
+    'ix_price_bars_symbol_granularity_timestamp_desc',
+    PriceBar.symbol, PriceBar.granularity, PriceBar.timestamp.desc(),
+    postgresql_include=['open', 'high', 'low', 'close', 'volume'],
+)
+
+# Block range index for the rollup refresh's "ticks since the watermark"
+# scans; ticks arrive in time order, so it stays tiny and cheap to maintain.
+Index('ix_price_bars_timestamp_brin', PriceBar.timestamp, postgresql_using='brin')
+
+class PriceRollup(Base):
+    __tablename__ = "price_rollups"
+
+    # Hourly ('1h') and daily ('1d') OHLC of the intraday ticks, kept current
+    # by bar_service.refresh_rollups. Not subject to tick retention.
+    symbol = Column(String, primary_key=True)
+    resolution = Column(String, primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    open = Column(Float)
+    high = Column(Float)
+    low = Column(Float)
+    close = Column(Float)
+    volume = Column(BigInteger)
+    tick_count = Column(Integer, nullable=False)
+    # Timestamp of the bucket's last tick (its close).
+    last_timestamp = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class RollupWatermark(Base):
+    __tablename__ = "price_rollup_watermarks"
+
+    # Newest tick already folded into the resolution's rollups; inserts of
+    # older ticks move it back so their buckets are recomputed.
+    resolution = Column(String, primary_key=True)
+    last_tick = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+NEWS_SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(content, '')), 'B')"
+)
 
 class News(Base):
     __tablename__ = "news"
@@ -20,4 +95,101 @@ class News(Base):
     content = Column(Text)
     url = Column(String)
     timestamp = Column(DateTime, default=datetime.utcnow) 
-    symbols = Column(ARRAY(String), index=True)
+    symbols = Column(ARRAY(String))
+    # sha256 of normalised title + url (news_service.news_content_hash).
+    content_hash = Column(String(64), unique=True, index=True)
+    # Title terms weigh more than body terms when ranking (news_service.search_news).
+    search_vector = Column(TSVECTOR, Computed(NEWS_SEARCH_VECTOR_SQL, persisted=True))
+    # Lexicon score in [-1, 1] set at ingest (sentiment.score_article).
+    sentiment = Column(Float)
+
+    __table_args__ = (
+        # GIN so "symbols @> ARRAY[...]" membership filters can use an index.
+        Index('ix_news_symbols_gin', 'symbols', postgresql_using='gin'),
+        Index('ix_news_search_vector', 'search_vector', postgresql_using='gin'),
+    )
+
+# Matches the (timestamp, id) keyset used by news_service.list_news.
+Index('ix_news_timestamp_id_desc', News.timestamp.desc(), News.id.desc())
+
+class NewsSentimentDaily(Base):
+    __tablename__ = "news_sentiment_daily"
+
+    # Per-symbol rollup of News.sentiment by UTC publication day.
+    symbol = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    article_count = Column(Integer, nullable=False)
+    sentiment_mean = Column(Float)
+    positive_count = Column(Integer, nullable=False, default=0)
+    negative_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class NewsEventReturn(Base):
+    __tablename__ = "news_event_returns"
+
+    # Market-adjusted return of `symbol` around a news article, one row per
+    # event window (e.g. "-1:1" = trading day before to day after).
+    news_id = Column(Integer, primary_key=True)
+    symbol = Column(String, primary_key=True)
+    event_window = Column(String, primary_key=True)
+    event_date = Column(Date, nullable=False)
+    source = Column(String)
+    sentiment = Column(Float)
+    raw_return = Column(Float)
+    market_return = Column(Float)
+    abnormal_return = Column(Float)
+    computed_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('ix_news_event_returns_symbol_window', 'symbol', 'event_window'),
+        Index('ix_news_event_returns_source_window', 'source', 'event_window'),
+    )
+
+class NewsWatermark(Base):
+    __tablename__ = "news_watermarks"
+
+    # Newest article timestamp (UTC) already stored for the symbol.
+    symbol = Column(String, primary_key=True)
+    last_seen = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class BackfillJob(Base):
+    __tablename__ = "backfill_jobs"
+
+    # A /api/populate-historical request. Progress lives in its tasks, so any
+    # worker can report or resume it (backfill_jobs.py).
+    id = Column(String(32), primary_key=True)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    symbols = Column(ARRAY(String), nullable=False)
+    # 'planning', 'planned', or 'failed' when planning itself failed.
+    status = Column(String, nullable=False)
+    error = Column(Text)
+    submitted_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    # Set by whichever worker finishes the last task; cleared on resume.
+    finished_at = Column(DateTime)
+    # A job left in 'planning' this long ago lost its worker; resume replans it.
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class BackfillTask(Base):
+    __tablename__ = "backfill_tasks"
+
+    # One symbol's chunk of missing trading days: 'pending', 'running',
+    # 'done' or 'failed'. Workers claim pending tasks with SKIP LOCKED.
+    id = Column(Integer, primary_key=True)
+    job_id = Column(String(32), nullable=False)
+    symbol = Column(String, nullable=False)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    status = Column(String, nullable=False, default='pending')
+    inserted = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+    claimed_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    __table_args__ = (
+        Index('ix_backfill_tasks_job_id_status', 'job_id', 'status'),
+        Index('ix_backfill_tasks_symbol_status', 'symbol', 'status'),
+    )
@@ -0,0 +1,153 @@
+import os
+import re
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+from prompt_context import CHARS_PER_TOKEN, estimate_tokens
+from sentiment import sentiment_label
+
+NEWS_CONTEXT_TOKEN_BUDGET = int(os.getenv('NEWS_CONTEXT_TOKEN_BUDGET', '1500'))
+NEWS_CONTEXT_MAX_ARTICLES = int(os.getenv('NEWS_CONTEXT_MAX_ARTICLES', '8'))
+# Longest body any one article may contribute, so a single long article
+# cannot crowd out the rest.
+NEWS_CONTEXT_ARTICLE_TOKENS = int(os.getenv('NEWS_CONTEXT_ARTICLE_TOKENS', '250'))
+RECENCY_HALF_LIFE_HOURS = 48.0
+RECENCY_WEIGHT = 0.4
+KEYWORD_WEIGHT = 0.6
+
+# MinHash over word 3-gram shingles; 32 hashes in 8 LSH bands of 4 rows
+# finds pairs above roughly 0.6 Jaccard, then the estimate is checked.
+MINHASH_PERMUTATIONS = 32
+MINHASH_BANDS = 8
+DUPLICATE_THRESHOLD = 0.7
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = np.random.RandomState(1)
+_HASH_A = _rng.randint(1, 1 << 31, size=MINHASH_PERMUTATIONS).astype(np.uint64)
+_HASH_B = _rng.randint(0, 1 << 31, size=MINHASH_PERMUTATIONS).astype(np.uint64)
+
+_WORD = re.compile(r'[a-z0-9]+')
+_STOP_WORDS = frozenset(
+    'a an and are as at be by did do does for from has have how in is it its of on or that the this to '
+    'was were what when where which who why will with about after before over stock stocks price prices'.split())
+
+
+def _terms(text):
+    return [word for word in _WORD.findall((text or '').lower()) if word not in _STOP_WORDS and len(word) > 1]
+
+
+def minhash_signature(words):
+    if len(words) < 3:
+        shingles = {' '.join(words)}
+    else:
+        shingles = {' '.join(words[i:i + 3]) for i in range(len(words) - 2)}
+    hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles),
+                         dtype=np.uint64, count=len(shingles))
+    # (a * x + b) mod p for every permutation at once, minimised over shingles.
+    permuted = (np.outer(hashes, _HASH_A) + _HASH_B) % _MERSENNE_PRIME
+    return permuted.min(axis=0)
+
+
+def _parse_time(value):
+    try:
+        return datetime.fromisoformat(value).replace(tzinfo=None)
+    except (TypeError, ValueError):
+        return None
+
+
+def score_articles(question, news_data):
+    # Returns one score per article in [0, 1]: recency relative to the newest
+    # article plus the share of question terms found (title matches count double).
+    question_terms = set(_terms(question))
+    times = [_parse_time(article.get('timestamp')) for article in news_data]
+    newest = max((t for t in times if t is not None), default=None)
+
+    scores = []
+    for article, published in zip(news_data, times):
+        recency = 0.0
+        if newest is not None and published is not None:
+            age_hours = (newest - published).total_seconds() / 3600
+            recency = 0.5 ** (age_hours / RECENCY_HALF_LIFE_HOURS)
+        overlap = 0.0
+        if question_terms:
+            title_terms = set(_terms(article.get('title')))
+            body_terms = set(_terms(article.get('content')))
+            overlap = (2 * len(question_terms & title_terms) + len(question_terms & body_terms)) / (3 * len(question_terms))
+        scores.append(RECENCY_WEIGHT * recency + KEYWORD_WEIGHT * overlap)
+    return scores
+
+
+def _truncate(text, max_chars):
+    text = ' '.join((text or '').split())
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    # Prefer ending on a sentence, then on a word.
+    sentence_end = cut.rfind('. ')
+    if sentence_end > max_chars // 2:
+        return cut[:sentence_end + 1]
+    return cut[:cut.rfind(' ')].rstrip() + '...' if ' ' in cut else cut
+
+
+def _format_article(article, body):
+    lines = [f"Title: {article.get('title', '')}", f"Published: {article.get('timestamp', '')}"]
+    if article.get('sentiment') is not None:
+        lines.append(f"Sentiment: {article['sentiment']:+.2f} ({sentiment_label(article['sentiment'])})")
+    if body:
+        lines.append(f"Content: {body}")
+    return "\n".join(lines)
+
+
+def build_news_context(question, news_data, token_budget: int = NEWS_CONTEXT_TOKEN_BUDGET,
+                       max_articles: int = NEWS_CONTEXT_MAX_ARTICLES):
+    # Returns (context text, report). Articles are taken best score first,
+    # skipping near-duplicates of ones already taken, with bodies truncated
+    # so the whole block stays inside token_budget. Linear in total text size.
+    news_data = list(news_data or [])
+    report = {'input_articles': len(news_data), 'selected': 0, 'duplicates': 0, 'truncated': 0,
+              'raw_tokens': sum(estimate_tokens(f"{a.get('title', '')} {a.get('content') or ''}") for a in news_data)}
+    if not news_data:
+        text = "No recent news available."
+        report.update(context_tokens=estimate_tokens(text))
+        return text, report
+
+    scores = score_articles(question, news_data)
+    order = sorted(range(len(news_data)), key=lambda i: scores[i], reverse=True)
+    rows_per_band = MINHASH_PERMUTATIONS // MINHASH_BANDS
+    buckets = {}
+    kept_signatures = []
+    blocks = []
+    remaining_chars = token_budget * CHARS_PER_TOKEN
+
+    for index in order:
+        if len(blocks) >= max_articles or remaining_chars <= 0:
+            break
+        article = news_data[index]
+        signature = minhash_signature(_terms(f"{article.get('title', '')} {article.get('content') or ''}"))
+        band_keys = [(band, signature[band * rows_per_band:(band + 1) * rows_per_band].tobytes())
+                     for band in range(MINHASH_BANDS)]
+        candidates = {kept for key in band_keys for kept in buckets.get(key, ())}
+        if any(np.mean(kept_signatures[kept] == signature) >= DUPLICATE_THRESHOLD for kept in candidates):
+            report['duplicates'] += 1
+            continue
+
+        header_chars = len(_format_article(article, '')) + 12
+        if header_chars > remaining_chars:
+            break
+        body_chars = min(remaining_chars - header_chars, NEWS_CONTEXT_ARTICLE_TOKENS * CHARS_PER_TOKEN)
+        content = ' '.join((article.get('content') or '').split())
+        body = _truncate(content, body_chars)
+        if len(body) < len(content):
+            report['truncated'] += 1
+        block = _format_article(article, body)
+        blocks.append(block)
+        remaining_chars -= len(block) + 2
+
+        for key in band_keys:
+            buckets.setdefault(key, []).append(len(kept_signatures))
+        kept_signatures.append(signature)
+
+    text = "\n\n".join(blocks)
+    report.update(selected=len(blocks), context_tokens=estimate_tokens(text))
+    return text, report
@@ -1,141 +1,501 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import func, tuple_, text, bindparam
 from config import SessionLocal
 import models
-from eodhd_config import get_news
-from datetime import datetime
-from sqlalchemy.exc import IntegrityError
-from datetime import datetime
+from eodhd_config import get_news_since, parse_news_time
+from sentiment import score_article, LABEL_THRESHOLD
+from pubsub import broker, news_topic
+from instrumentation import get_logger, INGESTED_ROWS
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+import base64
+import hashlib
+import os
+import re
+import sys
+import time
+
+log = get_logger('news')
 
 NEWS_SYMBOLS = ['AAPL', 'AMZN', 'GOOGL', 'MSFT', 'TSLA'] 
-def update_news():
-   
-    db = SessionLocal()
-    total_added_count = 0
-    total_duplicate_count = 0
-    
-    to_date = '2025-06-13'
-    from_date = '2025-06-05'
+NEWS_INSERT_BATCH_SIZE = 500
+# How far back the first run for a symbol without a watermark looks.
+NEWS_INITIAL_LOOKBACK_DAYS = int(os.getenv('NEWS_INITIAL_LOOKBACK_DAYS', '7'))
+NEWS_SYMBOL_WORKERS = int(os.getenv('NEWS_SYMBOL_WORKERS', '4'))
+NEWS_BACKFILL_WINDOW_DAYS = int(os.getenv('NEWS_BACKFILL_WINDOW_DAYS', '7'))
+NEWS_LIST_LIMIT = 5
+NEWS_MAX_LIST_LIMIT = 100
+# Most articles from a date range that go into an analysis prompt.
+NEWS_RANGE_LIMIT = int(os.getenv('NEWS_RANGE_LIMIT', '50'))
+# Candidate articles the analyze path hands to news_context, picked by relevance to the question.
+NEWS_CONTEXT_TOP_K = int(os.getenv('NEWS_CONTEXT_TOP_K', '24'))
+NEWS_SEARCH_CANDIDATES = int(os.getenv('NEWS_SEARCH_CANDIDATES', '1000'))
+NEWS_SEARCH_MAX_TERMS = 16
 
+_WHITESPACE = re.compile(r'\s+')
+_SEARCH_WORD = re.compile(r'[a-z0-9]{2,}')
 
-    try:
-        for symbol in NEWS_SYMBOLS:
-            print(f"Attempting to fetch and update news for {symbol}...")
+
+def _normalize(value):
+    return _WHITESPACE.sub(' ', (value or '').strip()).lower()
+
+
+def news_content_hash(title, url):
+    return hashlib.sha256(f"{_normalize(title)}|{_normalize(url)}".encode('utf-8')).hexdigest()
+
+
+def _naive_utc(dt):
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _news_row(item):
+    # Raises KeyError/ValueError for items that cannot be stored.
+    if not isinstance(item, dict):
+        raise ValueError(f"news item is a {type(item).__name__}, not an object")
+    if not isinstance(item['date'], str):
+        raise ValueError(f"date is {item['date']!r}, not a string")
+    if not isinstance(item.get('symbols', []), list):
+        raise ValueError(f"symbols is {item['symbols']!r}, not a list")
+    return {
+        'title': item.get('title', 'No Title'),
+        'content': item.get('content', ''),
+        'url': item.get('link', ''),
+        'timestamp': _naive_utc(datetime.fromisoformat(item['date'])),
+        'symbols': list(item.get('symbols', [])),
+        'content_hash': news_content_hash(item.get('title', 'No Title'), item.get('link', '')),
+    }
+
+
+def collect_news_rows(items_by_symbol):
+    # Dedupes across every symbol in memory; an article tagged with several
+    # tickers is kept once with the union of its symbols.
+    rows = {}
+    fetched = 0
+    invalid = 0
+    for symbol, news_items in items_by_symbol.items():
+        for item in news_items:
+            fetched += 1
             try:
-                news_items = get_news(symbol, from_date=from_date, to_date=to_date) 
-                
-                if not news_items:
-                    print(f"No news fetched for {symbol}. Skipping database update for this symbol.")
-                    continue 
-
-                added_count_for_symbol = 0
-                duplicate_count_for_symbol = 0
-
-                for item in news_items:
-                    try:
-                        extracted_symbols = item.get('symbols', [])
-                        print(f"DEBUG: Processing news item for '{symbol}'. Article Title: '{item.get('title', 'N/A')}', Date: '{item.get('date', 'N/A')}', Extracted Symbols: {extracted_symbols}")
-                
-                        existing_news = db.query(models.News).filter(
-                            models.News.title == item.get('title') 
-                        ).first()
-                        
-                        if existing_news:
-                            duplicate_count_for_symbol += 1
-                            continue 
-                        
-                        news_record = models.News(
-                            title=item.get('title', 'No Title'),
-                            content=item.get('content', ''), 
-                            url=item.get('link', ''),
-                            timestamp=datetime.fromisoformat(item['date']) ,
-                            symbols=item.get('symbols', []) 
-                        )
-                        db.add(news_record)
-                        added_count_for_symbol += 1
-                        
-                    except IntegrityError:
-
-                        db.rollback() 
-                        print(f"Duplicate news title encountered (IntegrityError) for {item.get('title', 'N/A')}. Rolling back item add.")
-                        duplicate_count_for_symbol += 1
-                       
-                        continue 
-                    except KeyError as ke:
-                        print(f"Error processing news item for {symbol}: Missing key - {ke}. Item: {item}. Skipping.")
-                        continue 
-                    except ValueError as ve: 
-                        print(f"Error processing news item for {symbol}: Invalid timestamp format - {ve}. Item: {item.get('date', 'N/A')}. Skipping.")
-                        continue
-                    except Exception as e:
-                        print(f"Generic error processing news item for {symbol}: {str(e)}. Item: {item}. Skipping.")
-                        continue
-
-                db.commit() 
-                total_added_count += added_count_for_symbol
-                total_duplicate_count += duplicate_count_for_symbol
-                print(f"News update for {symbol} complete. Added: {added_count_for_symbol}, Duplicates skipped: {duplicate_count_for_symbol}")
-            
-            except Exception as e:
-                print(f"Error during overall fetch/update for {symbol}: {str(e)}")
-                
-                db.rollback() 
-                continue 
+                row = _news_row(item)
+            except KeyError as ke:
+                log.warning("Skipping news item with a missing key", sample_rate=0.1, symbol=symbol, key=ke)
+                invalid += 1
+                continue
+            except (ValueError, TypeError) as ve:
+                log.warning("Skipping invalid news item", sample_rate=0.1, symbol=symbol, error=ve)
+                invalid += 1
+                continue
+
+            existing = rows.get(row['content_hash'])
+            if existing is None:
+                rows[row['content_hash']] = row
+            else:
+                existing['symbols'].extend(s for s in row['symbols'] if s not in existing['symbols'])
+    return list(rows.values()), fetched, invalid
+
+
+def bulk_insert_news(db: Session, rows):
+    # Returns (statements, new_articles): the articles that were actually
+    # inserted, without content, for the sentiment rollup and live updates.
+    statements = 0
+    new_articles = []
+    table = models.News.__table__
+    for i in range(0, len(rows), NEWS_INSERT_BATCH_SIZE):
+        statement = pg_insert(table).values(rows[i:i + NEWS_INSERT_BATCH_SIZE])\
+            .on_conflict_do_nothing()\
+            .returning(table.c.id, table.c.title, table.c.url, table.c.timestamp, table.c.symbols,
+                       table.c.sentiment)
+        new_articles.extend(_news_dict(row, False) for row in db.execute(statement))
+        statements += 1
+    return statements, new_articles
+
+
+def _touched_days(new_articles):
+    return {(symbol, datetime.fromisoformat(article['timestamp']).date())
+            for article in new_articles for symbol in article['symbols'] or []}
+
+
+def publish_new_articles(new_articles):
+    by_symbol = {}
+    for article in new_articles:
+        for symbol in article['symbols'] or []:
+            by_symbol.setdefault(news_topic(symbol), []).append(article)
+    for topic, articles in by_symbol.items():
+        articles.sort(key=lambda article: article['timestamp'], reverse=True)
+        broker.publish(topic, 'news', articles)
+
+
+def refresh_daily_sentiment(db: Session, touched):
+    # Recomputes the news_sentiment_daily rows for the given (symbol, day)
+    # pairs from the articles themselves, so reruns and late arrivals stay exact.
+    if not touched:
+        return 0
+    symbols, days = zip(*sorted(touched))
+    result = db.execute(text("""
+        INSERT INTO news_sentiment_daily
+            (symbol, day, article_count, sentiment_mean, positive_count, negative_count, updated_at)
+        SELECT t.symbol, t.day, count(*), avg(n.sentiment),
+               count(*) FILTER (WHERE n.sentiment > :threshold),
+               count(*) FILTER (WHERE n.sentiment < -:threshold),
+               now() AT TIME ZONE 'utc'
+        FROM unnest(CAST(:symbols AS varchar[]), CAST(:days AS date[])) AS t(symbol, day)
+        JOIN news n ON n.symbols @> ARRAY[t.symbol]
+                   AND n.timestamp >= t.day AND n.timestamp < t.day + 1
+        WHERE n.sentiment IS NOT NULL
+        GROUP BY t.symbol, t.day
+        ON CONFLICT (symbol, day) DO UPDATE SET
+            article_count = EXCLUDED.article_count,
+            sentiment_mean = EXCLUDED.sentiment_mean,
+            positive_count = EXCLUDED.positive_count,
+            negative_count = EXCLUDED.negative_count,
+            updated_at = EXCLUDED.updated_at
+    """), {'symbols': list(symbols), 'days': list(days), 'threshold': LABEL_THRESHOLD})
+    return result.rowcount
+
+
+def score_news_rows(rows):
+    for row in rows:
+        row['sentiment'] = score_article(row['title'], row['content'])
+    return rows
+
+
+def rescore_missing_sentiment(batch_size: int = 1000):
+    # One-off pass for articles stored before sentiment was scored at ingest.
+    scored = 0
+    while True:
+        db = SessionLocal()
+        try:
+            rows = db.query(models.News.id, models.News.title, models.News.content, models.News.symbols,
+                            models.News.timestamp)\
+                .filter(models.News.sentiment.is_(None))\
+                .order_by(models.News.id)\
+                .limit(batch_size)\
+                .all()
+            if not rows:
+                break
+            db.execute(models.News.__table__.update()
+                       .where(models.News.__table__.c.id == bindparam('news_id'))
+                       .values(sentiment=bindparam('score')),
+                       [{'news_id': row.id, 'score': score_article(row.title, row.content)} for row in rows])
+            refresh_daily_sentiment(db, {(symbol, row.timestamp.date()) for row in rows for symbol in row.symbols or []})
+            db.commit()
+            scored += len(rows)
+        finally:
+            db.close()
+    log.info("Scored sentiment for stored articles", articles=scored)
+    return scored
+
+
+def get_daily_sentiment(db: Session, symbol: str, from_date: str = None, to_date: str = None):
+    query = db.query(models.NewsSentimentDaily)\
+        .filter(models.NewsSentimentDaily.symbol == _full_news_symbol(symbol))
+    if from_date:
+        query = query.filter(models.NewsSentimentDaily.day >= datetime.strptime(from_date, '%Y-%m-%d').date())
+    if to_date:
+        query = query.filter(models.NewsSentimentDaily.day <= datetime.strptime(to_date, '%Y-%m-%d').date())
+    return [{
+        'day': row.day.isoformat(),
+        'article_count': row.article_count,
+        'sentiment_mean': round(row.sentiment_mean, 4) if row.sentiment_mean is not None else None,
+        'positive_count': row.positive_count,
+        'negative_count': row.negative_count,
+    } for row in query.order_by(models.NewsSentimentDaily.day).all()]
+
+
+def get_news_watermarks(db: Session, symbols):
+    rows = db.query(models.NewsWatermark.symbol, models.NewsWatermark.last_seen)\
+        .filter(models.NewsWatermark.symbol.in_(symbols)).all()
+    return {row.symbol: row.last_seen for row in rows}
+
+
+def advance_news_watermarks(db: Session, latest):
+    # Watermarks only move forward, even if an older run commits last.
+    if not latest:
+        return
+    now = datetime.utcnow()
+    statement = pg_insert(models.NewsWatermark.__table__)\
+        .values([{'symbol': symbol, 'last_seen': last_seen, 'updated_at': now} for symbol, last_seen in latest.items()])
+    statement = statement.on_conflict_do_update(
+        index_elements=['symbol'],
+        set_={
+            'last_seen': func.greatest(models.NewsWatermark.__table__.c.last_seen, statement.excluded.last_seen),
+            'updated_at': statement.excluded.updated_at,
+        })
+    db.execute(statement)
+
+
+def _newest_times(items_by_symbol, complete):
+    latest = {}
+    for symbol, items in items_by_symbol.items():
+        if not complete.get(symbol):
+            continue
+        times = [t for t in (parse_news_time(item) for item in items) if t is not None]
+        if times:
+            latest[symbol] = max(times)
+    return latest
+
+
+def store_news(db: Session, items_by_symbol):
+    rows, fetched, invalid = collect_news_rows(items_by_symbol)
+    started = time.perf_counter()
+    score_news_rows(rows)
+    scoring_seconds = time.perf_counter() - started
+    statements, new_articles = bulk_insert_news(db, rows) if rows else (0, [])
+    inserted = len(new_articles)
+    touched = _touched_days(new_articles)
+    refresh_daily_sentiment(db, touched)
+    # The per-article loop issued one SELECT per fetched item plus one INSERT per new row.
+    legacy_queries = fetched + inserted
+    summary = {
+        'fetched': fetched,
+        'invalid': invalid,
+        'unique': len(rows),
+        'inserted': inserted,
+        'duplicates': fetched - invalid - inserted,
+        'queries': statements,
+        'queries_saved': legacy_queries - statements,
+        'sentiment_days': len(touched),
+        'sentiment_articles_per_second': round(len(rows) / scoring_seconds) if scoring_seconds else None,
+    }
+    return summary, new_articles
+
 
+def _fetch_all(jobs):
+    # jobs: (symbol, kwargs for get_news_since). Symbols run in parallel; the
+    # page requests inside each share eodhd_config's rate limiter.
+    items_by_symbol = {}
+    complete = {}
+    pages = 0
+    with ThreadPoolExecutor(max_workers=NEWS_SYMBOL_WORKERS) as executor:
+        futures = [(symbol, executor.submit(get_news_since, symbol, **kwargs)) for symbol, kwargs in jobs]
+        for symbol, future in futures:
+            items, symbol_pages, symbol_complete = future.result()
+            items_by_symbol.setdefault(symbol, []).extend(items)
+            complete[symbol] = complete.get(symbol, True) and symbol_complete
+            pages += symbol_pages
+    return items_by_symbol, complete, pages
+
+
+def update_news(symbols=None):
+    # Fetches only what is newer than each symbol's watermark, paging until it
+    # gets there, then moves the watermark to the newest stored article.
+    symbols = symbols or NEWS_SYMBOLS
+    db = SessionLocal()
+    try:
+        watermarks = get_news_watermarks(db, symbols)
+        default_since = datetime.utcnow() - timedelta(days=NEWS_INITIAL_LOOKBACK_DAYS)
+        jobs = [(symbol, {'since': watermarks.get(symbol, default_since)}) for symbol in symbols]
+        items_by_symbol, complete, pages = _fetch_all(jobs)
+
+        summary, new_articles = store_news(db, items_by_symbol)
+        latest = _newest_times(items_by_symbol, complete)
+        advance_news_watermarks(db, latest)
+        db.commit()
     except Exception as e:
-        print(f"Critical error during news update process: {str(e)}")
+        log.error("News update failed", exc_info=True, error=e)
         db.rollback()
+        return None
     finally:
         db.close()
-def get_news_in_range(db: Session, symbol: str = None, from_date: str = None, to_date: str = None):
-  
-    query = db.query(models.News)
 
-    if symbol:
-        symbol_for_query = symbol.upper()
-        if not symbol_for_query.endswith('.US'):
-            symbol_for_query = f"{symbol_for_query}.US"
-        query = query.filter(models.News.symbols.any(symbol_for_query))
+    publish_new_articles(new_articles)
+    incomplete = [symbol for symbol in symbols if not complete.get(symbol)]
+    summary.update(pages=pages, incomplete=incomplete)
+    INGESTED_ROWS.inc(summary['inserted'], kind='news')
+    log.info("News update complete", pages=pages, fetched=summary['fetched'], invalid=summary['invalid'],
+             added=summary['inserted'], duplicates=summary['duplicates'], queries=summary['queries'])
+    if incomplete:
+        log.warning("News did not reach the watermark; it was left unchanged", symbols=','.join(incomplete))
+    return summary
+
+
+def backfill_news(from_date: str, to_date: str, symbols=None, window_days: int = None):
+    # One-off historical load. The range is split into windows so no single
+    # paging run is long, and watermarks are left alone.
+    symbols = symbols or NEWS_SYMBOLS
+    window_days = window_days or NEWS_BACKFILL_WINDOW_DAYS
+    start = datetime.strptime(from_date, '%Y-%m-%d').date()
+    end = datetime.strptime(to_date, '%Y-%m-%d').date()
+    windows = []
+    while start <= end:
+        window_end = min(start + timedelta(days=window_days - 1), end)
+        windows.append((start.isoformat(), window_end.isoformat()))
+        start = window_end + timedelta(days=1)
 
-    if from_date and to_date:
+    totals = {'fetched': 0, 'invalid': 0, 'inserted': 0, 'duplicates': 0, 'pages': 0, 'incomplete': []}
+    for symbol in symbols:
+        jobs = [(symbol, {'from_date': window_start, 'to_date': window_end}) for window_start, window_end in windows]
+        items_by_symbol, complete, pages = _fetch_all(jobs)
+        db = SessionLocal()
         try:
-            from_datetime = datetime.strptime(from_date, '%Y-%m-%d')
-            to_datetime = datetime.strptime(to_date, '%Y-%m-%d').replace(hour=23, minute=59, second=59, microsecond=999999)
-            query = query.filter(models.News.timestamp.between(from_datetime, to_datetime))
-        except ValueError:
-            print(f"Warning: Invalid date format provided for news: {from_date} or {to_date}. Ignoring date filter and defaulting to latest 5.")
-            query = query.order_by(models.News.timestamp.desc()).limit(5)
-    else:
-        query = query.order_by(models.News.timestamp.desc()).limit(5)
+            summary, _ = store_news(db, items_by_symbol)
+            db.commit()
+        except Exception as e:
+            log.error("Storing backfilled news failed", exc_info=True, symbol=symbol, error=e)
+            db.rollback()
+            totals['incomplete'].append(symbol)
+            continue
+        finally:
+            db.close()
+        for key in ('fetched', 'invalid', 'inserted', 'duplicates'):
+            totals[key] += summary[key]
+        totals['pages'] += pages
+        if not complete.get(symbol):
+            totals['incomplete'].append(symbol)
+        log.info("Backfilled news", symbol=symbol, start=from_date, end=to_date, inserted=summary['inserted'],
+                 duplicates=summary['duplicates'], pages=pages)
+    return totals
 
+def _full_news_symbol(symbol: str):
+    symbol = symbol.upper()
+    return symbol if symbol.endswith('.US') else f"{symbol}.US"
 
-    news = query.all()
-    
-    return [{
+
+def encode_news_cursor(timestamp: datetime, news_id: int):
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{news_id}".encode('utf-8')).decode('ascii')
+
+
+def decode_news_cursor(cursor: str):
+    try:
+        timestamp, news_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(timestamp), int(news_id)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid news cursor: {cursor}") from e
+
+
+def _news_dict(item, include_content):
+    news = {
+        'id': item.id,
         'title': item.title,
-        'content': item.content, 
         'url': item.url,
         'timestamp': item.timestamp.isoformat(),
-        'symbols': item.symbols 
-    } for item in news]
+        'symbols': item.symbols,
+        'sentiment': item.sentiment,
+    }
+    if include_content:
+        news['content'] = item.content
+    return news
+
 
-def get_latest_news(db: Session, symbol: str):
-    query = db.query(models.News) 
+def list_news(db: Session, symbol: str = None, from_date: str = None, to_date: str = None, cursor: str = None,
+              limit: int = NEWS_LIST_LIMIT, include_content: bool = False):
+    # Newest first, paged by (timestamp, id) keyset instead of OFFSET so deep
+    # pages cost the same as the first. Returns (items, next_cursor); the
+    # cursor is None on the last page. Raises ValueError on a bad date or cursor.
+    columns = [models.News.id, models.News.title, models.News.url, models.News.timestamp, models.News.symbols,
+               models.News.sentiment]
+    if include_content:
+        columns.append(models.News.content)
+    query = db.query(*columns)
 
     if symbol:
-        symbol_for_query = symbol.upper()
-        if not symbol_for_query.endswith('.US'):
-            symbol_for_query = f"{symbol_for_query}.US"
-        query = query.filter(models.News.symbols.any(symbol_for_query))
+        query = query.filter(models.News.symbols.contains([_full_news_symbol(symbol)]))
+    if from_date:
+        query = query.filter(models.News.timestamp >= datetime.strptime(from_date, '%Y-%m-%d'))
+    if to_date:
+        query = query.filter(models.News.timestamp < datetime.strptime(to_date, '%Y-%m-%d') + timedelta(days=1))
+    if cursor:
+        cursor_timestamp, cursor_id = decode_news_cursor(cursor)
+        query = query.filter(tuple_(models.News.timestamp, models.News.id) < tuple_(cursor_timestamp, cursor_id))
 
+    limit = max(1, min(limit, NEWS_MAX_LIST_LIMIT))
+    rows = query.order_by(models.News.timestamp.desc(), models.News.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_news_cursor(rows[limit - 1].timestamp, rows[limit - 1].id) if len(rows) > limit else None
+    return [_news_dict(row, include_content) for row in rows[:limit]], next_cursor
 
-    news = query.order_by(models.News.timestamp.desc())\
-                .limit(5)\
-                .all()
-    
-    return [{
-        'title': item.title,
-        'content': item.content,
-        'url': item.url,
-        'timestamp': item.timestamp.isoformat(),
-        'symbols': item.symbols 
-    } for item in news] 
\ No newline at end of file
+
+def question_tsquery(question: str):
+    # OR of the question's words so articles matching any of them rank;
+    # to_tsquery drops English stop words and stems the rest.
+    words = list(dict.fromkeys(_SEARCH_WORD.findall((question or '').lower())))
+    return ' | '.join(words[:NEWS_SEARCH_MAX_TERMS])
+
+
+def search_news(db: Session, query: str, symbol: str = None, from_date: str = None, to_date: str = None,
+                limit: int = NEWS_LIST_LIMIT, include_content: bool = False, match_any: bool = False):
+    # Ranked full-text search over title (weight A) and content (weight B).
+    # The GIN index finds matches; only the newest NEWS_SEARCH_CANDIDATES of
+    # them are ranked, which keeps common terms from ranking millions of rows.
+    # match_any takes an OR of query words (see question_tsquery) instead of
+    # websearch syntax. Raises ValueError on a bad date.
+    if match_any:
+        query = question_tsquery(query)
+    if not (query or '').strip():
+        return []
+    tsquery = func.to_tsquery('english', query) if match_any else func.websearch_to_tsquery('english', query)
+
+    candidates = db.query(models.News.id).filter(models.News.search_vector.op('@@')(tsquery))
+    if symbol:
+        candidates = candidates.filter(models.News.symbols.contains([_full_news_symbol(symbol)]))
+    if from_date:
+        candidates = candidates.filter(models.News.timestamp >= datetime.strptime(from_date, '%Y-%m-%d'))
+    if to_date:
+        candidates = candidates.filter(models.News.timestamp < datetime.strptime(to_date, '%Y-%m-%d') + timedelta(days=1))
+    candidates = candidates.order_by(models.News.timestamp.desc()).limit(NEWS_SEARCH_CANDIDATES).subquery()
+
+    rank = func.ts_rank_cd(models.News.search_vector, tsquery).label('rank')
+    columns = [models.News.id, models.News.title, models.News.url, models.News.timestamp, models.News.symbols,
+               models.News.sentiment, rank]
+    if include_content:
+        columns.append(models.News.content)
+    rows = db.query(*columns).join(candidates, candidates.c.id == models.News.id)\
+        .order_by(rank.desc(), models.News.timestamp.desc())\
+        .limit(max(1, min(limit, NEWS_MAX_LIST_LIMIT)))\
+        .all()
+
+    results = []
+    for row in rows:
+        news = _news_dict(row, include_content)
+        news['rank'] = round(float(row.rank), 6)
+        results.append(news)
+    return results
+
+
+def get_relevant_news(db: Session, question: str, symbol: str = None, from_date: str = None, to_date: str = None,
+                      limit: int = NEWS_CONTEXT_TOP_K):
+    # Top-K articles for the analysis prompt, most relevant to the question
+    # first; falls back to the newest articles when nothing matches.
+    if not (from_date and to_date):
+        from_date = to_date = None
+    try:
+        news = search_news(db, question, symbol=symbol, from_date=from_date, to_date=to_date, limit=limit,
+                           include_content=True, match_any=True)
+    except ValueError:
+        log.warning("Invalid news date range; ignoring the date filter", start=from_date, end=to_date)
+        from_date = to_date = None
+        news = search_news(db, question, symbol=symbol, limit=limit, include_content=True, match_any=True)
+    if news:
+        return news
+    return get_news_in_range(db, symbol=symbol, from_date=from_date, to_date=to_date, limit=limit)
+
+
+def get_news_in_range(db: Session, symbol: str = None, from_date: str = None, to_date: str = None,
+                      limit: int = NEWS_RANGE_LIMIT):
+    # Articles for the analysis prompt, so content is included; a range is
+    # capped to its newest `limit` articles and no range means the latest 5.
+    if not (from_date and to_date):
+        from_date = to_date = None
+        limit = 5
+    try:
+        news, _ = list_news(db, symbol=symbol, from_date=from_date, to_date=to_date, limit=limit, include_content=True)
+    except ValueError:
+        log.warning("Invalid news date range; returning the latest 5", start=from_date, end=to_date)
+        news, _ = list_news(db, symbol=symbol, limit=5, include_content=True)
+    return news
+
+def get_latest_news(db: Session, symbol: str, include_content: bool = False):
+    news, _ = list_news(db, symbol=symbol, limit=5, include_content=include_content)
+    return news
+
+if __name__ == '__main__':
+    # python news_service.py backfill 2025-01-01 2025-06-30 [SYMBOL ...]
+    # python news_service.py sentiment
+    if len(sys.argv) >= 4 and sys.argv[1] == 'backfill':
+        print(backfill_news(sys.argv[2], sys.argv[3], sys.argv[4:] or None))
+    elif len(sys.argv) == 2 and sys.argv[1] == 'sentiment':
+        rescore_missing_sentiment()
+    else:
+        print(update_news())
@@ -0,0 +1,192 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+PRICE_CACHE_MAX_BYTES = int(os.getenv('PRICE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+# Seconds between incremental "rows newer than what we hold" refreshes; picks up
+# ticks written by other processes without reloading the whole series.
+PRICE_CACHE_REFRESH_SECONDS = float(os.getenv('PRICE_CACHE_REFRESH_SECONDS', '30'))
+
+EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def to_epoch_us(dt: datetime):
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return (dt - EPOCH) // _MICROSECOND
+
+
+def isoformat_epoch_us(timestamps):
+    # Matches datetime.isoformat(): seconds precision unless there are microseconds.
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    as_datetime = timestamps.astype('datetime64[us]')
+    formatted = np.datetime_as_string(as_datetime.astype('datetime64[s]'))
+    has_micros = timestamps % 1_000_000 != 0
+    if has_micros.any():
+        formatted = formatted.astype(object)
+        formatted[has_micros] = np.datetime_as_string(as_datetime[has_micros], unit='us')
+    return formatted.tolist()
+
+
+class PriceSeries:
+    __slots__ = ('timestamps', 'prices', 'size', 'loaded_limit', 'complete', 'refreshed_at')
+
+    def __init__(self, timestamps, prices, loaded_limit):
+        self.size = len(timestamps)
+        capacity = max(16, self.size * 2)
+        self.timestamps = np.empty(capacity, dtype=np.int64)
+        self.prices = np.empty(capacity, dtype=np.float64)
+        self.timestamps[:self.size] = timestamps
+        self.prices[:self.size] = prices
+        self.loaded_limit = loaded_limit
+        # Fewer rows than requested means we hold the symbol's entire history.
+        self.complete = loaded_limit is None or self.size < loaded_limit
+        self.refreshed_at = time.monotonic()
+
+    @property
+    def nbytes(self):
+        return self.timestamps.nbytes + self.prices.nbytes
+
+    @property
+    def last_timestamp(self):
+        return int(self.timestamps[self.size - 1]) if self.size else None
+
+    def _grow(self, needed):
+        capacity = max(len(self.timestamps) * 2, needed)
+        timestamps = np.empty(capacity, dtype=np.int64)
+        prices = np.empty(capacity, dtype=np.float64)
+        timestamps[:self.size] = self.timestamps[:self.size]
+        prices[:self.size] = self.prices[:self.size]
+        self.timestamps, self.prices = timestamps, prices
+
+    def extend(self, timestamps, prices):
+        # Only ticks newer than the last one held: an append and a refresh
+        # can both deliver the same tick.
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        prices = np.asarray(prices, dtype=np.float64)
+        if self.size:
+            newer = timestamps > self.timestamps[self.size - 1]
+            timestamps, prices = timestamps[newer], prices[newer]
+        count = len(timestamps)
+        if not count:
+            return
+        if self.size + count > len(self.timestamps):
+            self._grow(self.size + count)
+        self.timestamps[self.size:self.size + count] = timestamps
+        self.prices[self.size:self.size + count] = prices
+        self.size += count
+        if not np.all(np.diff(self.timestamps[max(self.size - count - 1, 0):self.size]) >= 0):
+            order = np.argsort(self.timestamps[:self.size], kind='stable')
+            self.timestamps[:self.size] = self.timestamps[:self.size][order]
+            self.prices[:self.size] = self.prices[:self.size][order]
+
+    def latest(self, n):
+        start = max(self.size - n, 0)
+        return self.timestamps[start:self.size][::-1], self.prices[start:self.size][::-1]
+
+
+# Per-symbol (epoch-microsecond, price) arrays held in process memory.
+# load_latest(db, symbol, limit) and load_since(db, symbol, epoch_us) return
+# (timestamps, prices) in ascending time order; they only run on a cold start,
+# when a read needs more rows than are held, or for the incremental refresh.
+class PriceSeriesCache:
+    def __init__(self, load_latest, load_since, max_bytes: int = PRICE_CACHE_MAX_BYTES,
+                 refresh_seconds: float = PRICE_CACHE_REFRESH_SECONDS):
+        self._load_latest = load_latest
+        self._load_since = load_since
+        self.max_bytes = max_bytes
+        self.refresh_seconds = refresh_seconds
+        self._series = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Bumped by invalidate(), so a load that started before it is not kept.
+        self._generation = 0
+
+    def _evict(self, keep):
+        total = sum(series.nbytes for series in self._series.values())
+        while total > self.max_bytes and len(self._series) > 1:
+            symbol, series = next(iter(self._series.items()))
+            if symbol == keep:
+                self._series.move_to_end(symbol)
+                symbol, series = next(iter(self._series.items()))
+            del self._series[symbol]
+            total -= series.nbytes
+            self.evictions += 1
+
+    def _series_for(self, db, symbol, n):
+        # Database loads run outside the lock, so one slow query does not
+        # hold up reads of every other symbol.
+        with self._lock:
+            series = self._series.get(symbol)
+            if series is not None and (series.complete or series.size >= n):
+                self.hits += 1
+                self._series.move_to_end(symbol)
+                if time.monotonic() - series.refreshed_at < self.refresh_seconds:
+                    return series
+                # Claimed before loading so concurrent readers skip it.
+                series.refreshed_at = time.monotonic()
+                since = series.last_timestamp
+            else:
+                self.misses += 1
+                limit = max(n, series.loaded_limit if series is not None else 0)
+                series = None
+            generation = self._generation
+
+        if series is not None:
+            timestamps, prices = self._load_since(db, symbol, since if since is not None else -1)
+            with self._lock:
+                series.extend(timestamps, prices)
+            return series
+
+        timestamps, prices = self._load_latest(db, symbol, limit)
+        loaded = PriceSeries(timestamps, prices, limit)
+        with self._lock:
+            # Another reader may have loaded as much or more meanwhile.
+            current = self._series.get(symbol)
+            if current is not None and current.loaded_limit is not None and current.loaded_limit >= limit:
+                return current
+            if generation != self._generation:
+                return loaded
+            self._series[symbol] = loaded
+            self._evict(keep=symbol)
+        return loaded
+
+    def latest(self, db, symbol: str, n: int):
+        series = self._series_for(db, symbol, n)
+        with self._lock:
+            timestamps, prices = series.latest(n)
+            return timestamps.copy(), prices.copy()
+
+    def append(self, symbol: str, timestamp: datetime, price: float):
+        # Symbols that are not cached are left alone; they load on first read.
+        with self._lock:
+            series = self._series.get(symbol)
+            if series is not None:
+                series.extend([to_epoch_us(timestamp)], [price])
+                self._evict(keep=symbol)
+
+    def invalidate(self, symbol: str = None):
+        with self._lock:
+            self._generation += 1
+            if symbol is None:
+                self._series.clear()
+            else:
+                self._series.pop(symbol, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'symbols': len(self._series),
+                'bytes': sum(series.nbytes for series in self._series.values()),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,172 @@
+import os
+import json
+from datetime import datetime
+
+import numpy as np
+
+from instrumentation import get_logger
+
+PRICE_CONTEXT_TOKEN_BUDGET = int(os.getenv('PRICE_CONTEXT_TOKEN_BUDGET', '1200'))
+# Most OHLC bars listed in the prompt; the summary always covers every row.
+PROMPT_PRICE_POINTS = int(os.getenv('PROMPT_PRICE_POINTS', '100'))
+# Rough tokens-per-character ratio for English/numeric text with Gemini tokenizers.
+CHARS_PER_TOKEN = 4
+PERIODS = ['hour', 'day', 'week', 'month', 'quarter']
+_BAR_LINE_CHARS = 60
+
+log = get_logger('prompt')
+
+
+def estimate_tokens(text: str):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _parse_records(prices_list_raw):
+    timestamps, prices = [], []
+    for price_record in prices_list_raw:
+        if isinstance(price_record, str):
+            try:
+                price_record = json.loads(price_record.replace("'", "\""))
+            except json.JSONDecodeError as e:
+                log.warning("Skipping undecodable price record", sample_rate=0.1, record=price_record, error=e)
+                continue
+        if not isinstance(price_record, dict) or 'price' not in price_record or 'timestamp' not in price_record:
+            log.warning("Skipping price record with an unexpected format", sample_rate=0.1, record=price_record)
+            continue
+        try:
+            timestamps.append(np.datetime64(datetime.fromisoformat(price_record['timestamp']).replace(tzinfo=None), 's'))
+            prices.append(float(price_record['price']))
+        except (ValueError, TypeError):
+            log.warning("Skipping price record with an invalid timestamp or price", sample_rate=0.1,
+                        record=price_record)
+    timestamps = np.array(timestamps, dtype='datetime64[s]')
+    prices = np.array(prices, dtype=np.float64)
+    order = np.argsort(timestamps, kind='stable')
+    return timestamps[order], prices[order]
+
+
+def _period_keys(timestamps, period):
+    if period == 'hour':
+        return timestamps.astype('datetime64[h]').astype('datetime64[s]')
+    days = timestamps.astype('datetime64[D]')
+    if period == 'day':
+        return days.astype('datetime64[s]')
+    if period == 'week':
+        # datetime64 day 0 is a Thursday; shift so weeks start on Monday.
+        day_numbers = days.astype(np.int64)
+        return (day_numbers - (day_numbers + 3) % 7).astype('datetime64[D]').astype('datetime64[s]')
+    months = timestamps.astype('datetime64[M]')
+    if period == 'month':
+        return months.astype('datetime64[s]')
+    month_numbers = months.astype(np.int64)
+    return (month_numbers - month_numbers % 3).astype('datetime64[M]').astype('datetime64[s]')
+
+
+def downsample_ohlc(timestamps, prices, period):
+    keys = _period_keys(timestamps, period)
+    starts = np.r_[0, np.flatnonzero(keys[1:] != keys[:-1]) + 1]
+    ends = np.r_[starts[1:], len(prices)]
+    return {
+        'period_start': keys[starts],
+        'open': prices[starts],
+        'high': np.maximum.reduceat(prices, starts),
+        'low': np.minimum.reduceat(prices, starts),
+        'close': prices[ends - 1],
+    }
+
+
+def summarize_prices(timestamps, prices):
+    returns = np.diff(prices) / prices[:-1] if len(prices) > 1 else np.array([])
+    high_index = int(np.argmax(prices))
+    low_index = int(np.argmin(prices))
+    summary = {
+        'first': (timestamps[0], prices[0]),
+        'last': (timestamps[-1], prices[-1]),
+        'change_pct': (prices[-1] / prices[0] - 1) * 100 if prices[0] else 0.0,
+        'high': (timestamps[high_index], prices[high_index]),
+        'low': (timestamps[low_index], prices[low_index]),
+        'volatility_pct': float(np.std(returns) * 100) if len(returns) > 1 else None,
+        'gaps': [],
+    }
+    if len(returns):
+        # Largest moves between consecutive observations.
+        for index in np.argsort(np.abs(returns))[::-1][:3]:
+            summary['gaps'].append((timestamps[index], timestamps[index + 1], returns[index] * 100))
+    return summary
+
+
+def _fmt_time(value, period='hour'):
+    text = str(value.astype('datetime64[m]' if period == 'hour' else 'datetime64[D]'))
+    return text.replace('T', ' ')
+
+
+def _format_summary(symbol, summary, count):
+    lines = [
+        f"Symbol: {symbol}",
+        f"Observations: {count} from {_fmt_time(summary['first'][0])} to {_fmt_time(summary['last'][0])}",
+        f"First: ${summary['first'][1]:.2f}  Last: ${summary['last'][1]:.2f}  Change: {summary['change_pct']:+.2f}%",
+        f"High: ${summary['high'][1]:.2f} ({_fmt_time(summary['high'][0])})  "
+        f"Low: ${summary['low'][1]:.2f} ({_fmt_time(summary['low'][0])})",
+    ]
+    if summary['volatility_pct'] is not None:
+        lines.append(f"Volatility (std of step returns): {summary['volatility_pct']:.2f}%")
+    if summary['gaps']:
+        lines.append("Largest moves: " + "; ".join(
+            f"{_fmt_time(start)} -> {_fmt_time(end)} {change:+.2f}%" for start, end, change in summary['gaps']))
+    return "\n".join(lines)
+
+
+def _format_bars(bars, period, count=None):
+    lines = []
+    total = len(bars['close'])
+    first = total - count if count is not None else 0
+    for i in range(first, total):
+        lines.append(
+            f"  {_fmt_time(bars['period_start'][i], period)}  O {bars['open'][i]:.2f}  H {bars['high'][i]:.2f}  "
+            f"L {bars['low'][i]:.2f}  C {bars['close'][i]:.2f}")
+    return "\n".join(lines)
+
+
+def _raw_listing_chars(prices):
+    # Size of the old one-line-per-row listing ("  Price: $x (As of: ...)").
+    if not len(prices):
+        return 0
+    price_digits = np.floor(np.log10(np.maximum(np.abs(prices), 1))).astype(np.int64) + 4
+    return int(np.sum(price_digits) + len(prices) * 42)
+
+
+def build_price_context(symbol, prices_list_raw, token_budget: int = PRICE_CONTEXT_TOKEN_BUDGET,
+                        max_bars: int = PROMPT_PRICE_POINTS):
+    # Returns (context text, report). The text is a summary block plus OHLC
+    # bars at the finest period that fits the token budget.
+    timestamps, prices = _parse_records(prices_list_raw)
+    report = {'input_rows': len(prices), 'period': None, 'bars': 0, 'raw_chars': _raw_listing_chars(prices)}
+    if not len(prices):
+        text = f"Symbol: {symbol}\nStock Price History: no price data available."
+        report.update(context_chars=len(text), context_tokens=estimate_tokens(text), compression_ratio=1.0)
+        return text, report
+
+    header = _format_summary(symbol, summarize_prices(timestamps, prices), len(prices))
+    remaining_chars = token_budget * CHARS_PER_TOKEN - len(header) - 64
+    max_bars = max(min(remaining_chars // _BAR_LINE_CHARS, max_bars), 0)
+
+    bars, period = None, None
+    for candidate in PERIODS:
+        bars = downsample_ohlc(timestamps, prices, candidate)
+        period = candidate
+        if len(bars['close']) <= max_bars:
+            break
+    shown = min(len(bars['close']), max_bars)
+    text = header
+    if shown:
+        label = f"OHLC by {period}" + (f" (most recent {shown} of {len(bars['close'])})" if shown < len(bars['close']) else "")
+        text += f"\n{label}:\n" + _format_bars(bars, period, shown)
+
+    report.update(
+        period=period,
+        bars=shown,
+        context_chars=len(text),
+        context_tokens=estimate_tokens(text),
+        compression_ratio=round(report['raw_chars'] / len(text), 2) if text else 1.0,
+    )
+    return text, report
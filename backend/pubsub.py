@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import queue
+import select
+import threading
+import itertools
+
+from sqlalchemy import text
+
+from instrumentation import get_logger
+
+# In-process fan-out for live updates. The scheduler jobs publish after they
+# commit; each /api/stream connection holds one Subscriber. Every subscriber
+# has its own bounded queue, so one slow client drops its own oldest events
+# and never holds up the publisher or the other clients.
+
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv('STREAM_QUEUE_SIZE', '256'))
+HEARTBEAT_SECONDS = float(os.getenv('STREAM_HEARTBEAT_SECONDS', '15'))
+# Open streams per process. Under gthread each one holds a worker thread, so
+# gunicorn.conf.py keeps this below the thread count; subscribe() refuses
+# clients past it and /api/stream answers 503.
+MAX_SUBSCRIBERS = int(os.getenv('STREAM_MAX_SUBSCRIBERS', '1000'))
+RELAY_CHANNEL = 'stream_events'
+# Postgres rejects NOTIFY payloads of 8000 bytes or more.
+RELAY_MAX_PAYLOAD = 7900
+RELAY_RECONNECT_SECONDS = 5
+
+log = get_logger('stream')
+
+
+def normalize_symbol(symbol: str):
+    symbol = symbol.upper()
+    return symbol[:-3] if symbol.endswith('.US') else symbol
+
+
+def price_topic(symbol: str):
+    return f"prices:{normalize_symbol(symbol)}"
+
+
+def news_topic(symbol: str):
+    return f"news:{normalize_symbol(symbol)}"
+
+
+class Subscriber:
+    def __init__(self, topics, max_queue: int = SUBSCRIBER_QUEUE_SIZE):
+        self.topics = frozenset(topics)
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def offer(self, event):
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def next_event(self, timeout: float = HEARTBEAT_SECONDS):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class Broker:
+    def __init__(self, max_subscribers: int = MAX_SUBSCRIBERS):
+        self._subscribers = {}
+        self._open = 0
+        self.max_subscribers = max_subscribers
+        self.rejected = 0
+        self._latest = {}
+        self._sequence = itertools.count(1)
+        self._lock = threading.Lock()
+        self.published = 0
+        self.relay = None
+
+    def subscribe(self, topics):
+        # None when the process already serves max_subscribers streams.
+        subscriber = Subscriber(topics)
+        with self._lock:
+            if self._open >= self.max_subscribers:
+                self.rejected += 1
+                return None
+            self._open += 1
+            for topic in subscriber.topics:
+                self._subscribers.setdefault(topic, set()).add(subscriber)
+            # Replay the last event per topic so a new client starts current.
+            for topic in subscriber.topics:
+                if topic in self._latest:
+                    subscriber.offer(self._latest[topic])
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._open -= 1
+            for topic in subscriber.topics:
+                subscribers = self._subscribers.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscriber)
+                    if not subscribers:
+                        del self._subscribers[topic]
+
+    def publish(self, topic, event_type, data):
+        # With a relay attached the event goes through Postgres and comes back
+        # to every process, this one included, via deliver().
+        if self.relay is not None and self.relay.send(topic, event_type, data):
+            return 0
+        return self.deliver(topic, event_type, json.dumps(data, default=str))
+
+    def deliver(self, topic, event_type, payload):
+        # The payload is serialised once and shared by every subscriber.
+        event = {'id': next(self._sequence), 'topic': topic, 'event': event_type, 'data': payload}
+        with self._lock:
+            self._latest[topic] = event
+            subscribers = list(self._subscribers.get(topic, ()))
+            self.published += 1
+        for subscriber in subscribers:
+            subscriber.offer(event)
+        return len(subscribers)
+
+    def stats(self):
+        with self._lock:
+            unique = {subscriber for subscribers in self._subscribers.values() for subscriber in subscribers}
+            stats = {
+                'subscribers': len(unique),
+                'max_subscribers': self.max_subscribers,
+                'rejected': self.rejected,
+                'topics': len(self._subscribers),
+                'published': self.published,
+                'dropped': sum(subscriber.dropped for subscriber in unique),
+            }
+        if self.relay is not None:
+            stats['relay'] = self.relay.stats()
+        return stats
+
+
+class PostgresRelay:
+    # Fans events out across processes with LISTEN/NOTIFY. Under several
+    # gunicorn workers only the scheduler leader publishes, but the SSE
+    # clients are spread over every worker.
+    def __init__(self, broker, listen_engine, notify_engine, channel: str = RELAY_CHANNEL):
+        self.broker = broker
+        self.listen_engine = listen_engine
+        self.notify_engine = notify_engine
+        self.channel = channel
+        self.sent = 0
+        self.received = 0
+        self.failures = 0
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._listen, name='stream-relay', daemon=True)
+        self._thread.start()
+        self.broker.relay = self
+        return self
+
+    def _payloads(self, topic, event_type, data):
+        payload = json.dumps({'topic': topic, 'event': event_type, 'data': json.dumps(data, default=str)})
+        if len(payload.encode()) <= RELAY_MAX_PAYLOAD:
+            return [payload]
+        if isinstance(data, list) and len(data) > 1:
+            middle = len(data) // 2
+            return self._payloads(topic, event_type, data[:middle]) + \
+                self._payloads(topic, event_type, data[middle:])
+        raise ValueError(f"{event_type} event for {topic} is too large to relay")
+
+    def send(self, topic, event_type, data):
+        # False tells the broker to deliver locally instead.
+        try:
+            payloads = self._payloads(topic, event_type, data)
+            with self.notify_engine.begin() as conn:
+                for payload in payloads:
+                    conn.execute(text("SELECT pg_notify(:channel, :payload)"),
+                                 {'channel': self.channel, 'payload': payload})
+            self.sent += len(payloads)
+            return True
+        except Exception as e:
+            self.failures += 1
+            log.warning("Stream relay could not send", topic=topic, event=event_type, error=e)
+            return False
+
+    def _listen(self):
+        while True:
+            connection = None
+            try:
+                connection = self.listen_engine.raw_connection()
+                dbapi = connection.dbapi_connection
+                dbapi.autocommit = True
+                dbapi.cursor().execute(f"LISTEN {self.channel}")
+                while True:
+                    if select.select([dbapi], [], [], HEARTBEAT_SECONDS) == ([], [], []):
+                        dbapi.cursor().execute("SELECT 1")
+                        continue
+                    dbapi.poll()
+                    while dbapi.notifies:
+                        notify = dbapi.notifies.pop(0)
+                        event = json.loads(notify.payload)
+                        self.received += 1
+                        self.broker.deliver(event['topic'], event['event'], event['data'])
+            except Exception as e:
+                log.warning("Stream relay listener lost its connection, retrying", error=e)
+                time.sleep(RELAY_RECONNECT_SECONDS)
+            finally:
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+
+    def stats(self):
+        return {'sent': self.sent, 'received': self.received, 'failures': self.failures}
+
+
+def format_sse(event):
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {event['data']}\n\n"
+
+
+broker = Broker()
@@ -0,0 +1,104 @@
+import re
+
+# Local, dependency-free sentiment for financial news. Words are scored from a
+# small finance lexicon (in the spirit of Loughran-McDonald, where words like
+# "liability" or "tax" are not negative), flipped by a preceding negation and
+# scaled by intensifiers. Scores are in [-1, 1]; headline words count double.
+
+POSITIVE_WORDS = frozenset('''
+    beat beats beating exceed exceeds exceeded exceeding outperform outperforms outperformed
+    upgrade upgrades upgraded raise raises raised boost boosts boosted surge surges surged soar soars soared
+    jump jumps jumped rally rallies rallied gain gains gained rise rises rising rose climb climbs climbed
+    record strong stronger strongest robust growth grow grows grew expand expands expanded expansion
+    profit profits profitable profitability improve improves improved improvement recover recovers recovered
+    recovery rebound rebounds rebounded bullish buy optimistic optimism confident confidence upbeat positive
+    success successful win wins won breakthrough innovative innovation launch launches launched approval
+    approved approves favorable accelerate accelerates accelerated momentum tops topped upside
+    dividend buyback buybacks resilient solid healthy leading leader surpass surpassed
+    partnership partnerships milestone opportunity opportunities efficient efficiency benefit benefits
+    beneficial attractive outstanding excellent impressive higher highs
+'''.split())
+
+NEGATIVE_WORDS = frozenset('''
+    miss misses missed missing downgrade downgrades downgraded cut cuts cutting slash slashes slashed
+    fall falls fell falling drop drops dropped plunge plunges plunged tumble tumbles tumbled slump slumps
+    slumped sink sinks sank decline declines declined declining weak weaker weakest weakness loss losses lose
+    loses lost slow slows slowed slowing slowdown shrink shrinks shrank contraction bearish sell selloff
+    pessimistic pessimism concern concerns worried worry worries fear fears risk risks risky uncertainty
+    uncertain volatile volatility lawsuit lawsuits sue sued sues litigation probe investigation investigated
+    fined penalty penalties recall recalls recalled fraud scandal layoff layoffs fired resign
+    resigns resigned bankruptcy bankrupt default defaults defaulted delay delays delayed shortage shortages
+    disappoint disappoints disappointed disappointing warning warns warned warn headwind headwinds pressure
+    pressures tariff tariffs ban banned sanctions downturn recession inflation crash crashes crashed
+    negative lower lows underperform underperforms underperformed halt halted suspend suspended breach
+    hack hacked outage outages glitch deficit debt impairment writedown writedowns dilution antitrust
+'''.split())
+
+NEGATIONS = frozenset('not no never without nor neither cannot isnt wasnt arent dont doesnt didnt wont hasnt havent'.split())
+INTENSIFIERS = {
+    'sharply': 1.5, 'significantly': 1.4, 'strongly': 1.4, 'substantially': 1.4, 'sharp': 1.4,
+    'massive': 1.5, 'huge': 1.4, 'very': 1.3, 'slightly': 0.6, 'modestly': 0.7, 'marginally': 0.6,
+}
+# Scores beyond +/- this count as positive/negative.
+LABEL_THRESHOLD = 0.05
+NEGATION_WINDOW = 3
+TITLE_WEIGHT = 2.0
+# Damps scores built on one or two matching words toward neutral.
+_SMOOTHING = 2.0
+
+_WORD = re.compile(r"[a-z]+")
+# One lookup per token: a polarity, or a marker for negations/intensifiers.
+_NEGATION = 'negation'
+_LEXICON = dict.fromkeys(POSITIVE_WORDS, 1.0)
+_LEXICON.update(dict.fromkeys(NEGATIVE_WORDS, -1.0))
+_LEXICON.update(dict.fromkeys(NEGATIONS, _NEGATION))
+_LEXICON.update({word: ('scale', factor) for word, factor in INTENSIFIERS.items()})
+
+
+def _tokens(text):
+    return _WORD.findall((text or '').lower().replace("'", ''))
+
+
+def _polarity(tokens, weight=1.0):
+    # Returns (net polarity, total magnitude) over the tokens.
+    net = 0.0
+    magnitude = 0.0
+    negate_until = -1
+    scale = 1.0
+    lookup = _LEXICON.get
+    for i, token in enumerate(tokens):
+        value = lookup(token)
+        if value is None:
+            scale = 1.0
+            continue
+        if value is _NEGATION:
+            negate_until = i + NEGATION_WINDOW
+            continue
+        if type(value) is tuple:
+            scale = value[1]
+            continue
+        if i <= negate_until:
+            value = -value
+        net += value * scale * weight
+        magnitude += scale * weight
+        scale = 1.0
+    return net, magnitude
+
+
+def score_article(title, content):
+    title_net, title_magnitude = _polarity(_tokens(title), TITLE_WEIGHT)
+    body_net, body_magnitude = _polarity(_tokens(content))
+    magnitude = title_magnitude + body_magnitude
+    if not magnitude:
+        return 0.0
+    return round((title_net + body_net) / (magnitude + _SMOOTHING), 4)
+
+
+def sentiment_label(score, threshold=LABEL_THRESHOLD):
+    if score is None:
+        return None
+    if score > threshold:
+        return 'positive'
+    if score < -threshold:
+        return 'negative'
+    return 'neutral'
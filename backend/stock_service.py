@@ -1,85 +1,124 @@
+import os
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from config import SessionLocal
 import models
-from eodhd_price_config import get_stock_price, get_eodhd_historical_data
-from sqlalchemy.exc import IntegrityError 
-from sqlalchemy import Date 
-import pytz 
-from datetime import datetime 
+from eodhd_price_config import get_stock_prices, get_eodhd_historical_data
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from bar_service import insert_bars, DAILY, TICK
+from price_cache import PriceSeriesCache, to_epoch_us, isoformat_epoch_us, EPOCH
+from pubsub import broker, price_topic
+from market_calendar import is_market_open, just_closed
+from instrumentation import get_logger, INGESTED_ROWS
+import numpy as np
+from datetime import timedelta
 
 STOCK_SYMBOLS = ['AAPL', 'AMZN', 'GOOGL', 'MSFT', 'TSLA']
 #STOCK_SYMBOLS = ['AAPL']
+PRICE_HISTORY_LIMIT = 500
+# Prices are read from price_bars. While deployments migrate, ticks and daily
+# closes are also written to the legacy stocks table, so older code rolled
+# back to still sees them; set STOCKS_DUAL_WRITE=0 once nothing reads it.
+STOCKS_DUAL_WRITE = os.getenv('STOCKS_DUAL_WRITE', '1') != '0'
 
-def is_market_open():
-    eastern = pytz.timezone('America/New_York')
-    
-    now_et = datetime.now(eastern)
-    
-    day_of_week = now_et.weekday()
-    
-    market_open_time = now_et.replace(hour=9, minute=30, second=0, microsecond=0)
-    market_close_time = now_et.replace(hour=16, minute=0, second=0, microsecond=0)
-
-    if 0 <= day_of_week <= 4: 
-        if market_open_time <= now_et <= market_close_time:
-            print(f"DEBUG: Market is OPEN. Current ET time: {now_et.strftime('%H:%M:%S')}")
-            return True
-        else:
-            print(f"DEBUG: Market is CLOSED (outside hours). Current ET time: {now_et.strftime('%H:%M:%S')}")
-            return False
-    else:
-        print(f"DEBUG: Market is CLOSED (weekend). Current ET time: {now_et.strftime('%Y-%m-%d %H:%M:%S')}, Day: {now_et.strftime('%A')}")
-        return False
+log = get_logger('prices')
 
+def update_stock_prices(force: bool = False):
 
-def update_stock_prices():
-
-    if not is_market_open():
-        print("Market is currently closed. Skipping real-time stock price update.")
+    if not force and not (is_market_open() or just_closed()):
+        log.info("Market is closed; skipping the real-time price update.")
         return 
     
+    quotes, stats = get_stock_prices(STOCK_SYMBOLS)
+    log.info("Fetched quotes", symbols=stats['symbols'], elapsed=round(stats['elapsed'], 3),
+             requests=stats['requests'], failures=stats['failures'])
+    if stats['failed_symbols']:
+        log.warning("Failed to fetch quotes", symbols=','.join(stats['failed_symbols']))
+
     db = SessionLocal()
     try:
+        stock_records = []
         for symbol in STOCK_SYMBOLS:
-            try:
-                stock_data = get_stock_price(symbol)
-                
-               
-                if stock_data and isinstance(stock_data, dict) and \
-                    isinstance(stock_data.get('price'), (float, int)) and \
-                    stock_data['price'] > 0 and stock_data.get('timestamp'): 
-                    stock_record = models.Stock(
-                        symbol=symbol,
-                        price=stock_data['price'],
-                        timestamp=stock_data['timestamp']
-                    )
-                    db.add(stock_record)
-                    print(f"Successfully added price for {symbol}: {stock_data['price']} at {stock_data['timestamp']}")
-                else:
-                    print(f"Skipping update for {symbol}: Invalid or incomplete data received ({stock_data}).")
-            except Exception as e:
-                print(f"Error fetching or processing price for {symbol}: {str(e)}")
-        
+            stock_data = quotes.get(symbol)
+            if stock_data and isinstance(stock_data.get('price'), (float, int)) and \
+                stock_data['price'] > 0 and stock_data.get('timestamp'):
+                stock_records.append(models.Stock(
+                    symbol=symbol,
+                    price=stock_data['price'],
+                    timestamp=stock_data['timestamp']
+                ))
+            else:
+                log.warning("Skipping invalid or incomplete quote", symbol=symbol, quote=stock_data)
+
+        if STOCKS_DUAL_WRITE:
+            db.add_all(stock_records)
+        insert_bars(db, TICK, [{'symbol': record.symbol, 'timestamp': record.timestamp, 'close': record.price}
+                               for record in stock_records])
         db.commit()
+        for record in stock_records:
+            price_cache.append(record.symbol, record.timestamp, record.price)
+            broker.publish(price_topic(record.symbol), 'price', {
+                'symbol': record.symbol,
+                'price': record.price,
+                'timestamp': isoformat_epoch_us([to_epoch_us(record.timestamp)])[0],
+            })
+        INGESTED_ROWS.inc(len(stock_records), kind='prices')
+        log.info("Stored prices", rows=len(stock_records))
     except Exception as e:
-        print(f"Error updating stock prices batch: {str(e)}")
+        log.error("Price update failed", exc_info=True, error=e)
         db.rollback()
     finally:
         db.close()
+    return stats
+
+def _rows_to_arrays(rows):
+    rows.reverse()
+    return [to_epoch_us(row.timestamp) for row in rows], [row.close for row in rows]
+
+
+# A symbol's price history is its ticks and daily closes together. Each
+# branch reads one granularity partition in index order, so both are
+# index-only scans on ix_price_bars_symbol_granularity_timestamp_desc.
+_PRICE_HISTORY_SQL = """
+    SELECT timestamp, close FROM (
+        (SELECT timestamp, close FROM price_bars
+         WHERE symbol = :symbol AND granularity = :tick AND timestamp > :since
+         ORDER BY timestamp DESC LIMIT :limit)
+        UNION ALL
+        (SELECT timestamp, close FROM price_bars
+         WHERE symbol = :symbol AND granularity = :daily AND timestamp > :since
+         ORDER BY timestamp DESC LIMIT :limit)
+    ) bars
+    ORDER BY timestamp DESC LIMIT :limit
+"""
+
+
+def _load_latest_prices(db: Session, symbol: str, limit: int):
+    rows = db.execute(text(_PRICE_HISTORY_SQL), {'symbol': symbol, 'tick': TICK, 'daily': DAILY,
+                                                 'since': EPOCH, 'limit': limit}).all()
+    return _rows_to_arrays(rows)
+
+
+def _load_prices_since(db: Session, symbol: str, epoch_us: int):
+    since = EPOCH + timedelta(microseconds=epoch_us)
+    rows = db.execute(text(_PRICE_HISTORY_SQL), {'symbol': symbol, 'tick': TICK, 'daily': DAILY,
+                                                 'since': since, 'limit': None}).all()
+    return _rows_to_arrays(rows)
+
+
+price_cache = PriceSeriesCache(_load_latest_prices, _load_prices_since)
+
 
 def get_latest_prices(db: Session, symbol: str = None):
 
     target_symbol = (symbol.upper() if symbol else 'AAPL') 
 
     latest_prices = {}
-    stock = db.query(models.Stock)\
-        .filter(models.Stock.symbol == target_symbol)\
-        .order_by(models.Stock.timestamp.desc())\
-        .first()
-    if stock:
+    timestamps, prices = price_cache.latest(db, target_symbol, 1)
+    if len(prices):
         latest_prices[target_symbol] = {
-            'price': stock.price,
-            'timestamp': stock.timestamp.isoformat()
+            'price': float(prices[0]),
+            'timestamp': isoformat_epoch_us(timestamps)[0]
             }
     return latest_prices 
 
@@ -88,69 +127,96 @@ def get_latest_ten_prices(db: Session, symbol: str = None):
     
     target_symbol = (symbol.upper() if symbol else 'AAPL') 
 
-    stocks = db.query(models.Stock)\
-        .filter(models.Stock.symbol == target_symbol)\
-        .order_by(models.Stock.timestamp.desc())\
-        .limit(500)\
-        .all()
-
-    symbol_prices = []
-    for stock in stocks:
-        symbol_prices.append({
-            'price': stock.price,
-            'timestamp': stock.timestamp.isoformat()
-        })
-    all_latest_ten_prices[target_symbol] = symbol_prices
+    timestamps, prices = price_cache.latest(db, target_symbol, PRICE_HISTORY_LIMIT)
+    all_latest_ten_prices[target_symbol] = [
+        {'price': price, 'timestamp': timestamp}
+        for price, timestamp in zip(prices.tolist(), isoformat_epoch_us(timestamps))
+    ]
             
     return all_latest_ten_prices
 
 
 
+def get_daily_close_matrix(db: Session, symbols=None, start_date=None, end_date=None):
+    # One query for every symbol's daily closes, pivoted to a
+    # (symbols x trading dates) array with NaN where a symbol has no bar.
+    bars = models.PriceBar
+    query = db.query(bars.symbol, bars.timestamp, bars.close).filter(bars.granularity == DAILY)
+    if symbols:
+        query = query.filter(bars.symbol.in_([symbol.upper() for symbol in symbols]))
+    if start_date:
+        query = query.filter(bars.timestamp >= start_date)
+    if end_date:
+        query = query.filter(bars.timestamp < end_date + timedelta(days=1))
+    rows = query.all()
+    if not rows:
+        return [], np.array([], dtype='datetime64[D]'), np.empty((0, 0))
+
+    row_symbols, row_dates, row_prices = zip(*rows)
+    symbol_index, symbol_positions = np.unique(np.array(row_symbols, dtype=object).astype(str), return_inverse=True)
+    dates, date_positions = np.unique(np.array(row_dates, dtype='datetime64[D]'), return_inverse=True)
+    closes = np.full((len(symbol_index), len(dates)), np.nan)
+    closes[symbol_positions, date_positions] = row_prices
+    return symbol_index.tolist(), dates, closes
+
+
+HISTORICAL_INSERT_CHUNK_SIZE = 1000
+
+
+def bulk_insert_daily_bars(db: Session, symbol: str, entries):
+    # One INSERT ... ON CONFLICT DO NOTHING per chunk; the primary key of
+    # price_bars (and the unique (symbol, trading_date) index of the legacy
+    # table) does the duplicate check in the database.
+    inserted = insert_bars(db, DAILY, [dict(entry, symbol=symbol, timestamp=entry['date']) for entry in entries])
+    if STOCKS_DUAL_WRITE:
+        _insert_legacy_daily_closes(db, symbol, entries)
+    return inserted, len(entries) - inserted
+
+
+def _insert_legacy_daily_closes(db: Session, symbol: str, entries):
+    for i in range(0, len(entries), HISTORICAL_INSERT_CHUNK_SIZE):
+        rows = [{
+            'symbol': symbol,
+            'price': entry['close'],
+            'timestamp': entry['date'],
+            'trading_date': entry['date'].date(),
+        } for entry in entries[i:i + HISTORICAL_INSERT_CHUNK_SIZE]]
+        statement = pg_insert(models.Stock.__table__).values(rows)\
+            .on_conflict_do_nothing(index_elements=['symbol', 'trading_date'])
+        db.execute(statement)
+
+
 def populate_historical_stock_data(start_date: str, end_date: str):
    
     db = SessionLocal()
-    total_added_count = 0
+    summary = {'inserted': 0, 'skipped': 0, 'symbols': {}}
     try:
         for symbol in STOCK_SYMBOLS:
-            print(f"Attempting to fetch and populate historical data for {symbol} from {start_date} to {end_date}...")
+            log.info("Fetching historical prices", symbol=symbol, start=start_date, end=end_date)
             historical_data = get_eodhd_historical_data(symbol, start_date, end_date)
             
             if not historical_data:
-                print(f"No historical data fetched for {symbol} in the specified range. Skipping.")
+                log.info("No historical prices in range; skipping", symbol=symbol, start=start_date, end=end_date)
                 continue
 
-            added_count_for_symbol = 0
-            for entry in historical_data:
-                try:
-                    existing_record = db.query(models.Stock).filter(
-                        models.Stock.symbol == symbol,
-                        models.Stock.timestamp.cast(Date) == entry['date'].date() 
-                    ).first()
-
-                    if existing_record:
-                        continue
-
-                    stock_record = models.Stock(
-                        symbol=symbol,
-                        price=entry['close'],
-                        timestamp=entry['date'] 
-                    )
-                    db.add(stock_record)
-                    added_count_for_symbol += 1
-                except IntegrityError: 
-                    db.rollback() 
-                    print(f"Integrity error for {symbol} on {entry['date']}. Rolling back current item.")
-                    continue
-                except Exception as e:
-                    print(f"Error processing historical entry for {symbol} on {entry['date']}: {str(e)}")
-                    continue
-            
-            db.commit() 
-            total_added_count += added_count_for_symbol
-            print(f"Successfully added {added_count_for_symbol} historical records for {symbol}.")
+            try:
+                inserted, skipped = bulk_insert_daily_bars(db, symbol, historical_data)
+                db.commit()
+                if inserted:
+                    price_cache.invalidate(symbol)
+            except Exception as e:
+                log.error("Storing historical prices failed", exc_info=True, symbol=symbol, error=e)
+                db.rollback()
+                continue
+
+            summary['inserted'] += inserted
+            summary['skipped'] += skipped
+            summary['symbols'][symbol] = {'inserted': inserted, 'skipped': skipped}
+            log.info("Stored historical prices", symbol=symbol, inserted=inserted, skipped=skipped)
 
     except Exception as e:
-        print(f"Error populating historical stock data batch: {str(e)}")
+        log.error("Historical price population failed", exc_info=True, error=e)
         db.rollback()
     finally:
         db.close()
+    return summary
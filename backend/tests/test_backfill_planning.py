@@ -0,0 +1,33 @@
+from datetime import date
+
+from market_calendar import trading_days
+import backfill_jobs
+from backfill_jobs import _group_into_chunks, _subtract_ranges
+
+
+def test_weekends_and_holidays_do_not_split_a_chunk():
+    days = trading_days(date(2025, 11, 20), date(2025, 12, 5))
+    assert _group_into_chunks(days) == [(date(2025, 11, 20), date(2025, 12, 5))]
+
+
+def test_gaps_start_new_chunks():
+    days = [date(2025, 3, 3), date(2025, 3, 4), date(2025, 3, 17), date(2025, 3, 18)]
+    assert _group_into_chunks(days) == [(date(2025, 3, 3), date(2025, 3, 4)),
+                                        (date(2025, 3, 17), date(2025, 3, 18))]
+
+
+def test_chunks_are_capped(monkeypatch):
+    monkeypatch.setattr(backfill_jobs, 'BACKFILL_CHUNK_DAYS', 30)
+    chunks = _group_into_chunks(trading_days(date(2025, 1, 1), date(2025, 3, 31)))
+    assert len(chunks) == 3
+    assert all((end - start).days < 30 for start, end in chunks)
+    assert chunks[0][0] == date(2025, 1, 2) and chunks[-1][1] == date(2025, 3, 31)
+
+
+def test_inflight_ranges_are_not_planned_again():
+    days = list(trading_days(date(2025, 3, 3), date(2025, 3, 14)))
+    inflight = [(date(2025, 3, 5), date(2025, 3, 11))]
+    assert _subtract_ranges(days, inflight) == [date(2025, 3, 3), date(2025, 3, 4),
+                                                date(2025, 3, 12), date(2025, 3, 13), date(2025, 3, 14)]
+    assert _group_into_chunks(_subtract_ranges(days, inflight)) == [(date(2025, 3, 3), date(2025, 3, 4)),
+                                                                    (date(2025, 3, 12), date(2025, 3, 14))]
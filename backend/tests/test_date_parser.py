@@ -0,0 +1,15 @@
+import pytest
+
+from date_parser import parse_date_range
+from benchmarks.date_parser_corpus import CORPUS, TODAY
+
+
+@pytest.mark.parametrize('phrase, expected', CORPUS, ids=[phrase for phrase, _ in CORPUS])
+def test_corpus(phrase, expected):
+    # None means the question goes to the LLM.
+    assert parse_date_range(phrase, today=TODAY) == expected
+
+
+def test_no_time_expression():
+    # No dates asked for, as opposed to None for dates it cannot read.
+    assert parse_date_range("Should I buy AAPL?", today=TODAY) == (None, None)
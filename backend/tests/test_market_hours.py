@@ -0,0 +1,86 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from market_calendar import EASTERN, CLOSING_QUOTE_DELAY, is_market_open, is_trading_day, just_closed, next_open
+from job_scheduler import MarketHoursTrigger
+
+
+def eastern(*args):
+    return EASTERN.localize(datetime(*args))
+
+
+@pytest.mark.parametrize('day', [
+    date(2025, 1, 1),    # New Year's Day
+    date(2025, 4, 18),   # Good Friday
+    date(2025, 11, 27),  # Thanksgiving
+    date(2025, 12, 25),  # Christmas
+    date(2026, 7, 3),    # Independence Day falls on a Saturday, observed Friday
+    date(2025, 6, 14),   # Saturday
+])
+def test_closed_days(day):
+    assert not is_trading_day(day)
+
+
+def test_session_bounds():
+    assert not is_market_open(eastern(2025, 6, 13, 9, 29))
+    assert is_market_open(eastern(2025, 6, 13, 9, 30))
+    assert is_market_open(eastern(2025, 6, 13, 16, 0))
+    assert not is_market_open(eastern(2025, 6, 13, 16, 0, 1))
+
+
+def test_just_closed_window():
+    assert not just_closed(eastern(2025, 6, 13, 16, 0))
+    assert just_closed(eastern(2025, 6, 13, 16, 0, 1))
+    assert just_closed(eastern(2025, 6, 13, 16, 0) + CLOSING_QUOTE_DELAY)
+    assert not just_closed(eastern(2025, 6, 13, 16, 0) + CLOSING_QUOTE_DELAY + timedelta(seconds=1))
+
+
+def test_early_close():
+    assert not is_market_open(eastern(2025, 11, 28, 13, 0, 1))
+    assert just_closed(eastern(2025, 11, 28, 13, 0, 30))
+
+
+@pytest.mark.parametrize('now, expected', [
+    (eastern(2025, 6, 13, 7, 0), eastern(2025, 6, 13, 9, 30)),      # before the open
+    (eastern(2025, 6, 13, 16, 5), eastern(2025, 6, 16, 9, 30)),     # Friday close to Monday
+    (eastern(2025, 11, 26, 17, 0), eastern(2025, 11, 28, 9, 30)),   # over Thanksgiving
+    (eastern(2025, 4, 17, 16, 30), eastern(2025, 4, 21, 9, 30)),    # over Good Friday
+])
+def test_next_open(now, expected):
+    assert next_open(now) == expected
+
+
+def test_trigger_fires_every_interval_while_open():
+    trigger = MarketHoursTrigger(300)
+    assert trigger.get_next_fire_time(eastern(2025, 6, 13, 10, 0), None) == eastern(2025, 6, 13, 10, 5)
+
+
+@pytest.mark.parametrize('interval', [60, 300, 420, 3600])
+def test_trigger_runs_once_inside_the_closing_quote_window(interval):
+    # Whatever the interval, the last run of the session lands where
+    # update_stock_prices still takes it for the closing quote.
+    trigger = MarketHoursTrigger(interval)
+    fire_time = eastern(2025, 6, 13, 15, 59, 59)
+    while is_market_open(fire_time):
+        fire_time = trigger.get_next_fire_time(fire_time, None)
+    assert just_closed(fire_time)
+    assert trigger.get_next_fire_time(fire_time, None) == eastern(2025, 6, 16, 9, 30)
+
+
+def test_trigger_closing_run_on_an_early_close():
+    fire_time = MarketHoursTrigger(420).get_next_fire_time(eastern(2025, 11, 28, 12, 58), None)
+    assert fire_time == eastern(2025, 11, 28, 13, 0) + CLOSING_QUOTE_DELAY / 2
+    assert just_closed(fire_time)
+
+
+def test_trigger_skips_holidays_until_the_next_open():
+    trigger = MarketHoursTrigger(420)
+    assert trigger.get_next_fire_time(None, eastern(2025, 11, 26, 16, 0, 30)) == eastern(2025, 11, 28, 9, 30)
+    assert trigger.get_next_fire_time(None, eastern(2025, 11, 27, 12, 0)) == eastern(2025, 11, 28, 9, 30)
+
+
+def test_trigger_closed_interval_is_capped_at_the_open():
+    trigger = MarketHoursTrigger(60, closed_seconds=3600)
+    assert trigger.get_next_fire_time(None, eastern(2025, 11, 27, 12, 0)) == eastern(2025, 11, 27, 13, 0)
+    assert trigger.get_next_fire_time(None, eastern(2025, 11, 28, 9, 0)) == eastern(2025, 11, 28, 9, 30)
@@ -0,0 +1,5 @@
+# Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+# (app.py's __main__ runs Flask's debug server for local development).
+from app import app
+
+application = app
@@ -22,19 +22,32 @@ function App() {
   useEffect(() => {
     setUserTimezone(Intl.DateTimeFormat().resolvedOptions().timeZone);
 
-    fetchStocks(selectedSymbol); 
-    fetchNews(selectedSymbol); 
-
     setCurrentQuestion(questionsBySymbol.get(selectedSymbol) || '');
     setCurrentAnalysis(analysisBySymbol.get(selectedSymbol) || '');
+  }, [selectedSymbol, questionsBySymbol, analysisBySymbol]); 
 
-    const stockInterval = setInterval(fetchStocks(selectedSymbol), 720000);
-    const newsInterval = setInterval(() => fetchNews(selectedSymbol), 720000); 
+  // Keyed only on the symbol, so storing a question or analysis does not reopen the stream.
+  useEffect(() => {
+    fetchStocks(selectedSymbol); 
+    fetchNews(selectedSymbol); 
+
+    // Live updates are pushed by the server instead of polled; EventSource reconnects on its own.
+    const events = new EventSource(`http://localhost:5000/api/stream?symbols=${selectedSymbol}`);
+    events.addEventListener('price', (event) => {
+      const { price, timestamp } = JSON.parse(event.data);
+      setStocks((previous) => ({ ...previous, [selectedSymbol]: { price, timestamp } }));
+    });
+    events.addEventListener('news', (event) => {
+      const articles = JSON.parse(event.data);
+      setNews((previous) => {
+        const seen = new Set(articles.map((article) => article.id));
+        return [...articles, ...previous.filter((article) => !seen.has(article.id))].slice(0, 5);
+      });
+    });
     return () => {
-      clearInterval(stockInterval);
-      clearInterval(newsInterval);
+      events.close();
     };
-  }, [selectedSymbol, questionsBySymbol, analysisBySymbol]); 
+  }, [selectedSymbol]); 
 
   const fetchStocks = async (symbol) => {
     try {
@@ -61,14 +74,41 @@ function App() {
 
     setIsAnalyzing(true);
     try {
-      const response = await axios.post('http://localhost:5000/api/analyze', {
-        question: currentQuestion,
-        selectedSymbol: selectedSymbol, 
-        userTimezone: userTimezone 
+      // The answer arrives as Server-Sent Events so it can render while the model is still writing.
+      const response = await fetch('http://localhost:5000/api/analyze/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          question: currentQuestion,
+          selectedSymbol: selectedSymbol,
+          userTimezone: userTimezone
+        })
       });
-
-      const newAnalysisResult = response.data.analysis;
-      setCurrentAnalysis(newAnalysisResult); 
+      if (!response.ok || !response.body) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let newAnalysisResult = '';
+      setCurrentAnalysis('');
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const rawEvent of events) {
+          const lines = rawEvent.split('\n');
+          const eventName = (lines.find(line => line.startsWith('event: ')) || '').slice(7);
+          const data = (lines.find(line => line.startsWith('data: ')) || '').slice(6);
+          if (eventName === 'token' && data) {
+            newAnalysisResult += JSON.parse(data).text;
+            setCurrentAnalysis(newAnalysisResult);
+          }
+        }
+      }
 
       setQuestionsBySymbol(prevMap => new Map(prevMap).set(selectedSymbol, currentQuestion));
       setAnalysisBySymbol(prevMap => new Map(prevMap).set(selectedSymbol, newAnalysisResult));
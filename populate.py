@@ -1,5 +1,6 @@
 import requests
 import json
+import time
 
 # Define the dates for historical data
 start_date = "2025-03-13" # Change to your desired start date
@@ -22,7 +23,17 @@ try:
     response.raise_for_status() # Raise an exception for HTTP errors (4xx or 5xx)
 
     print("Response Status Code:", response.status_code)
-    print("Response Body:", response.json())
+    job = response.json()
+    print("Response Body:", job)
+
+    # The backfill runs as a background job; poll until it finishes.
+    status_url = f"{url}/{job['job_id']}"
+    while job['status'] not in ('completed', 'failed'):
+        time.sleep(2)
+        job = requests.get(status_url).json()
+        print(f"Job {job['job_id']}: {job['status']} {job['tasks_done']}/{job['tasks_total']} tasks, "
+              f"{job['inserted']} inserted, {job['rows_per_second']} rows/s")
+    print("Final Status:", job)
 
 except requests.exceptions.RequestException as e:
     print(f"Error sending request: {e}")